@@ -0,0 +1,234 @@
+import numpy as np
+from typing import Optional, Tuple, Mapping as MappingType
+from mlagents_envs.base_env import (
+    BehaviorSpec,
+    ObservationSpec,
+    DimensionProperty,
+    ObservationType,
+    ActionSpec,
+    DecisionSteps,
+    TerminalSteps,
+    BaseEnv,
+    BehaviorName,
+    ActionTuple,
+    AgentId,
+)
+from mlagents_envs.communicator_objects.capabilities_pb2 import UnityRLCapabilitiesProto
+
+# Physical constants of the multiagent-particle-envs world used by simple_spread.
+DT = 0.1
+DAMPING = 0.25
+CONTACT_FORCE = 1e2
+CONTACT_MARGIN = 1e-3
+AGENT_SIZE = 0.15
+SENSITIVITY = 5.0
+COMM_DIM = 2
+# Movement for each discrete action : no-op, left, right, down, up
+ACTION_TO_MOVE = SENSITIVITY * np.array(
+    [[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]], dtype=np.float32
+)
+
+
+class BatchedParticlesEnvironment(BaseEnv):
+    """
+    A NumPy implementation of the simple_spread scenario of
+    https://github.com/openai/multiagent-particle-envs that simulates num_worlds independent
+    worlds at once. Each world is a group of num_agents agents that must cover num_agents
+    landmarks while avoiding each other. The agent with index i in world w has the id
+    w * num_agents + i, and the group id w + 1.
+    The observations, rewards and episode length match the ones of ParticlesEnvironment.
+    """
+
+    def __init__(
+        self,
+        num_worlds: int = 32,
+        num_agents: int = 3,
+        # ParticlesEnvironment ends its episodes after 26 steps, see its step()
+        episode_length: int = 26,
+        seed: Optional[int] = None,
+        worker_id: int = 0,
+    ):
+        self._name = "simple_spread"
+        self._num_worlds = num_worlds
+        self._num_agents = num_agents
+        self._num_landmarks = num_agents
+        self._episode_length = episode_length
+        self._worker_id = worker_id
+        self._rng = np.random.RandomState(seed)
+        self._obs_size = 4 + 2 * self._num_landmarks + (2 + COMM_DIM) * (num_agents - 1)
+
+        # For each agent, the indices of the other agents of its world
+        self._others = np.array(
+            [[j for j in range(num_agents) if j != i] for i in range(num_agents)],
+            dtype=np.int64,
+        ).reshape(num_agents, num_agents - 1)
+        self._agent_ids = np.arange(num_worlds * num_agents, dtype=np.int32)
+        self._group_ids = np.repeat(np.arange(1, num_worlds + 1, dtype=np.int32), num_agents)
+
+        self._pos = np.zeros((num_worlds, num_agents, 2), dtype=np.float32)
+        self._vel = np.zeros((num_worlds, num_agents, 2), dtype=np.float32)
+        self._landmarks = np.zeros((num_worlds, self._num_landmarks, 2), dtype=np.float32)
+        self._actions = np.zeros((num_worlds, num_agents), dtype=np.int64)
+        self._steps = np.zeros(num_worlds, dtype=np.int64)
+        self._decision_steps: Optional[DecisionSteps] = None
+        self._terminal_steps: Optional[TerminalSteps] = None
+
+        # :(
+        self.academy_capabilities = UnityRLCapabilitiesProto()
+        self.academy_capabilities.baseRLCapabilities = True
+        self.academy_capabilities.concatenatedPngObservations = True
+        self.academy_capabilities.compressedChannelMapping = True
+        self.academy_capabilities.hybridActions = True
+        self.academy_capabilities.trainingAnalytics = True
+        self.academy_capabilities.variableLengthObservation = True
+        self.academy_capabilities.multiAgentGroups = True
+
+    def step(self) -> None:
+        if self._decision_steps is None:
+            self.reset()
+        self._integrate()
+        self._steps += 1
+        rewards = self._compute_rewards()
+        done = self._steps >= self._episode_length
+
+        # Last observation of the worlds that are done, before they are reset
+        terminal_agents = np.repeat(done, self._num_agents)
+        num_terminal = int(terminal_agents.sum())
+        self._terminal_steps = TerminalSteps(
+            [self._compute_obs()[terminal_agents]],
+            np.zeros(num_terminal, dtype=np.float32),
+            np.zeros(num_terminal, dtype=bool),
+            self._agent_ids[terminal_agents],
+            self._group_ids[terminal_agents],
+            np.repeat(rewards[done], self._num_agents),
+        )
+        if done.any():
+            self._reset_worlds(done)
+            # The first step of a new episode has no reward
+            rewards[done] = 0.0
+        self._decision_steps = DecisionSteps(
+            [self._compute_obs()],
+            np.zeros(self._num_worlds * self._num_agents, dtype=np.float32),
+            self._agent_ids,
+            None,
+            self._group_ids,
+            np.repeat(rewards, self._num_agents),
+        )
+        self._actions[:] = 0
+
+    def reset(self) -> None:
+        self._reset_worlds(np.ones(self._num_worlds, dtype=bool))
+        self._actions[:] = 0
+        self._decision_steps = DecisionSteps(
+            [self._compute_obs()],
+            np.zeros(self._num_worlds * self._num_agents, dtype=np.float32),
+            self._agent_ids,
+            None,
+            self._group_ids,
+            np.zeros(self._num_worlds * self._num_agents, dtype=np.float32),
+        )
+        self._terminal_steps = TerminalSteps.empty(self._behavior_spec)
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def _behavior_spec(self) -> BehaviorSpec:
+        return BehaviorSpec(
+            [
+                ObservationSpec(
+                    (self._obs_size,),
+                    (DimensionProperty.NONE,),
+                    ObservationType.DEFAULT,
+                    "obs_0",
+                )
+            ],
+            ActionSpec(0, (len(ACTION_TO_MOVE),)),
+        )
+
+    @property
+    def behavior_specs(self) -> MappingType[str, BehaviorSpec]:
+        return {self._name: self._behavior_spec}
+
+    def set_actions(self, behavior_name: BehaviorName, action: ActionTuple) -> None:
+        assert behavior_name == self._name
+        self._actions[:] = action.discrete[:, 0].reshape(
+            self._num_worlds, self._num_agents
+        )
+
+    def set_action_for_agent(
+        self, behavior_name: BehaviorName, agent_id: AgentId, action: ActionTuple
+    ) -> None:
+        assert behavior_name == self._name
+        world, agent = divmod(agent_id, self._num_agents)
+        self._actions[world, agent] = action.discrete[0, 0]
+
+    def get_steps(
+        self, behavior_name: BehaviorName
+    ) -> Tuple[DecisionSteps, TerminalSteps]:
+        assert behavior_name == self._name
+        if self._decision_steps is None:
+            self.reset()
+        return self._decision_steps, self._terminal_steps
+
+    def _reset_worlds(self, worlds: np.ndarray) -> None:
+        num_reset = int(worlds.sum())
+        self._pos[worlds] = self._rng.uniform(
+            -1, 1, (num_reset, self._num_agents, 2)
+        )
+        self._vel[worlds] = 0.0
+        self._landmarks[worlds] = self._rng.uniform(
+            -1, 1, (num_reset, self._num_landmarks, 2)
+        )
+        self._steps[worlds] = 0
+
+    def _integrate(self) -> None:
+        force = ACTION_TO_MOVE[self._actions]
+        # Soft contact forces between all pairs of agents of a world
+        delta = self._pos[:, :, None, :] - self._pos[:, None, :, :]
+        dist = np.sqrt(np.sum(np.square(delta), axis=-1))
+        penetration = (
+            np.logaddexp(0, -(dist - 2 * AGENT_SIZE) / CONTACT_MARGIN) * CONTACT_MARGIN
+        )
+        eye = np.eye(self._num_agents, dtype=bool)
+        dist[:, eye] = 1.0
+        penetration[:, eye] = 0.0
+        force += np.sum(
+            CONTACT_FORCE * delta / dist[..., None] * penetration[..., None], axis=2
+        )
+        self._vel *= 1 - DAMPING
+        self._vel += force * DT
+        self._pos += self._vel * DT
+
+    def _compute_rewards(self) -> np.ndarray:
+        # Each agent is penalized by the distance of each landmark to its closest agent, and by
+        # its collisions with agents (including itself, as in the original scenario). The reward
+        # is shared between the agents of a world.
+        to_landmarks = self._pos[:, :, None, :] - self._landmarks[:, None, :, :]
+        dist_to_landmarks = np.sqrt(np.sum(np.square(to_landmarks), axis=-1))
+        landmark_penalty = dist_to_landmarks.min(axis=1).sum(axis=1)
+        delta = self._pos[:, :, None, :] - self._pos[:, None, :, :]
+        dist = np.sqrt(np.sum(np.square(delta), axis=-1))
+        num_collisions = (dist < 2 * AGENT_SIZE).sum(axis=(1, 2))
+        return (-self._num_agents * landmark_penalty - num_collisions).astype(
+            np.float32
+        )
+
+    def _compute_obs(self) -> np.ndarray:
+        landmarks_rel = self._landmarks[:, None, :, :] - self._pos[:, :, None, :]
+        others_rel = self._pos[:, self._others, :] - self._pos[:, :, None, :]
+        comm = np.zeros(
+            (self._num_worlds, self._num_agents, COMM_DIM * (self._num_agents - 1)),
+            dtype=np.float32,
+        )
+        obs = np.concatenate(
+            [
+                self._vel,
+                self._pos,
+                landmarks_rel.reshape(self._num_worlds, self._num_agents, -1),
+                others_rel.reshape(self._num_worlds, self._num_agents, -1),
+                comm,
+            ],
+            axis=-1,
+        )
+        return obs.reshape(-1, self._obs_size).astype(np.float32)
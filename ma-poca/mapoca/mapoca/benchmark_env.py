@@ -0,0 +1,299 @@
+import argparse
+import time
+import numpy as np
+from typing import List, Optional, Tuple, Mapping as MappingType
+from mlagents_envs.base_env import (
+    BehaviorSpec,
+    ObservationSpec,
+    DimensionProperty,
+    ObservationType,
+    ActionSpec,
+    DecisionSteps,
+    TerminalSteps,
+    BaseEnv,
+    BehaviorName,
+    ActionTuple,
+    AgentId,
+)
+from mlagents_envs.communicator_objects.capabilities_pb2 import UnityRLCapabilitiesProto
+
+
+class BenchmarkEnvironment(BaseEnv):
+    """
+    A synthetic environment used to measure the throughput of the trainers, without Unity or
+    a physics simulation. All the agents request a decision every step and end their episode
+    together after episode_length steps.
+    The observations only depend on the step in the episode and on the agent, and the
+    rewards on the observations and the actions, so that two runs with the same actions
+    produce the same experiences. Each agent is rewarded for matching with its first
+    continuous action the first vector observation, and with its discrete actions
+    (step + agent + branch) modulo the branch size. If group_size > 1, the agents are split
+    into groups that share the mean reward of their members as group reward.
+    """
+
+    def __init__(
+        self,
+        num_agents: int = 12,
+        group_size: int = 3,
+        vector_obs_size: int = 8,
+        visual_obs_shape: Optional[Tuple[int, int, int]] = None,
+        var_len_obs_shape: Optional[Tuple[int, int]] = None,
+        continuous_action_size: int = 2,
+        discrete_branches: Tuple[int, ...] = (3,),
+        episode_length: int = 100,
+        step_cost_s: float = 0.0,
+        worker_id: int = 0,
+    ):
+        """
+        :param num_agents: Number of agents in the environment.
+        :param group_size: Number of agents in each group. If 1 or less, agents have no group.
+        :param vector_obs_size: Size of the vector observation, or 0 for none.
+        :param visual_obs_shape: (height, width, channels) of the visual observation, if any.
+        :param var_len_obs_shape: (max number of entities, entity size) of the variable length
+        observation, if any.
+        :param continuous_action_size: Number of continuous actions.
+        :param discrete_branches: Size of each discrete action branch.
+        :param episode_length: Number of steps in an episode.
+        :param step_cost_s: Time in seconds spent busy-waiting in each step, to simulate the
+        cost of a simulation.
+        :param worker_id: The id of the environment worker.
+        """
+        self._name = "Benchmark"
+        self._num_agents = num_agents
+        self._group_size = group_size
+        self._vector_obs_size = vector_obs_size
+        self._visual_obs_shape = visual_obs_shape
+        self._var_len_obs_shape = var_len_obs_shape
+        self._action_spec = ActionSpec(continuous_action_size, tuple(discrete_branches))
+        self._episode_length = episode_length
+        self._step_cost_s = step_cost_s
+        self._worker_id = worker_id
+
+        obs_specs = []
+        if vector_obs_size > 0:
+            obs_specs.append(
+                ObservationSpec(
+                    (vector_obs_size,),
+                    (DimensionProperty.NONE,),
+                    ObservationType.DEFAULT,
+                    "vector_obs",
+                )
+            )
+        if visual_obs_shape is not None:
+            obs_specs.append(
+                ObservationSpec(
+                    tuple(visual_obs_shape),
+                    (
+                        DimensionProperty.TRANSLATIONAL_EQUIVARIANCE,
+                        DimensionProperty.TRANSLATIONAL_EQUIVARIANCE,
+                        DimensionProperty.NONE,
+                    ),
+                    ObservationType.DEFAULT,
+                    "visual_obs",
+                )
+            )
+        if var_len_obs_shape is not None:
+            obs_specs.append(
+                ObservationSpec(
+                    tuple(var_len_obs_shape),
+                    (DimensionProperty.VARIABLE_SIZE, DimensionProperty.NONE),
+                    ObservationType.DEFAULT,
+                    "var_len_obs",
+                )
+            )
+        if group_size > 1 and num_agents % group_size != 0:
+            raise ValueError(
+                f"The number of agents ({num_agents}) must be a multiple of the group size ({group_size})."
+            )
+        if not obs_specs:
+            raise ValueError("The benchmark environment needs at least one observation.")
+        self._behavior_spec = BehaviorSpec(obs_specs, self._action_spec)
+
+        self._agent_ids = np.arange(num_agents, dtype=np.int32)
+        if group_size > 1:
+            self._group_ids = self._agent_ids // group_size + 1
+        else:
+            self._group_ids = np.zeros(num_agents, dtype=np.int32)
+        self._actions = self._action_spec.empty_action(num_agents)
+        self._count = 0
+        self._decision_steps: Optional[DecisionSteps] = None
+        self._terminal_steps: Optional[TerminalSteps] = None
+
+        # :(
+        self.academy_capabilities = UnityRLCapabilitiesProto()
+        self.academy_capabilities.baseRLCapabilities = True
+        self.academy_capabilities.concatenatedPngObservations = True
+        self.academy_capabilities.compressedChannelMapping = True
+        self.academy_capabilities.hybridActions = True
+        self.academy_capabilities.trainingAnalytics = True
+        self.academy_capabilities.variableLengthObservation = True
+        self.academy_capabilities.multiAgentGroups = True
+
+    def step(self) -> None:
+        if self._decision_steps is None:
+            self.reset()
+        if self._step_cost_s > 0:
+            end_time = time.perf_counter() + self._step_cost_s
+            while time.perf_counter() < end_time:
+                pass
+        rewards = self._compute_rewards()
+        self._count += 1
+        obs = self._compute_obs()
+        if self._count >= self._episode_length:
+            terminal_steps = self._make_terminal_steps(obs, rewards)
+            self.reset()
+            self._terminal_steps = terminal_steps
+        else:
+            self._decision_steps = self._make_decision_steps(obs, rewards)
+            self._terminal_steps = TerminalSteps.empty(self._behavior_spec)
+        self._actions = self._action_spec.empty_action(self._num_agents)
+
+    def reset(self) -> None:
+        self._count = 0
+        self._actions = self._action_spec.empty_action(self._num_agents)
+        self._decision_steps = self._make_decision_steps(
+            self._compute_obs(), np.zeros(self._num_agents, dtype=np.float32)
+        )
+        self._terminal_steps = TerminalSteps.empty(self._behavior_spec)
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def behavior_specs(self) -> MappingType[str, BehaviorSpec]:
+        return {self._name: self._behavior_spec}
+
+    def set_actions(self, behavior_name: BehaviorName, action: ActionTuple) -> None:
+        assert behavior_name == self._name
+        self._action_spec._validate_action(action, self._num_agents, behavior_name)
+        self._actions = action
+
+    def set_action_for_agent(
+        self, behavior_name: BehaviorName, agent_id: AgentId, action: ActionTuple
+    ) -> None:
+        assert behavior_name == self._name
+        if self._action_spec.continuous_size > 0:
+            self._actions.continuous[agent_id] = action.continuous[0]
+        if self._action_spec.discrete_size > 0:
+            self._actions.discrete[agent_id] = action.discrete[0]
+
+    def get_steps(
+        self, behavior_name: BehaviorName
+    ) -> Tuple[DecisionSteps, TerminalSteps]:
+        assert behavior_name == self._name
+        if self._decision_steps is None:
+            self.reset()
+        return self._decision_steps, self._terminal_steps
+
+    def _compute_obs(self) -> List[np.ndarray]:
+        phase = 0.1 * self._count + 0.5 * self._agent_ids
+        obs = []
+        if self._vector_obs_size > 0:
+            vector_obs = np.sin(
+                phase[:, None] + np.arange(self._vector_obs_size)[None, :]
+            )
+            obs.append(vector_obs.astype(np.float32))
+        if self._visual_obs_shape is not None:
+            height, width, channels = self._visual_obs_shape
+            pixels = np.arange(height * width * channels).reshape(height, width, channels)
+            visual_obs = 0.5 + 0.5 * np.sin(phase[:, None, None, None] + 0.01 * pixels)
+            obs.append(visual_obs.astype(np.float32))
+        if self._var_len_obs_shape is not None:
+            max_entities, entity_size = self._var_len_obs_shape
+            var_len_obs = np.sin(
+                phase[:, None, None] + np.arange(max_entities * entity_size).reshape(
+                    max_entities, entity_size
+                )
+            )
+            # Entities past the number of visible ones are zero padding
+            num_entities = 1 + (self._count + self._agent_ids) % max_entities
+            var_len_obs[np.arange(max_entities)[None, :] >= num_entities[:, None]] = 0
+            obs.append(var_len_obs.astype(np.float32))
+        return obs
+
+    def _compute_rewards(self) -> np.ndarray:
+        rewards = np.zeros(self._num_agents, dtype=np.float32)
+        if self._action_spec.continuous_size > 0:
+            target = np.sin(0.1 * self._count + 0.5 * self._agent_ids)
+            rewards -= np.abs(self._actions.continuous[:, 0] - target)
+        for i, branch_size in enumerate(self._action_spec.discrete_branches):
+            target = (self._count + self._agent_ids + i) % branch_size
+            rewards += self._actions.discrete[:, i] == target
+        return rewards
+
+    def _split_rewards(self, rewards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the individual and group rewards of the agents.
+        """
+        if self._group_size <= 1:
+            return rewards, np.zeros(self._num_agents, dtype=np.float32)
+        group_rewards = rewards.reshape(-1, self._group_size).mean(axis=1)
+        return (
+            np.zeros(self._num_agents, dtype=np.float32),
+            np.repeat(group_rewards, self._group_size).astype(np.float32),
+        )
+
+    def _make_decision_steps(
+        self, obs: List[np.ndarray], rewards: np.ndarray
+    ) -> DecisionSteps:
+        reward, group_reward = self._split_rewards(rewards)
+        return DecisionSteps(
+            obs, reward, self._agent_ids, None, self._group_ids, group_reward
+        )
+
+    def _make_terminal_steps(
+        self, obs: List[np.ndarray], rewards: np.ndarray
+    ) -> TerminalSteps:
+        reward, group_reward = self._split_rewards(rewards)
+        return TerminalSteps(
+            obs,
+            reward,
+            np.ones(self._num_agents, dtype=bool),
+            self._agent_ids,
+            self._group_ids,
+            group_reward,
+        )
+
+
+def _create_benchmark_parser() -> argparse.ArgumentParser:
+    benchmark_parser = argparse.ArgumentParser(prog="Benchmark")
+    benchmark_parser.add_argument("--num-agents", type=int, default=12)
+    benchmark_parser.add_argument("--group-size", type=int, default=3)
+    benchmark_parser.add_argument("--vector-obs-size", type=int, default=8)
+    benchmark_parser.add_argument(
+        "--visual-obs-shape", type=int, nargs=3, default=None
+    )
+    benchmark_parser.add_argument(
+        "--var-len-obs-shape", type=int, nargs=2, default=None
+    )
+    benchmark_parser.add_argument("--continuous-action-size", type=int, default=2)
+    benchmark_parser.add_argument(
+        "--discrete-branches", type=int, nargs="*", default=[3]
+    )
+    benchmark_parser.add_argument("--episode-length", type=int, default=100)
+    benchmark_parser.add_argument("--step-cost", type=float, default=0.0)
+    return benchmark_parser
+
+
+def make_benchmark_env(
+    env_args: Optional[List[str]], worker_id: int = 0
+) -> BenchmarkEnvironment:
+    """
+    Creates a BenchmarkEnvironment configured from command line arguments, for instance
+    the ones passed with --env-args.
+    :param env_args: The arguments, e.g. ["--num-agents", "24", "--step-cost", "0.001"]
+    :param worker_id: The id of the environment worker.
+    """
+    args = _create_benchmark_parser().parse_args(env_args or [])
+    return BenchmarkEnvironment(
+        num_agents=args.num_agents,
+        group_size=args.group_size,
+        vector_obs_size=args.vector_obs_size,
+        visual_obs_shape=args.visual_obs_shape,
+        var_len_obs_shape=args.var_len_obs_shape,
+        continuous_action_size=args.continuous_action_size,
+        discrete_branches=tuple(args.discrete_branches),
+        episode_length=args.episode_length,
+        step_cost_s=args.step_cost,
+        worker_id=worker_id,
+    )
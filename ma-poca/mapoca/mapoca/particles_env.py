@@ -56,15 +56,29 @@ def _make_env(scenario_name, benchmark=False):
 
 
 class ParticlesEnvironment(BaseEnv):
-    def __init__(self, name: str = "simple_spread", worker_id=0):
-        self._obs: Optional[List[np.array]] = None
-        self._rew: Optional[List[int]] = None
-        self._done: Optional[List[bool]] = None
+    def __init__(
+        self, name: str = "simple_spread", worker_id=0, headless: bool = False
+    ):
         self._actions: Optional[List[int]] = None
         self._name = name
         self._env = _make_env(name)
         self._env.discrete_action_input = True
         self._worker_id = worker_id
+        # In headless mode, the environment is never rendered (and the rendering
+        # module never imported).
+        self._headless = headless
+
+        # The results of a step are written into these arrays, and the decision and
+        # terminal steps are built from them once per step.
+        self._obs = np.zeros(
+            (self._env.n,) + self._env.observation_space[0].shape, dtype=np.float32
+        )
+        self._group_rew = np.zeros(self._env.n, dtype=np.float32)
+        self._done = np.zeros(self._env.n, dtype=bool)
+        self._agent_ids = np.arange(self._env.n, dtype=np.int32)
+        self._group_ids = np.ones(self._env.n, dtype=np.int32)
+        self._decision_steps: Optional[DecisionSteps] = None
+        self._terminal_steps: Optional[TerminalSteps] = None
 
         # :(
         self.academy_capabilities = UnityRLCapabilitiesProto()
@@ -79,23 +93,42 @@ class ParticlesEnvironment(BaseEnv):
         self.episode_count = 0
 
     def step(self) -> None:
+        reward_scale = 1.0
         if self._actions is None:
-            self._obs, self._rew, self._done, _ = self._env.step([0] * self._env.n)
+            obs, rew, done, _ = self._env.step([0] * self._env.n)
         else:
-            self._obs, self._rew, self._done, _ = self._env.step(self._actions)
+            obs, rew, done, _ = self._env.step(self._actions)
+        self._obs[:] = obs
+        self._group_rew[:] = rew[0] * reward_scale
+        self._done[:] = done
         if self.count >= 25:
-            self._done = [True] * self._env.n
+            self._done[:] = True
         self.count += 1
-        if self.episode_count % 100 == 0 and self._worker_id == 0:
+        if (
+            not self._headless
+            and self.episode_count % 100 == 0
+            and self._worker_id == 0
+        ):
             self._env.render(mode="agent")
 
+        terminal_steps = self.get_terminal_steps()
+        if self._done.any():
+            # if any is done, reset the environment and
+            # get the next steps
+            self.reset()
+        else:
+            self._decision_steps = self.get_decision_steps()
+        self._terminal_steps = terminal_steps
+
     def reset(self) -> None:
-        self._rew = [0] * self._env.n
-        self._done = [False] * self._env.n
+        self._group_rew[:] = 0
+        self._done[:] = False
         self._actions = [0] * self._env.n
-        self._obs = self._env.reset()
+        self._obs[:] = self._env.reset()
         self.episode_count += 1
         self.count = 0
+        self._decision_steps = self.get_decision_steps()
+        self._terminal_steps = self.get_terminal_steps()
 
     def close(self) -> None:
         self._env.close()
@@ -131,77 +164,32 @@ class ParticlesEnvironment(BaseEnv):
     def get_steps(
         self, behavior_name: BehaviorName
     ) -> Tuple[DecisionSteps, TerminalSteps]:
-        terminal_steps = self.get_terminal_steps()
-        if any(self._done):
-            # if any is done, reset the environment and
-            # get the next steps
+        if self._decision_steps is None:
             self.reset()
-        decision_steps = self.get_decision_steps()
-        return decision_steps, terminal_steps
+        return self._decision_steps, self._terminal_steps
 
     def get_decision_steps(self) -> DecisionSteps:
-        reward_scale = 1
-        decision_obs = np.array(
-            [self._obs[i] for i in range(self._env.n) if not self._done[i]],
-            dtype=np.float32,
-        )
-        decision_reward = np.array(
-            [
-                self._rew[i] * 0
-                for i in range(self._env.n)
-                if not self._done[i]
-            ],
-            dtype=np.float32,
-        )
-        decision_id = np.array([i for i in range(self._env.n) if not self._done[i]])
-        decision_group_reward = np.array(
-            [self._rew[0] * reward_scale for i in range(self._env.n) if not self._done[i]],
-            dtype=np.float32,
-        )
-        decision_group_id = np.array(
-            [1 for i in range(self._env.n) if not self._done[i]]
-        )
-        decision_step = DecisionSteps(
-            [decision_obs],
-            decision_reward,
-            decision_id,
+        # Boolean indexing copies the arrays, so the steps returned are not
+        # modified by the next step.
+        alive = ~self._done
+        return DecisionSteps(
+            [self._obs[alive]],
+            np.zeros(np.count_nonzero(alive), dtype=np.float32),
+            self._agent_ids[alive],
             None,
-            decision_group_id,
-            decision_group_reward,
+            self._group_ids[alive],
+            self._group_rew[alive],
         )
-        return decision_step
 
     def get_terminal_steps(self) -> TerminalSteps:
-        reward_scale = 1.0
-        terminal_obs = np.array(
-            [self._obs[i] for i in range(self._env.n) if self._done[i]],
-            dtype=np.float32,
-        )
-        terminal_reward = np.array(
-            [self._rew[i] * 0 for i in range(self._env.n) if self._done[i]],
-            dtype=np.float32,
-        )
-        terminal_id = np.array([i for i in range(self._env.n) if self._done[i]])
-        terminal_group_reward = np.array(
-            [
-                self._rew[0] * reward_scale
-                for i in range(self._env.n)
-                if self._done[i]
-            ],
-            dtype=np.float32,
-        )
-        terminal_group_id = np.array([1 for i in range(self._env.n) if self._done[i]])
+        done = self._done
+        num_done = np.count_nonzero(done)
         # TODO : Figureout the type of interruption
-        terminal_interruption = np.array(
-            [False for i in range(self._env.n) if self._done[i]]
+        return TerminalSteps(
+            [self._obs[done]],
+            np.zeros(num_done, dtype=np.float32),
+            np.zeros(num_done, dtype=bool),
+            self._agent_ids[done],
+            self._group_ids[done],
+            self._group_rew[done],
         )
-        terminal_steps = TerminalSteps(
-            [terminal_obs],
-            terminal_reward,
-            terminal_interruption,
-            terminal_id,
-            terminal_group_id,
-            terminal_group_reward,
-        )
-
-        return terminal_steps
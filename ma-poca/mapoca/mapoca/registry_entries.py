@@ -4,6 +4,8 @@ from mlagents_envs.base_env import BaseEnv
 from mlagents_envs.registry.remote_registry_entry import RemoteRegistryEntry
 from mlagents_envs.registry.base_registry_entry import BaseRegistryEntry
 from mapoca.particles_env import ParticlesEnvironment
+from mapoca.batched_particles_env import BatchedParticlesEnvironment
+from mapoca.benchmark_env import make_benchmark_env
 
 mapoca_registry = UnityEnvRegistry()
 
@@ -51,7 +53,9 @@ class ParticleEnvEntry(BaseRegistryEntry):
         super().__init__(identifier, expected_reward, description)
 
     def make(self, **kwargs: Any) -> BaseEnv:
-        return ParticlesEnvironment(worker_id = kwargs["worker_id"])
+        return ParticlesEnvironment(
+            worker_id=kwargs["worker_id"], headless=kwargs.get("no_graphics", False)
+        )
 
 mapoca_registry.register(
     ParticleEnvEntry(
@@ -60,3 +64,50 @@ mapoca_registry.register(
         "The particles environment from https://github.com/openai/multiagent-particle-envs"
     )
 )
+
+
+class BatchedParticleEnvEntry(BaseRegistryEntry):
+    def __init__(
+        self,
+        identifier: str,
+        expected_reward: Optional[float],
+        description: Optional[str],
+    ):
+        super().__init__(identifier, expected_reward, description)
+
+    def make(self, **kwargs: Any) -> BaseEnv:
+        return BatchedParticlesEnvironment(
+            seed=kwargs.get("seed"), worker_id=kwargs["worker_id"]
+        )
+
+mapoca_registry.register(
+    BatchedParticleEnvEntry(
+        "BatchedParticlesEnv",
+        - 160,
+        "A NumPy version of the simple_spread particles environment that simulates 32 worlds at once"
+    )
+)
+
+
+class BenchmarkEnvEntry(BaseRegistryEntry):
+    def __init__(
+        self,
+        identifier: str,
+        expected_reward: Optional[float],
+        description: Optional[str],
+    ):
+        super().__init__(identifier, expected_reward, description)
+
+    def make(self, **kwargs: Any) -> BaseEnv:
+        return make_benchmark_env(
+            kwargs.get("additional_args"), worker_id=kwargs["worker_id"]
+        )
+
+mapoca_registry.register(
+    BenchmarkEnvEntry(
+        "Benchmark",
+        None,
+        "A synthetic environment to measure the trainers throughput, configured with --env-args "
+        "(e.g. --env-args --num-agents 24 --group-size 4 --var-len-obs-shape 10 6 --step-cost 0.001)"
+    )
+)
@@ -2,3 +2,5 @@ from mapoca.torch_utils.torch import torch as torch  # noqa
 from mapoca.torch_utils.torch import nn  # noqa
 from mapoca.torch_utils.torch import set_torch_config  # noqa
 from mapoca.torch_utils.torch import default_device  # noqa
+from mapoca.torch_utils.torch import use_jit_inference  # noqa
+from mapoca.torch_utils.torch import use_quantized_inference  # noqa
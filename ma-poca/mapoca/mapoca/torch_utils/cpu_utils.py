@@ -13,6 +13,17 @@ def get_num_threads_to_use() -> Optional[int]:
     return max(min(num_cpus // 2, 4), 1) if num_cpus is not None else None
 
 
+def get_cpu_headroom() -> Optional[float]:
+    """
+    Gets the number of CPUs that are currently idle, based on the 1 minute load average.
+    Returns None if the load average is not available on this platform.
+    """
+    num_cpus = _get_num_available_cpus()
+    if num_cpus is None or not hasattr(os, "getloadavg"):
+        return None
+    return num_cpus - os.getloadavg()[0]
+
+
 def _get_num_available_cpus() -> Optional[int]:
     """
     Returns number of CPUs using cgroups if possible. This accounts
@@ -0,0 +1,144 @@
+from typing import Iterator, List, Optional
+from contextlib import contextmanager
+import threading
+
+from mapoca.torch_utils.globals import get_rank, set_rank
+from mapoca.torch_utils.torch import torch
+from mapoca.trainers.settings import TorchSettings
+from mlagents_envs.logging_util import get_logger
+
+logger = get_logger(__name__)
+
+_world_size = 1
+# The process group used by the collectives of each thread, see use_group
+_thread_groups = threading.local()
+
+
+def init_distributed(torch_settings: TorchSettings, seed: int) -> int:
+    """
+    Joins the data-parallel training processes with a gloo process group if world_size
+    is more than 1, and sets the rank returned by get_rank. All the ranks must call this.
+    :param torch_settings: The settings with the world size, rank and init method.
+    :param seed: The random seed of this process.
+    :return: The random seed of rank 0, so that all the ranks initialize their networks
+        the same way.
+    """
+    global _world_size
+    if torch_settings.world_size <= 1:
+        return seed
+    torch.distributed.init_process_group(
+        "gloo",
+        init_method=torch_settings.dist_init_method,
+        rank=torch_settings.rank,
+        world_size=torch_settings.world_size,
+    )
+    _world_size = torch_settings.world_size
+    set_rank(torch_settings.rank)
+    logger.info(
+        f"Joined data-parallel training as rank {torch_settings.rank} "
+        f"of {torch_settings.world_size}."
+    )
+    seed_tensor = torch.tensor([seed], dtype=torch.long)
+    torch.distributed.broadcast(seed_tensor, 0)
+    return int(seed_tensor.item())
+
+
+def destroy_distributed() -> None:
+    global _world_size
+    if is_distributed():
+        torch.distributed.destroy_process_group()
+        _world_size = 1
+
+
+def is_distributed() -> bool:
+    return _world_size > 1
+
+
+def is_main_rank() -> bool:
+    """
+    Returns whether this process writes the checkpoints, stats and run logs, i.e. whether
+    it is rank 0 or training isn't distributed.
+    """
+    rank = get_rank()
+    return rank is None or rank == 0
+
+
+def new_group() -> Optional[object]:
+    """
+    Creates a process group with all the ranks, so that several threads can run
+    collectives at the same time. All the ranks must create their groups in the same order.
+    Returns None if training isn't distributed.
+    """
+    if not is_distributed():
+        return None
+    return torch.distributed.new_group()
+
+
+@contextmanager
+def use_group(group: Optional[object]) -> Iterator[None]:
+    """
+    Makes the collectives of the current thread use the given process group.
+    """
+    previous_group = getattr(_thread_groups, "group", None)
+    _thread_groups.group = group
+    try:
+        yield
+    finally:
+        _thread_groups.group = previous_group
+
+
+def _get_group() -> Optional[object]:
+    return getattr(_thread_groups, "group", None)
+
+
+def barrier() -> None:
+    if is_distributed():
+        torch.distributed.barrier(group=_get_group())
+
+
+def all_reduce_sum_(tensor: torch.Tensor) -> torch.Tensor:
+    """
+    Sums a tensor over the ranks, in place.
+    """
+    if is_distributed():
+        torch.distributed.all_reduce(tensor, group=_get_group())
+    return tensor
+
+
+def all_reduce_min(value: int) -> int:
+    """
+    Returns the minimum of an integer over the ranks.
+    """
+    if not is_distributed():
+        return value
+    value_tensor = torch.tensor([value], dtype=torch.long)
+    torch.distributed.all_reduce(
+        value_tensor, op=torch.distributed.ReduceOp.MIN, group=_get_group()
+    )
+    return int(value_tensor.item())
+
+
+def all_reduce_gradients(optimizer: torch.optim.Optimizer) -> None:
+    """
+    Replaces the gradients of the parameters of an optimizer by their mean over the ranks.
+    Call between the backward pass and the optimizer step. The gradients are reduced in
+    one flat tensor to make a single collective.
+    :param optimizer: The optimizer of the parameters.
+    """
+    if not is_distributed():
+        return
+    grads: List[torch.Tensor] = [
+        param.grad
+        for group in optimizer.param_groups
+        for param in group["params"]
+        if param.grad is not None
+    ]
+    if not grads:
+        return
+    flat_grads = torch.cat([grad.reshape(-1) for grad in grads])
+    torch.distributed.all_reduce(flat_grads, group=_get_group())
+    flat_grads /= _world_size
+    offset = 0
+    for grad in grads:
+        grad.copy_(flat_grads[offset : offset + grad.numel()].view_as(grad))
+        offset += grad.numel()
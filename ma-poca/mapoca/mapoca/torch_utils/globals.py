@@ -11,3 +11,11 @@ def get_rank() -> Optional[int]:
     :return:
     """
     return _rank
+
+
+def set_rank(rank: Optional[int]) -> None:
+    """
+    Sets the rank of the current node, e.g. when joining data-parallel training.
+    """
+    global _rank
+    _rank = rank
@@ -39,10 +39,14 @@ os.environ["KMP_BLOCKTIME"] = "0"
 
 
 _device = torch.device("cpu")
+_jit_inference = False
+_quantized_inference = False
 
 
 def set_torch_config(torch_settings: TorchSettings) -> None:
     global _device
+    global _jit_inference
+    global _quantized_inference
 
     if torch_settings.device is None:
         device_str = "cuda" if torch.cuda.is_available() else "cpu"
@@ -56,6 +60,8 @@ def set_torch_config(torch_settings: TorchSettings) -> None:
     else:
         torch.set_default_tensor_type(torch.FloatTensor)
     logger.debug(f"default Torch device: {_device}")
+    _jit_inference = torch_settings.jit_inference
+    _quantized_inference = torch_settings.quantized_inference
 
 
 # Initialize to default settings
@@ -66,3 +72,11 @@ nn = torch.nn
 
 def default_device():
     return _device
+
+
+def use_jit_inference() -> bool:
+    return _jit_inference
+
+
+def use_quantized_inference() -> bool:
+    return _quantized_inference
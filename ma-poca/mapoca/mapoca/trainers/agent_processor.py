@@ -1,6 +1,7 @@
 import sys
 import numpy as np
-from typing import List, Dict, TypeVar, Generic, Tuple, Any, Union
+from typing import List, Dict, TypeVar, Generic, Tuple, Any, Union, Optional
+from multiprocessing.context import BaseContext
 from collections import defaultdict, Counter
 import queue
 
@@ -99,9 +100,13 @@ class AgentProcessor:
         :param previous_action: The outputs of the Policy's get_action method.
         """
         take_action_outputs = previous_action.outputs
-        if take_action_outputs:
+        if take_action_outputs and "entropy" in take_action_outputs:
             for _entropy in take_action_outputs["entropy"]:
                 self._stats_reporter.add_stat("Policy/Entropy", _entropy)
+        if take_action_outputs and "quantization_kl" in take_action_outputs:
+            self._stats_reporter.add_stat(
+                "Policy/Quantization KL", take_action_outputs["quantization_kl"]
+            )
 
         # Make unique agent_ids that are global across workers
         action_global_agent_ids = [
@@ -233,11 +238,22 @@ class AgentProcessor:
                 continuous=stored_actions.continuous[idx],
                 discrete=stored_actions.discrete[idx],
             )
-            stored_action_probs = stored_take_action_outputs["log_probs"]
-            log_probs_tuple = LogProbsTuple(
-                continuous=stored_action_probs.continuous[idx],
-                discrete=stored_action_probs.discrete[idx],
-            )
+            stored_action_probs = stored_take_action_outputs.get("log_probs")
+            if stored_action_probs is not None:
+                log_probs_tuple = LogProbsTuple(
+                    continuous=stored_action_probs.continuous[idx],
+                    discrete=stored_action_probs.discrete[idx],
+                )
+            else:
+                # The policy only sampled the action, its log probs are unknown.
+                log_probs_tuple = LogProbsTuple(
+                    continuous=np.full(
+                        action_tuple.continuous.shape, np.nan, dtype=np.float32
+                    ),
+                    discrete=np.full(
+                        action_tuple.discrete.shape, np.nan, dtype=np.float32
+                    ),
+                )
             action_mask = stored_decision_step.action_mask
             prev_action = self.policy.retrieve_previous_action([global_agent_id])[0, :]
 
@@ -335,6 +351,27 @@ class AgentProcessor:
         for _gid in all_gids:
             self._clean_agent_data(_gid)
 
+    def end_worker_episodes(self, worker_id: int) -> None:
+        """
+        Ends the episodes of the agents of a single environment worker, discarding their current
+        trajectories. Used when a worker is restarted, since its agents will not send a terminal step.
+        :param worker_id: Worker ID of the environment whose agents should be removed.
+        """
+        agent_prefix = get_global_agent_id(worker_id, "")
+        group_prefix = get_global_group_id(worker_id, "")
+        worker_gids = {
+            _gid
+            for _gid in list(self._experience_buffers.keys())
+            + list(self._last_step_result.keys())
+            if _gid.startswith(agent_prefix)
+        }
+        for _gid in worker_gids:
+            self._clean_agent_data(_gid)
+        for group_dict in (self._group_status, self._current_group_obs):
+            for _group_id in list(group_dict.keys()):
+                if _group_id.startswith(group_prefix):
+                    del group_dict[_group_id]
+
 
 class AgentManagerQueue(Generic[T]):
     """
@@ -350,13 +387,24 @@ class AgentManagerQueue(Generic[T]):
 
         pass
 
-    def __init__(self, behavior_id: str, maxlen: int = 0):
+    def __init__(
+        self,
+        behavior_id: str,
+        maxlen: int = 0,
+        multiprocessing_context: Optional[BaseContext] = None,
+    ):
         """
         Initializes an AgentManagerQueue. Note that we can give it a behavior_id so that it can be identified
         separately from an AgentManager.
+        :param multiprocessing_context: If set, the queue is a multiprocessing queue of this context,
+        so that it can be passed to a process started from the same context.
         """
         self._maxlen: int = maxlen
-        self._queue: queue.Queue = queue.Queue(maxsize=maxlen)
+        self._queue: Union[queue.Queue, Any] = (
+            queue.Queue(maxsize=maxlen)
+            if multiprocessing_context is None
+            else multiprocessing_context.Queue(maxsize=maxlen)
+        )
         self._behavior_id = behavior_id
 
     @property
@@ -395,6 +443,16 @@ class AgentManagerQueue(Generic[T]):
         except queue.Empty:
             raise self.Empty("The AgentManagerQueue is empty.")
 
+    def get(self, timeout: float) -> T:
+        """
+        Gets the next item from the queue, waiting for at most timeout seconds, throwing
+        an AgentManagerQueue.Empty exception if the queue is still empty.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise self.Empty("The AgentManagerQueue is empty.")
+
     def put(self, item: T) -> None:
         self._queue.put(item)
 
@@ -412,12 +470,17 @@ class AgentManager(AgentProcessor):
         stats_reporter: StatsReporter,
         max_trajectory_length: int = sys.maxsize,
         threaded: bool = True,
+        trajectory_queue: Optional[AgentManagerQueue[Trajectory]] = None,
     ):
         super().__init__(policy, behavior_id, stats_reporter, max_trajectory_length)
         trajectory_queue_len = 20 if threaded else 0
-        self.trajectory_queue: AgentManagerQueue[Trajectory] = AgentManagerQueue(
-            self._behavior_id, maxlen=trajectory_queue_len
-        )
+        # The trainer can provide its own trajectory queue, e.g. to receive the
+        # trajectories in another process
+        if trajectory_queue is None:
+            trajectory_queue = AgentManagerQueue(
+                self._behavior_id, maxlen=trajectory_queue_len
+            )
+        self.trajectory_queue: AgentManagerQueue[Trajectory] = trajectory_queue
         # NOTE: we make policy queues of infinite length to avoid lockups of the trainers.
         # In the environment manager, we make sure to empty the policy queue before continuing to produce steps.
         self.policy_queue: AgentManagerQueue[Policy] = AgentManagerQueue(
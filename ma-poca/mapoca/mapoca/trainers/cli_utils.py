@@ -161,6 +161,95 @@ def _create_parser() -> argparse.ArgumentParser:
         "from when training",
         action=DetectDefault,
     )
+    argparser.add_argument(
+        "--min-num-envs",
+        default=-1,
+        type=int,
+        help="The minimum number of concurrent Unity environment instances. If this or "
+        "--max-num-envs differs from --num-envs, environment instances are added or removed during "
+        "training depending on whether the environments or the trainers are the bottleneck. "
+        "Set to -1 to use --num-envs.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--max-num-envs",
+        default=-1,
+        type=int,
+        help="The maximum number of concurrent Unity environment instances. Set to -1 to use "
+        "--num-envs.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--max-lifetime-restarts",
+        default=0,
+        type=int,
+        help="The max number of times a single environment worker can crash or time out and be "
+        "restarted before the training run is stopped. Set to -1 for an unlimited number of "
+        "restarts. The default of 0 disables restarts: any environment failure ends the run.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--restarts-rate-limit-n",
+        default=1,
+        type=int,
+        help="The maximum number of times a single environment worker can be restarted within "
+        "--restarts-rate-limit-period-s seconds. Set to -1 to disable the rate limit.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--restarts-rate-limit-period-s",
+        default=60,
+        type=int,
+        help="The period of time (in seconds) over which --restarts-rate-limit-n is enforced.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--worker-timeout",
+        default=-1,
+        type=float,
+        dest="worker_timeout_s",
+        help="The number of seconds an environment worker can take to respond to a step before "
+        "it is considered unresponsive and restarted. Only used when restarts are enabled with "
+        "--max-lifetime-restarts. Set to -1 to never time out workers.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--worker-stats-interval-steps",
+        default=1,
+        type=int,
+        help="The number of steps over which each environment worker accumulates its timers and "
+        "environment stats before sending them to the trainer process. Set to -1 to only use "
+        "--worker-stats-interval-s. Timers and stats not sent yet are sent when the worker closes.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--worker-stats-interval-s",
+        default=-1,
+        type=float,
+        help="The number of seconds over which each environment worker accumulates its timers and "
+        "environment stats before sending them to the trainer process. Set to -1 to only use "
+        "--worker-stats-interval-steps. At least one of the two intervals must be positive.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--worker-start-method",
+        default=None,
+        choices=["fork", "spawn", "forkserver"],
+        help="The multiprocessing start method used to launch the environment workers. If not set, "
+        "the platform default is used. forkserver imports the training modules once in a server "
+        "process and forks the workers from it, which speeds up launching many environments.",
+        action=DetectDefault,
+    )
+    argparser.add_argument(
+        "--in-process-envs",
+        default=False,
+        action=DetectDefaultStoreTrue,
+        help="Whether to step the environments in a pool of threads of the trainer process instead "
+        "of in separate worker processes. This avoids the process and communication overhead for "
+        "environments that run in Python, such as the particle environments, and is most useful when "
+        "the environment releases the GIL while stepping. The options of the worker processes, such as "
+        "--worker-timeout, can't be used with it.",
+    )
     argparser.add_argument(
         "--debug",
         default=False,
@@ -261,6 +350,47 @@ def _create_parser() -> argparse.ArgumentParser:
         action=DetectDefault,
         help='Settings for the default torch.device used in training, for example, "cpu", "cuda", or "cuda:0"',
     )
+    torch_conf.add_argument(
+        "--jit-inference",
+        default=False,
+        action=DetectDefaultStoreTrue,
+        help="Whether to trace the actor with TorchScript to sample the actions during the rollouts. "
+        "The traced actor is refreshed when the trainer publishes new weights, and the policy falls "
+        "back to eager mode if the actor cannot be traced.",
+    )
+    torch_conf.add_argument(
+        "--quantized-inference",
+        default=False,
+        action=DetectDefaultStoreTrue,
+        help="Whether to sample the actions during the rollouts with a copy of the actor whose linear "
+        "layers are dynamically quantized to int8. The copy is rebuilt when the trainer publishes new "
+        "weights, and is only supported on CPU. Takes precedence over --jit-inference.",
+    )
+    torch_conf.add_argument(
+        "--world-size",
+        default=1,
+        type=int,
+        help="The number of trainer processes of a data-parallel training run. Each process runs "
+        "its own --num-envs environments and the processes average their gradients with gloo, so "
+        "that one run can use all the cores of one or several CPU nodes. Launch one process per "
+        "rank with the same options and a different --rank.",
+        action=DetectDefault,
+    )
+    torch_conf.add_argument(
+        "--rank",
+        default=0,
+        type=int,
+        help="The rank of this trainer process in data-parallel training, from 0 to "
+        "(world_size - 1). Only rank 0 saves the models and writes the stats.",
+        action=DetectDefault,
+    )
+    torch_conf.add_argument(
+        "--dist-init-method",
+        default="tcp://127.0.0.1:29500",
+        help="The URL the data-parallel trainer processes use to find each other, e.g. "
+        '"tcp://<address of rank 0>:<port>" to train across nodes.',
+        action=DetectDefault,
+    )
     return argparser
 
 
@@ -0,0 +1,87 @@
+import time
+from typing import List, Optional
+
+from mlagents_envs.logging_util import get_logger
+from mapoca.trainers.agent_processor import AgentManagerQueue
+from mapoca.torch_utils.cpu_utils import get_cpu_headroom
+
+logger = get_logger(__name__)
+
+# Minimum time between two changes of the number of environments.
+SCALING_INTERVAL_S = 60.0
+# Above this fraction of time spent by the trainers (or this fill ratio of the trajectory
+# queues), the trainers are the bottleneck and an environment is removed.
+TRAINER_BOUND_THRESHOLD = 0.75
+# Below this fraction, the trainers are waiting on the environments and one is added.
+ENV_BOUND_THRESHOLD = 0.25
+
+
+class ElasticEnvScaler:
+    """
+    Decides when to add or remove environment workers, by comparing how fast the environments
+    produce experiences to how fast the trainers consume them.
+    For threaded trainers, this is measured by how full the trajectory queues are. Otherwise, it
+    is measured by the share of the main loop spent outside of stepping the environments, i.e.
+    processing the steps and advancing the trainers.
+    Environments are only added if there is at least one idle CPU.
+    """
+
+    def __init__(
+        self, min_envs: int, max_envs: int, interval_s: float = SCALING_INTERVAL_S
+    ):
+        self.min_envs = min_envs
+        self.max_envs = max_envs
+        self.interval_s = interval_s
+        self._env_time = 0.0
+        self._trainer_time = 0.0
+        self._last_decision_time = time.time()
+
+    def record_step(self, env_time: float, trainer_time: float) -> None:
+        """
+        Records the time spent in one iteration of the main loop.
+        :param env_time: Time spent waiting on the environments to step.
+        :param trainer_time: Time spent outside of stepping the environments.
+        """
+        self._env_time += env_time
+        self._trainer_time += trainer_time
+
+    def get_scaling(
+        self, num_envs: int, trajectory_queues: List[AgentManagerQueue]
+    ) -> int:
+        """
+        Returns the number of environments to add (1), remove (-1), or 0 to keep the current number.
+        :param num_envs: The current number of environments.
+        :param trajectory_queues: The trajectory queues of the AgentManagers.
+        """
+        if time.time() - self._last_decision_time < self.interval_s:
+            return 0
+        trainer_load = self._get_trainer_load(trajectory_queues)
+        self._env_time = 0.0
+        self._trainer_time = 0.0
+        self._last_decision_time = time.time()
+        if trainer_load is None:
+            return 0
+        if trainer_load > TRAINER_BOUND_THRESHOLD and num_envs > self.min_envs:
+            logger.info(
+                f"Trainers are the bottleneck (load {trainer_load:.2f}), removing an environment."
+            )
+            return -1
+        if trainer_load < ENV_BOUND_THRESHOLD and num_envs < self.max_envs:
+            cpu_headroom = get_cpu_headroom()
+            if cpu_headroom is None or cpu_headroom >= 1.0:
+                logger.info(
+                    f"Environments are the bottleneck (load {trainer_load:.2f}), adding an environment."
+                )
+                return 1
+        return 0
+
+    def _get_trainer_load(
+        self, trajectory_queues: List[AgentManagerQueue]
+    ) -> Optional[float]:
+        bounded_queues = [q for q in trajectory_queues if q.maxlen > 0]
+        if bounded_queues:
+            return max(q.qsize() / q.maxlen for q in bounded_queues)
+        total_time = self._env_time + self._trainer_time
+        if total_time <= 0:
+            return None
+        return self._trainer_time / total_time
@@ -43,6 +43,7 @@ class EnvManager(ABC):
         self.first_step_infos: List[EnvironmentStep] = []
 
     def set_policy(self, brain_name: BehaviorName, policy: Policy) -> None:
+        policy.on_weights_updated()
         self.policies[brain_name] = policy
         if brain_name in self.agent_managers:
             self.agent_managers[brain_name].policy = policy
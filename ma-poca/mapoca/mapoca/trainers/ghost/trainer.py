@@ -186,6 +186,18 @@ class GhostTrainer(Trainer):
         """
         self.policy_elos[self.current_opponent] -= change
 
+    @staticmethod
+    def _has_action_only_steps(trajectory: Trajectory) -> bool:
+        """
+        Whether some steps of the trajectory were taken by an action only policy, i.e.
+        their log probs are NaN.
+        """
+        return any(
+            np.isnan(step.action_probs.continuous).any()
+            or np.isnan(step.action_probs.discrete).any()
+            for step in trajectory.steps
+        )
+
     def _process_trajectory(self, trajectory: Trajectory) -> None:
         """
         Determines the final result of an episode and asks the GhostController
@@ -234,8 +246,13 @@ class GhostTrainer(Trainer):
                     # being emptied, the trajectories in the queue are on-policy.
                     for _ in range(trajectory_queue.qsize()):
                         t = trajectory_queue.get_nowait()
-                        # adds to wrapped trainers queue
-                        internal_trajectory_queue.put(t)
+                        if self.is_training and self._has_action_only_steps(t):
+                            # Some steps were taken before the team started learning and
+                            # have no log probs, so they can't be used for training.
+                            self.ghost_step += len(t.steps)
+                        else:
+                            # adds to wrapped trainers queue
+                            internal_trajectory_queue.put(t)
                         self._process_trajectory(t)
                 except AgentManagerQueue.Empty:
                     pass
@@ -279,6 +296,7 @@ class GhostTrainer(Trainer):
                     )
                     policy = self.get_policy(behavior_id)
                     policy.load_weights(self.current_policy_snapshot[brain_name])
+                    policy.action_only = not self.is_training
                     name_to_policy_queue[brain_name].put(policy)
 
         # CASE 2: Current learning team is managed by this GhostTrainer.
@@ -301,6 +319,7 @@ class GhostTrainer(Trainer):
                 behavior_id = create_name_behavior_id(brain_name, next_learning_team)
                 policy = self.get_policy(behavior_id)
                 policy.load_weights(self.current_policy_snapshot[brain_name])
+                policy.action_only = not self.is_training
                 name_to_policy_queue[brain_name].put(policy)
 
         # Note save and swap should be on different step counters.
@@ -350,6 +369,9 @@ class GhostTrainer(Trainer):
         )
         team_id = parsed_behavior_id.team_id
         self.controller.subscribe_team_id(team_id, self)
+        policy.action_only = (
+            not self.is_training or team_id != self.controller.get_learning_team
+        )
 
         # First policy or a new agent on the same team encountered
         if self.wrapped_trainer_team is None or team_id == self.wrapped_trainer_team:
@@ -432,6 +454,8 @@ class GhostTrainer(Trainer):
                 behavior_id = create_name_behavior_id(brain_name, team_id)
                 policy = self.get_policy(behavior_id)
                 policy.load_weights(snapshot[brain_name])
+                # The trajectories of the ghosted team are discarded
+                policy.action_only = True
                 name_to_policy_queue[brain_name].put(policy)
                 logger.debug(
                     "Step {}: Swapping snapshot {} to id {} with team {} learning".format(
@@ -1,5 +1,6 @@
 # # Unity ML-Agents Toolkit
 from mapoca import torch_utils
+from mapoca.torch_utils import distributed
 import yaml
 
 import os
@@ -22,7 +23,9 @@ from mapoca.trainers.settings import RunOptions
 
 from mapoca.trainers.training_status import GlobalTrainingStatus
 from mlagents_envs.base_env import BaseEnv
+from mapoca.trainers.env_manager import EnvManager
 from mapoca.trainers.subprocess_env_manager import SubprocessEnvManager
+from mapoca.trainers.thread_env_manager import ThreadEnvManager
 from mlagents_envs.side_channel.side_channel import SideChannel
 from mlagents_envs.timers import (
     hierarchical_timer,
@@ -59,6 +62,7 @@ def run_training(run_seed: int, options: RunOptions) -> None:
     """
     with hierarchical_timer("run_training.setup"):
         torch_utils.set_torch_config(options.torch_settings)
+        run_seed = distributed.init_distributed(options.torch_settings, run_seed)
         checkpoint_settings = options.checkpoint_settings
         env_settings = options.env_settings
         engine_settings = options.engine_settings
@@ -66,12 +70,15 @@ def run_training(run_seed: int, options: RunOptions) -> None:
         run_logs_dir = checkpoint_settings.run_logs_dir
         port: Optional[int] = env_settings.base_port
         # Check if directory exists
-        validate_existing_directories(
-            checkpoint_settings.write_path,
-            checkpoint_settings.resume,
-            checkpoint_settings.force,
-            checkpoint_settings.maybe_init_path,
-        )
+        if distributed.is_main_rank():
+            validate_existing_directories(
+                checkpoint_settings.write_path,
+                checkpoint_settings.resume,
+                checkpoint_settings.force,
+                checkpoint_settings.maybe_init_path,
+            )
+        # Don't let the other ranks create the directories before rank 0 checks them
+        distributed.barrier()
         # Make run logs directory
         os.makedirs(run_logs_dir, exist_ok=True)
         # Load any needed states
@@ -81,9 +88,16 @@ def run_training(run_seed: int, options: RunOptions) -> None:
             )
 
         # Configure Tensorboard Writers and StatsReporter
-        stats_writers = register_stats_writer_plugins(options)
-        for sw in stats_writers:
-            StatsReporter.add_writer(sw)
+        if distributed.is_main_rank():
+            stats_writers = register_stats_writer_plugins(options)
+            for sw in stats_writers:
+                StatsReporter.add_writer(sw)
+
+        # In data-parallel training, each rank runs its own slice of environment workers
+        first_worker_id = 0
+        if distributed.is_distributed():
+            max_num_envs = max(env_settings.num_envs, env_settings.max_num_envs)
+            first_worker_id = options.torch_settings.rank * max_num_envs
 
         env_factory = create_environment_factory(
             env_settings.env_name,
@@ -92,9 +106,16 @@ def run_training(run_seed: int, options: RunOptions) -> None:
             port,
             env_settings.env_args,
             os.path.abspath(run_logs_dir),  # Unity environment requires absolute path
+            first_worker_id,
         )
 
-        env_manager = SubprocessEnvManager(env_factory, options, env_settings.num_envs)
+        env_manager: EnvManager
+        if env_settings.in_process_envs:
+            env_manager = ThreadEnvManager(env_factory, options, env_settings.num_envs)
+        else:
+            env_manager = SubprocessEnvManager(
+                env_factory, options, env_settings.num_envs
+            )
         env_parameter_manager = EnvironmentParameterManager(
             options.environment_parameters, run_seed, restore=checkpoint_settings.resume
         )
@@ -124,9 +145,11 @@ def run_training(run_seed: int, options: RunOptions) -> None:
         tc.start_learning(env_manager)
     finally:
         env_manager.close()
-        write_run_options(checkpoint_settings.write_path, options)
-        write_timing_tree(run_logs_dir)
-        write_training_status(run_logs_dir)
+        if distributed.is_main_rank():
+            write_run_options(checkpoint_settings.write_path, options)
+            write_timing_tree(run_logs_dir)
+            write_training_status(run_logs_dir)
+        distributed.destroy_distributed()
 
 
 def write_run_options(output_dir: str, run_options: RunOptions) -> None:
@@ -165,10 +188,12 @@ def create_environment_factory(
     start_port: Optional[int],
     env_args: Optional[List[str]],
     log_folder: str,
+    first_worker_id: int = 0,
 ) -> Callable[[int, List[SideChannel]], BaseEnv]:
     def create_unity_environment(
         worker_id: int, side_channels: List[SideChannel]
     ) -> UnityEnvironment:
+        worker_id += first_worker_id
         # Make sure that each environment gets a different seed
         env_seed = seed + worker_id
         return mapoca_registry[env_name].make(
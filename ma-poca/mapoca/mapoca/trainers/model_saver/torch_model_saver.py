@@ -122,6 +122,8 @@ class TorchModelSaver(BaseModelSaver):
                 logger.warning(f"Failed to load for module {name}. Initializing")
                 logger.debug(f"Module loading error : {err}")
 
+        policy.publish_weights()
+
         if reset_global_steps:
             policy.set_step(0)
             logger.info(
@@ -1,7 +1,6 @@
 from typing import Dict, Optional, Tuple, List
 from mapoca.torch_utils import torch
 import numpy as np
-from collections import defaultdict
 
 from mapoca.trainers.buffer import AgentBuffer, AgentBufferField
 from mapoca.trainers.trajectory import ObsUtil
@@ -15,6 +14,7 @@ from mapoca.trainers.settings import (
     RewardSignalSettings,
     RewardSignalType,
 )
+from mapoca.trainers.torch.tensor_buffer import TensorBuffer
 from mapoca.trainers.torch.utils import ModelUtils
 
 
@@ -48,6 +48,25 @@ class TorchOptimizer(Optimizer):
     def update(self, batch: AgentBuffer, num_sequences: int) -> Dict[str, float]:
         pass
 
+    def _update_reward_providers(self, batch: TensorBuffer) -> Dict[str, float]:
+        """
+        Updates the reward providers that have modules to train with a batch of
+        experiences. The other ones don't need the batch as an AgentBuffer.
+        :param batch: Batch of experiences.
+        :return: Results of the updates.
+        """
+        update_stats: Dict[str, float] = {}
+        reward_providers = [
+            reward_provider
+            for reward_provider in self.reward_signals.values()
+            if reward_provider.get_modules()
+        ]
+        if reward_providers:
+            agent_buffer = batch.to_agent_buffer()
+            for reward_provider in reward_providers:
+                update_stats.update(reward_provider.update(agent_buffer))
+        return update_stats
+
     def create_reward_signals(
         self, reward_signal_configs: Dict[RewardSignalType, RewardSignalSettings]
     ) -> None:
@@ -61,12 +80,26 @@ class TorchOptimizer(Optimizer):
                 reward_signal, self.policy.behavior_spec, settings
             )
 
+    def _memories_to_buffer_field(
+        self, sequence_memories: torch.Tensor, num_experiences: int
+    ) -> AgentBufferField:
+        """
+        Creates the AgentBufferField of the initial memories of a trajectory, which has the
+        initial memory of its sequence for each step. When the trajectory is added to the
+        update buffer, only the memory of the first step of each sequence is used.
+        :param sequence_memories: The initial memories of the sequences of the trajectory.
+        :param num_experiences: The length of the trajectory.
+        """
+        memories = ModelUtils.to_numpy(sequence_memories)
+        steps = np.arange(num_experiences) // self.policy.sequence_length
+        return AgentBufferField(list(memories[steps]))
+
     def _evaluate_by_sequence(
         self, tensor_obs: List[torch.Tensor], initial_memory: torch.Tensor
     ) -> Tuple[Dict[str, torch.Tensor], AgentBufferField, torch.Tensor]:
         """
-        Evaluate a trajectory sequence-by-sequence, assembling the result. This enables us to get the
-        intermediate memories for the critic.
+        Evaluate a trajectory in a single pass, and get the intermediate memories for the critic
+        at the start of each sequence from the LSTM.
         :param tensor_obs: A List of tensors of shape (trajectory_len, <obs_dim>) that are the agent's
             observations for this trajectory.
         :param initial_memory: The memory that preceeds this trajectory. Of shape (1,1,<mem_size>), i.e.
@@ -75,59 +108,17 @@ class TorchOptimizer(Optimizer):
             memories to be used during value function update, and the final memory at the end of the trajectory.
         """
         num_experiences = tensor_obs[0].shape[0]
-        all_next_memories = AgentBufferField()
-        # When using LSTM, we need to divide the trajectory into sequences of equal length. Sometimes,
-        # that division isn't even, and we must pad the leftover sequence.
-        # When it is added to the buffer, the last sequence will be padded. So if seq_len = 3 and
-        # trajectory is of length 10, the last sequence is [obs,pad,pad] once it is added to the buffer.
-        # Compute the number of elements in this sequence that will end up being padded.
-        leftover_seq_len = num_experiences % self.policy.sequence_length
-
-        all_values: Dict[str, List[np.ndarray]] = defaultdict(list)
-        _mem = initial_memory
-        # Evaluate other trajectories, carrying over _mem after each
-        # trajectory
-        for seq_num in range(num_experiences // self.policy.sequence_length):
-            seq_obs = []
-            for _ in range(self.policy.sequence_length):
-                all_next_memories.append(ModelUtils.to_numpy(_mem.squeeze()))
-            start = seq_num * self.policy.sequence_length
-            end = (seq_num + 1) * self.policy.sequence_length
-
-            for _obs in tensor_obs:
-                seq_obs.append(_obs[start:end])
-            values, _mem = self.critic.critic_pass(
-                seq_obs, _mem, sequence_length=self.policy.sequence_length
+        lstm = self.critic.network_body.lstm
+        # Evaluating the trajectory sequence by sequence, carrying over the memory, is
+        # the same as evaluating it as a single sequence.
+        with lstm.recording_passes() as recorded_passes:
+            all_value_tensors, next_mem = self.critic.critic_pass(
+                tensor_obs, initial_memory, sequence_length=num_experiences
             )
-            for signal_name, _val in values.items():
-                all_values[signal_name].append(_val)
-
-        # Compute values for the potentially truncated last sequence. Note that this
-        # sequence isn't padded yet, but will be.
-        seq_obs = []
-
-        if leftover_seq_len > 0:
-            for _obs in tensor_obs:
-                last_seq_obs = _obs[-leftover_seq_len:]
-                seq_obs.append(last_seq_obs)
-
-            # For the last sequence, the initial memory should be the one at the
-            # end of this trajectory.
-            for _ in range(leftover_seq_len):
-                all_next_memories.append(ModelUtils.to_numpy(_mem.squeeze()))
-
-            last_values, _mem = self.critic.critic_pass(
-                seq_obs, _mem, sequence_length=leftover_seq_len
-            )
-            for signal_name, _val in last_values.items():
-                all_values[signal_name].append(_val)
-
-        # Create one tensor per reward signal
-        all_value_tensors = {
-            signal_name: torch.cat(value_list, dim=0)
-            for signal_name, value_list in all_values.items()
-        }
-        next_mem = _mem
+        all_next_memories = self._memories_to_buffer_field(
+            lstm.sequence_memories(recorded_passes[0], self.policy.sequence_length),
+            num_experiences,
+        )
         return all_value_tensors, all_next_memories, next_mem
 
     def get_trajectory_value_estimates(
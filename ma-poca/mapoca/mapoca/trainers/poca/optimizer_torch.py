@@ -1,10 +1,10 @@
 from typing import Dict, cast, List, Tuple, Optional
-from collections import defaultdict
 from mapoca.trainers.torch.components.reward_providers.extrinsic_reward_provider import (
     ExtrinsicRewardProvider,
 )
 import numpy as np
 from mapoca.torch_utils import torch, default_device
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.buffer import (
     AgentBuffer,
@@ -26,7 +26,7 @@ from mapoca.trainers.settings import (
 from mapoca.trainers.torch.networks import Critic, MultiAgentNetworkBody
 from mapoca.trainers.torch.decoders import ValueHeads
 from mapoca.trainers.torch.agent_action import AgentAction
-from mapoca.trainers.torch.action_log_probs import ActionLogProbs
+from mapoca.trainers.torch.tensor_buffer import TensorBuffer
 from mapoca.trainers.torch.utils import ModelUtils
 from mapoca.trainers.trajectory import ObsUtil, GroupObsUtil
 from mapoca.trainers.settings import NetworkSettings
@@ -76,6 +76,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
             obs_with_actions: Tuple[List[List[torch.Tensor]], List[AgentAction]],
             memories: Optional[torch.Tensor] = None,
             sequence_length: int = 1,
+            groupmate_mask: Optional[torch.Tensor] = None,
         ) -> Tuple[Dict[str, torch.Tensor], torch.Tensor]:
             """
             The POCA baseline marginalizes the action of the agent associated with self_obs.
@@ -85,16 +86,24 @@ class TorchPOCAOptimizer(TorchOptimizer):
             :param obs_with_actions: Tuple of observations and actions for all groupmates.
             :param memories: If using memory, a Tensor of initial memories.
             :param sequence_length: If using memory, the sequence length.
+            :param groupmate_mask: The (batch, n_groupmates) mask that is 1 for the padded
+                groupmates, as created by GroupObsUtil.padding_mask_from_buffer. If None,
+                the padded groupmates are the ones with NaN observations.
 
             :return: A Tuple of Dict of reward stream to tensor and critic memories.
             """
             (obs, actions) = obs_with_actions
+            self_mask = None
+            if groupmate_mask is not None:
+                self_mask = torch.zeros((obs_without_actions[0].shape[0], 1))
             encoding, memories = self.network_body(
                 obs_only=[obs_without_actions],
                 obs=obs,
                 actions=actions,
                 memories=memories,
                 sequence_length=sequence_length,
+                obs_only_mask=self_mask,
+                obs_mask=groupmate_mask,
             )
 
             value_outputs, critic_mem_out = self.forward(
@@ -107,6 +116,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
             obs: List[List[torch.Tensor]],
             memories: Optional[torch.Tensor] = None,
             sequence_length: int = 1,
+            groupmate_mask: Optional[torch.Tensor] = None,
         ) -> Tuple[Dict[str, torch.Tensor], torch.Tensor]:
             """
             A centralized value function. It calls the forward pass of MultiAgentNetworkBody
@@ -114,14 +124,22 @@ class TorchPOCAOptimizer(TorchOptimizer):
             :param obs: List of observations for all agents in group
             :param memories: If using memory, a Tensor of initial memories.
             :param sequence_length: If using memory, the sequence length.
+            :param groupmate_mask: The (batch, len(obs) - 1) mask that is 1 for the padded
+                agents of obs[1:], i.e. the groupmates of the agent of obs[0]. If None,
+                the padded agents are the ones with NaN observations.
             :return: A Tuple of Dict of reward stream to tensor and critic memories.
             """
+            obs_mask = None
+            if groupmate_mask is not None:
+                self_mask = torch.zeros((groupmate_mask.shape[0], 1))
+                obs_mask = torch.cat([self_mask, groupmate_mask], dim=1)
             encoding, memories = self.network_body(
                 obs_only=obs,
                 obs=[],
                 actions=[],
                 memories=memories,
                 sequence_length=sequence_length,
+                obs_only_mask=obs_mask,
             )
 
             value_outputs, critic_mem_out = self.forward(
@@ -129,6 +147,49 @@ class TorchPOCAOptimizer(TorchOptimizer):
             )
             return value_outputs, critic_mem_out
 
+        def critic_and_baseline_pass(
+            self,
+            obs: List[List[torch.Tensor]],
+            groupmate_actions: List[AgentAction],
+            value_memories: Optional[torch.Tensor] = None,
+            baseline_memories: Optional[torch.Tensor] = None,
+            sequence_length: int = 1,
+            groupmate_mask: Optional[torch.Tensor] = None,
+        ) -> Tuple[
+            Dict[str, torch.Tensor], torch.Tensor, Dict[str, torch.Tensor], torch.Tensor
+        ]:
+            """
+            Computes both critic_pass(obs) and baseline(obs[0], (obs[1:], groupmate_actions)),
+            encoding the observations of each agent only once.
+            :param obs: List of observations of the agent followed by the ones of its groupmates.
+            :param groupmate_actions: The actions of the groupmates.
+            :param value_memories: If using memory, a Tensor of initial value memories.
+            :param baseline_memories: If using memory, a Tensor of initial baseline memories.
+            :param sequence_length: If using memory, the sequence length.
+            :param groupmate_mask: The (batch, n_groupmates) mask that is 1 for the padded
+                groupmates. If None, the padded groupmates are the ones with NaN observations.
+            :return: A Tuple of the values, the value memories, the baselines and the baseline
+                memories.
+            """
+            (
+                (value_encoding, value_memories),
+                (baseline_encoding, baseline_memories),
+            ) = self.network_body.value_and_baseline(
+                obs,
+                groupmate_actions,
+                value_memories,
+                baseline_memories,
+                sequence_length,
+                groupmate_mask,
+            )
+            value_outputs, value_mem_out = self.forward(
+                value_encoding, value_memories, sequence_length
+            )
+            baseline_outputs, baseline_mem_out = self.forward(
+                baseline_encoding, baseline_memories, sequence_length
+            )
+            return value_outputs, value_mem_out, baseline_outputs, baseline_mem_out
+
         def forward(
             self,
             encoding: torch.Tensor,
@@ -221,6 +282,36 @@ class TorchPOCAOptimizer(TorchOptimizer):
     def critic(self):
         return self._critic
 
+    def get_update_tensors(self, buffer: AgentBuffer) -> TensorBuffer:
+        """
+        Converts the fields of an AgentBuffer used by update_from_tensors to tensors.
+        :param buffer: The update buffer, or a mini-batch of it.
+        """
+        n_obs = len(self.policy.behavior_spec.observation_specs)
+        keys = [ObsUtil.get_name_at(i) for i in range(n_obs)]
+        keys += [GroupObsUtil.get_name_at(i) for i in range(n_obs)]
+        for name in self.reward_signals:
+            keys += [
+                RewardSignalUtil.value_estimates_key(name),
+                RewardSignalUtil.returns_key(name),
+                RewardSignalUtil.baseline_estimates_key(name),
+            ]
+        keys += [
+            BufferKey.ACTION_MASK,
+            BufferKey.CONTINUOUS_ACTION,
+            BufferKey.DISCRETE_ACTION,
+            BufferKey.GROUP_CONTINUOUS_ACTION,
+            BufferKey.GROUP_DISCRETE_ACTION,
+            BufferKey.CONTINUOUS_LOG_PROBS,
+            BufferKey.DISCRETE_LOG_PROBS,
+            BufferKey.MEMORY,
+            BufferKey.CRITIC_MEMORY,
+            BufferKey.BASELINE_MEMORY,
+            BufferKey.MASKS,
+            BufferKey.ADVANTAGES,
+        ]
+        return TensorBuffer.from_buffer(buffer, self.policy.sequence_length, keys)
+
     @timed
     def update(self, batch: AgentBuffer, num_sequences: int) -> Dict[str, float]:
         """
@@ -229,6 +320,18 @@ class TorchPOCAOptimizer(TorchOptimizer):
         :param num_sequences: Number of sequences to process.
         :return: Results of update.
         """
+        return self.update_from_tensors(self.get_update_tensors(batch), num_sequences)
+
+    @timed
+    def update_from_tensors(
+        self, batch: TensorBuffer, num_sequences: int
+    ) -> Dict[str, float]:
+        """
+        Performs update on model, from experiences already converted to tensors.
+        :param batch: Batch of experiences, as returned by get_update_tensors.
+        :param num_sequences: Number of sequences to process.
+        :return: Results of update.
+        """
         # Get decayed parameters
         decay_lr = self.decay_learning_rate.get_value(self.policy.get_current_step())
         decay_eps = self.decay_epsilon.get_value(self.policy.get_current_step())
@@ -237,53 +340,24 @@ class TorchPOCAOptimizer(TorchOptimizer):
         old_values = {}
         old_baseline_values = {}
         for name in self.reward_signals:
-            old_values[name] = ModelUtils.list_to_tensor(
-                batch[RewardSignalUtil.value_estimates_key(name)]
-            )
-            returns[name] = ModelUtils.list_to_tensor(
-                batch[RewardSignalUtil.returns_key(name)]
-            )
-            old_baseline_values[name] = ModelUtils.list_to_tensor(
-                batch[RewardSignalUtil.baseline_estimates_key(name)]
-            )
+            old_values[name] = batch[RewardSignalUtil.value_estimates_key(name)]
+            returns[name] = batch[RewardSignalUtil.returns_key(name)]
+            old_baseline_values[name] = batch[
+                RewardSignalUtil.baseline_estimates_key(name)
+            ]
 
         n_obs = len(self.policy.behavior_spec.observation_specs)
-        current_obs = ObsUtil.from_buffer(batch, n_obs)
-        # Convert to tensors
-        current_obs = [ModelUtils.list_to_tensor(obs) for obs in current_obs]
-        groupmate_obs = GroupObsUtil.from_buffer(batch, n_obs)
-        groupmate_obs = [
-            [ModelUtils.list_to_tensor(obs) for obs in _groupmate_obs]
-            for _groupmate_obs in groupmate_obs
-        ]
-
-        act_masks = ModelUtils.list_to_tensor(batch[BufferKey.ACTION_MASK])
-        actions = AgentAction.from_buffer(batch)
-        groupmate_actions = AgentAction.group_from_buffer(batch)
-
-        memories = [
-            ModelUtils.list_to_tensor(batch[BufferKey.MEMORY][i])
-            for i in range(0, len(batch[BufferKey.MEMORY]), self.policy.sequence_length)
-        ]
-        if len(memories) > 0:
-            memories = torch.stack(memories).unsqueeze(0)
-        value_memories = [
-            ModelUtils.list_to_tensor(batch[BufferKey.CRITIC_MEMORY][i])
-            for i in range(
-                0, len(batch[BufferKey.CRITIC_MEMORY]), self.policy.sequence_length
-            )
-        ]
+        current_obs = batch.obs(n_obs)
+        groupmate_obs = batch.group_obs(n_obs)
+        groupmate_mask = batch.group_mask
 
-        baseline_memories = [
-            ModelUtils.list_to_tensor(batch[BufferKey.BASELINE_MEMORY][i])
-            for i in range(
-                0, len(batch[BufferKey.BASELINE_MEMORY]), self.policy.sequence_length
-            )
-        ]
+        act_masks = batch[BufferKey.ACTION_MASK]
+        actions = batch.actions()
+        groupmate_actions = batch.group_actions()
 
-        if len(value_memories) > 0:
-            value_memories = torch.stack(value_memories).unsqueeze(0)
-            baseline_memories = torch.stack(baseline_memories).unsqueeze(0)
+        memories = batch.memories(BufferKey.MEMORY)
+        value_memories = batch.memories(BufferKey.CRITIC_MEMORY)
+        baseline_memories = batch.memories(BufferKey.BASELINE_MEMORY)
 
         log_probs, entropy = self.policy.evaluate_actions(
             current_obs,
@@ -293,21 +367,17 @@ class TorchPOCAOptimizer(TorchOptimizer):
             seq_len=self.policy.sequence_length,
         )
         all_obs = [current_obs] + groupmate_obs
-        values, _ = self.critic.critic_pass(
+        values, _, baselines, _ = self.critic.critic_and_baseline_pass(
             all_obs,
-            memories=value_memories,
-            sequence_length=self.policy.sequence_length,
-        )
-        groupmate_obs_and_actions = (groupmate_obs, groupmate_actions)
-        baselines, _ = self.critic.baseline(
-            current_obs,
-            groupmate_obs_and_actions,
-            memories=baseline_memories,
+            groupmate_actions,
+            value_memories=value_memories,
+            baseline_memories=baseline_memories,
             sequence_length=self.policy.sequence_length,
+            groupmate_mask=groupmate_mask,
         )
-        old_log_probs = ActionLogProbs.from_buffer(batch).flatten()
+        old_log_probs = batch.log_probs().flatten()
         log_probs = log_probs.flatten()
-        loss_masks = ModelUtils.list_to_tensor(batch[BufferKey.MASKS], dtype=torch.bool)
+        loss_masks = batch[BufferKey.MASKS]
 
         baseline_loss = ModelUtils.trust_region_value_loss(
             baselines, old_baseline_values, returns, decay_eps, loss_masks
@@ -316,7 +386,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
             values, old_values, returns, decay_eps, loss_masks
         )
         policy_loss = ModelUtils.trust_region_policy_loss(
-            ModelUtils.list_to_tensor(batch[BufferKey.ADVANTAGES]),
+            batch[BufferKey.ADVANTAGES],
             log_probs,
             old_log_probs,
             loss_masks,
@@ -333,7 +403,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
         ModelUtils.update_learning_rate(self.optimizer, decay_lr)
         self.optimizer.zero_grad()
         loss.backward()
-
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         update_stats = {
             # NOTE: abs() is not technically correct, but matches the behavior in TensorFlow.
@@ -346,8 +416,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
             "Policy/Beta": decay_bet,
         }
 
-        for reward_provider in self.reward_signals.values():
-            update_stats.update(reward_provider.update(batch))
+        update_stats.update(self._update_reward_providers(batch))
 
         return update_stats
 
@@ -362,6 +431,7 @@ class TorchPOCAOptimizer(TorchOptimizer):
         self_obs: List[torch.Tensor],
         obs: List[List[torch.Tensor]],
         actions: List[AgentAction],
+        groupmate_mask: torch.Tensor,
         init_value_mem: torch.Tensor,
         init_baseline_mem: torch.Tensor,
     ) -> Tuple[
@@ -373,132 +443,48 @@ class TorchPOCAOptimizer(TorchOptimizer):
         torch.Tensor,
     ]:
         """
-        Evaluate a trajectory sequence-by-sequence, assembling the result. This enables us to get the
-        intermediate memories for the critic.
-        :param tensor_obs: A List of tensors of shape (trajectory_len, <obs_dim>) that are the agent's
+        Evaluate a trajectory in a single pass, and get the intermediate memories for the critic
+        and the baseline at the start of each sequence from the LSTM.
+        :param self_obs: A List of tensors of shape (trajectory_len, <obs_dim>) that are the agent's
             observations for this trajectory.
-        :param initial_memory: The memory that preceeds this trajectory. Of shape (1,1,<mem_size>), i.e.
-            what is returned as the output of a MemoryModules.
-        :return: A Tuple of the value estimates as a Dict of [name, tensor], an AgentBufferField of the initial
-            memories to be used during value function update, and the final memory at the end of the trajectory.
+        :param obs: The observations of the groupmates for this trajectory.
+        :param actions: The actions of the groupmates for this trajectory.
+        :param groupmate_mask: The (trajectory_len, n_groupmates) mask that is 1 for the padded groupmates.
+        :param init_value_mem: The value memory that preceeds this trajectory. Of shape (1,1,<mem_size>),
+            i.e. what is returned as the output of a MemoryModules.
+        :param init_baseline_mem: The baseline memory that preceeds this trajectory.
+        :return: A Tuple of the value and baseline estimates as Dicts of [name, tensor], AgentBufferFields
+            of the initial value and baseline memories to be used during update, and the final value
+            and baseline memories at the end of the trajectory.
         """
         num_experiences = self_obs[0].shape[0]
-        all_next_value_mem = AgentBufferField()
-        all_next_baseline_mem = AgentBufferField()
-
-        # When using LSTM, we need to divide the trajectory into sequences of equal length. Sometimes,
-        # that division isn't even, and we must pad the leftover sequence.
-        # In the buffer, the last sequence are the ones that are padded. So if seq_len = 3 and
-        # trajectory is of length 10, the last sequence is [obs,pad,pad].
-        # Compute the number of elements in this padded seq.
-        leftover_seq_len = num_experiences % self.policy.sequence_length
-
-        all_values: Dict[str, List[np.ndarray]] = defaultdict(list)
-        all_baseline: Dict[str, List[np.ndarray]] = defaultdict(list)
-        _baseline_mem = init_baseline_mem
-        _value_mem = init_value_mem
-
-        # Evaluate other trajectories, carrying over _mem after each
-        # trajectory
-        for seq_num in range(num_experiences // self.policy.sequence_length):
-            for _ in range(self.policy.sequence_length):
-                all_next_value_mem.append(ModelUtils.to_numpy(_value_mem.squeeze()))
-                all_next_baseline_mem.append(
-                    ModelUtils.to_numpy(_baseline_mem.squeeze())
-                )
-
-            start = seq_num * self.policy.sequence_length
-            end = (seq_num + 1) * self.policy.sequence_length
-
-            self_seq_obs = []
-            groupmate_seq_obs = []
-            groupmate_seq_act = []
-            seq_obs = []
-            for _self_obs in self_obs:
-                seq_obs.append(_self_obs[start:end])
-            self_seq_obs.append(seq_obs)
-
-            for groupmate_obs, groupmate_action in zip(obs, actions):
-                seq_obs = []
-                for _obs in groupmate_obs:
-                    sliced_seq_obs = _obs[start:end]
-                    seq_obs.append(sliced_seq_obs)
-                groupmate_seq_obs.append(seq_obs)
-                _act = groupmate_action.slice(start, end)
-                groupmate_seq_act.append(_act)
-
-            all_seq_obs = self_seq_obs + groupmate_seq_obs
-            values, _value_mem = self.critic.critic_pass(
-                all_seq_obs, _value_mem, sequence_length=self.policy.sequence_length
-            )
-            for signal_name, _val in values.items():
-                all_values[signal_name].append(_val)
-
-            groupmate_obs_and_actions = (groupmate_seq_obs, groupmate_seq_act)
-            baselines, _baseline_mem = self.critic.baseline(
-                self_seq_obs[0],
-                groupmate_obs_and_actions,
-                _baseline_mem,
-                sequence_length=self.policy.sequence_length,
+        lstm = self.critic.network_body.lstm
+        # Evaluating the trajectory sequence by sequence, carrying over the memories, is
+        # the same as evaluating it as a single sequence.
+        with lstm.recording_passes() as recorded_passes:
+            (
+                all_value_tensors,
+                next_value_mem,
+                all_baseline_tensors,
+                next_baseline_mem,
+            ) = self.critic.critic_and_baseline_pass(
+                [self_obs] + obs,
+                actions,
+                init_value_mem,
+                init_baseline_mem,
+                sequence_length=num_experiences,
+                groupmate_mask=groupmate_mask,
             )
-            for signal_name, _val in baselines.items():
-                all_baseline[signal_name].append(_val)
-
-        # Compute values for the potentially truncated initial sequence
-        if leftover_seq_len > 0:
-            self_seq_obs = []
-            groupmate_seq_obs = []
-            groupmate_seq_act = []
-            seq_obs = []
-            for _self_obs in self_obs:
-                last_seq_obs = _self_obs[-leftover_seq_len:]
-                seq_obs.append(last_seq_obs)
-            self_seq_obs.append(seq_obs)
-
-            for groupmate_obs, groupmate_action in zip(obs, actions):
-                seq_obs = []
-                for _obs in groupmate_obs:
-                    last_seq_obs = _obs[-leftover_seq_len:]
-                    seq_obs.append(last_seq_obs)
-                groupmate_seq_obs.append(seq_obs)
-                _act = groupmate_action.slice(len(_obs) - leftover_seq_len, len(_obs))
-                groupmate_seq_act.append(_act)
-
-            # For the last sequence, the initial memory should be the one at the
-            # beginning of this trajectory.
-            seq_obs = []
-            for _ in range(leftover_seq_len):
-                all_next_value_mem.append(ModelUtils.to_numpy(_value_mem.squeeze()))
-                all_next_baseline_mem.append(
-                    ModelUtils.to_numpy(_baseline_mem.squeeze())
-                )
-
-            all_seq_obs = self_seq_obs + groupmate_seq_obs
-            last_values, _value_mem = self.critic.critic_pass(
-                all_seq_obs, _value_mem, sequence_length=leftover_seq_len
-            )
-            for signal_name, _val in last_values.items():
-                all_values[signal_name].append(_val)
-            groupmate_obs_and_actions = (groupmate_seq_obs, groupmate_seq_act)
-            last_baseline, _baseline_mem = self.critic.baseline(
-                self_seq_obs[0],
-                groupmate_obs_and_actions,
-                _baseline_mem,
-                sequence_length=leftover_seq_len,
-            )
-            for signal_name, _val in last_baseline.items():
-                all_baseline[signal_name].append(_val)
-        # Create one tensor per reward signal
-        all_value_tensors = {
-            signal_name: torch.cat(value_list, dim=0)
-            for signal_name, value_list in all_values.items()
-        }
-        all_baseline_tensors = {
-            signal_name: torch.cat(baseline_list, dim=0)
-            for signal_name, baseline_list in all_baseline.items()
-        }
-        next_value_mem = _value_mem
-        next_baseline_mem = _baseline_mem
+        # The value pass of the LSTM is made before the baseline pass
+        value_pass, baseline_pass = recorded_passes
+        all_next_value_mem = self._memories_to_buffer_field(
+            lstm.sequence_memories(value_pass, self.policy.sequence_length),
+            num_experiences,
+        )
+        all_next_baseline_mem = self._memories_to_buffer_field(
+            lstm.sequence_memories(baseline_pass, self.policy.sequence_length),
+            num_experiences,
+        )
         return (
             all_value_tensors,
             all_baseline_tensors,
@@ -569,6 +555,9 @@ class TorchPOCAOptimizer(TorchOptimizer):
             [ModelUtils.list_to_tensor(obs) for obs in _groupmate_obs]
             for _groupmate_obs in groupmate_obs
         ]
+        groupmate_mask = ModelUtils.list_to_tensor(
+            GroupObsUtil.padding_mask_from_buffer(batch)
+        )
 
         groupmate_actions = AgentAction.group_from_buffer(batch)
 
@@ -621,19 +610,23 @@ class TorchPOCAOptimizer(TorchOptimizer):
                     current_obs,
                     groupmate_obs,
                     groupmate_actions,
+                    groupmate_mask,
                     _init_value_mem,
                     _init_baseline_mem,
                 )
             else:
-                value_estimates, next_value_mem = self.critic.critic_pass(
-                    all_obs, _init_value_mem, sequence_length=batch.num_experiences
-                )
-                groupmate_obs_and_actions = (groupmate_obs, groupmate_actions)
-                baseline_estimates, next_baseline_mem = self.critic.baseline(
-                    current_obs,
-                    groupmate_obs_and_actions,
+                (
+                    value_estimates,
+                    next_value_mem,
+                    baseline_estimates,
+                    next_baseline_mem,
+                ) = self.critic.critic_and_baseline_pass(
+                    all_obs,
+                    groupmate_actions,
+                    _init_value_mem,
                     _init_baseline_mem,
                     sequence_length=batch.num_experiences,
+                    groupmate_mask=groupmate_mask,
                 )
         # Store the memory for the next trajectory
         self.value_memory_dict[agent_id] = next_value_mem
@@ -671,3 +664,117 @@ class TorchPOCAOptimizer(TorchOptimizer):
             all_next_value_mem,
             all_next_baseline_mem,
         )
+
+    def get_batched_trajectory_and_baseline_value_estimates(
+        self,
+        batch: AgentBuffer,
+        trajectory_lengths: List[int],
+        next_obs: List[List[np.ndarray]],
+        next_groupmate_obs: List[List[List[np.ndarray]]],
+        dones: List[bool],
+    ) -> Tuple[
+        List[Dict[str, np.ndarray]],
+        List[Dict[str, np.ndarray]],
+        List[Dict[str, np.ndarray]],
+    ]:
+        """
+        Get value estimates and baseline estimates for several trajectories at once, with a
+        single pass of the critic on their concatenation and a single pass for all of their
+        next observations. Only supported for non-recurrent critics.
+        :param batch: An AgentBuffer that consists of the concatenated trajectories.
+        :param trajectory_lengths: The number of experiences of each trajectory in batch.
+        :param next_obs: For each trajectory, the next observation (after the trajectory).
+        :param next_groupmate_obs: For each trajectory, the next observations from other
+            members of the group.
+        :param dones: For each trajectory, whether it is a terminal trajectory.
+        :returns: A Tuple of Lists with, for each trajectory, the Value Estimates as a Dict of
+            [name, np.ndarray(trajectory_len)], the baseline estimates as a Dict and the final
+            value estimate as a Dict of [name, np.ndarray(1)].
+        """
+        n_obs = len(self.policy.behavior_spec.observation_specs)
+
+        current_obs = [
+            ModelUtils.list_to_tensor(obs) for obs in ObsUtil.from_buffer(batch, n_obs)
+        ]
+        groupmate_obs = [
+            [ModelUtils.list_to_tensor(obs) for obs in _groupmate_obs]
+            for _groupmate_obs in GroupObsUtil.from_buffer(batch, n_obs)
+        ]
+        groupmate_mask = ModelUtils.list_to_tensor(
+            GroupObsUtil.padding_mask_from_buffer(batch)
+        )
+        groupmate_actions = AgentAction.group_from_buffer(batch)
+
+        # The next observations have one row per trajectory, the missing groupmates of
+        # the trajectories with fewer groupmates are padded with zeros.
+        num_next_groupmates = np.array(
+            [len(_groupmate_obs) for _groupmate_obs in next_groupmate_obs]
+        )
+        max_next_groupmates = int(num_next_groupmates.max())
+        next_self_obs = [
+            np.stack([_next_obs[i] for _next_obs in next_obs]) for i in range(n_obs)
+        ]
+        all_next_obs = [[ModelUtils.list_to_tensor(obs) for obs in next_self_obs]]
+        for j in range(max_next_groupmates):
+            all_next_obs.append(
+                [
+                    ModelUtils.list_to_tensor(
+                        np.stack(
+                            [
+                                _groupmate_obs[j][i]
+                                if j < len(_groupmate_obs)
+                                else np.zeros_like(next_self_obs[i][0])
+                                for _groupmate_obs in next_groupmate_obs
+                            ]
+                        )
+                    )
+                    for i in range(n_obs)
+                ]
+            )
+        next_groupmate_mask = ModelUtils.list_to_tensor(
+            (
+                np.arange(max_next_groupmates)[None, :]
+                >= num_next_groupmates[:, None]
+            ).astype(np.float32)
+        )
+
+        with torch.no_grad():
+            (
+                value_estimates,
+                _,
+                baseline_estimates,
+                _,
+            ) = self.critic.critic_and_baseline_pass(
+                [current_obs] + groupmate_obs,
+                groupmate_actions,
+                sequence_length=batch.num_experiences,
+                groupmate_mask=groupmate_mask,
+            )
+            next_value_estimates, _ = self.critic.critic_pass(
+                all_next_obs, sequence_length=1, groupmate_mask=next_groupmate_mask
+            )
+
+        split_indices = np.cumsum(trajectory_lengths)[:-1]
+        all_value_estimates: List[Dict[str, np.ndarray]] = [
+            {} for _ in trajectory_lengths
+        ]
+        all_baseline_estimates: List[Dict[str, np.ndarray]] = [
+            {} for _ in trajectory_lengths
+        ]
+        all_next_value_estimates: List[Dict[str, np.ndarray]] = [
+            {} for _ in trajectory_lengths
+        ]
+        for name in value_estimates:
+            values = np.split(ModelUtils.to_numpy(value_estimates[name]), split_indices)
+            baselines = np.split(
+                ModelUtils.to_numpy(baseline_estimates[name]), split_indices
+            )
+            next_values = ModelUtils.to_numpy(next_value_estimates[name])
+            for index, done in enumerate(dones):
+                all_value_estimates[index][name] = values[index]
+                all_baseline_estimates[index][name] = baselines[index]
+                next_value = next_values[index : index + 1]
+                if done and not self.reward_signals[name].ignore_done:
+                    next_value[-1] = 0.0
+                all_next_value_estimates[index][name] = next_value
+        return all_value_estimates, all_baseline_estimates, all_next_value_estimates
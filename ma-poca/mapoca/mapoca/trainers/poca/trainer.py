@@ -3,19 +3,23 @@
 # Contains an implementation of MA-POCA.
 
 from collections import defaultdict
-from typing import cast, Dict
+from typing import cast, Dict, Iterator, List
 
 import numpy as np
 
 from mlagents_envs.side_channel.stats_side_channel import StatsAggregationMethod
 from mlagents_envs.logging_util import get_logger
 from mlagents_envs.base_env import BehaviorSpec
-from mapoca.trainers.buffer import BufferKey, RewardSignalUtil
+from mapoca.torch_utils import distributed
+from mapoca.trainers.buffer import AgentBuffer, BufferKey, RewardSignalUtil
 from mapoca.trainers.trainer.rl_trainer import RLTrainer
 from mapoca.trainers.policy import Policy
 from mapoca.trainers.policy.torch_policy import TorchPolicy
 from mapoca.trainers.poca.optimizer_torch import TorchPOCAOptimizer
+from mapoca.trainers.ppo.trainer import discount_rewards
 from mapoca.trainers.trajectory import Trajectory
+from mapoca.trainers.prefetcher import Prefetcher
+from mapoca.trainers.torch.tensor_buffer import TensorBuffer
 from mapoca.trainers.behavior_id_utils import BehaviorIdentifiers
 from mapoca.trainers.settings import TrainerSettings, POCASettings
 
@@ -66,13 +70,7 @@ class POCATrainer(RLTrainer):
         Processing involves calculating value and advantage targets for model updating step.
         :param trajectory: The Trajectory tuple containing the steps to be processed.
         """
-        super()._process_trajectory(trajectory)
-        agent_id = trajectory.agent_id  # All the agents should have the same ID
-
-        agent_buffer_trajectory = trajectory.to_agentbuffer()
-        # Update the normalization
-        if self.is_training:
-            self.policy.update_normalization(agent_buffer_trajectory)
+        agent_buffer_trajectory = self._prepare_trajectory(trajectory)
 
         # Get all value estimates
         (
@@ -94,6 +92,100 @@ class POCATrainer(RLTrainer):
             agent_buffer_trajectory[BufferKey.CRITIC_MEMORY].set(value_memories)
             agent_buffer_trajectory[BufferKey.BASELINE_MEMORY].set(baseline_memories)
 
+        rewards = {
+            name: reward_signal.evaluate(agent_buffer_trajectory)
+            * reward_signal.strength
+            for name, reward_signal in self.optimizer.reward_signals.items()
+        }
+        self._finish_trajectory(
+            trajectory,
+            agent_buffer_trajectory,
+            value_estimates,
+            baseline_estimates,
+            value_next,
+            rewards,
+        )
+
+    def _process_trajectories(self, trajectories: List[Trajectory]) -> None:
+        """
+        Processes the trajectories drained from a trajectory queue. Without memories, the
+        critic, the baseline and the reward signals are evaluated once on the concatenation
+        of all the trajectories instead of once per trajectory.
+        :param trajectories: The Trajectories to be processed.
+        """
+        if self.policy.use_recurrent or len(trajectories) <= 1:
+            super()._process_trajectories(trajectories)
+            return
+        agent_buffer_trajectories = [
+            self._prepare_trajectory(trajectory) for trajectory in trajectories
+        ]
+        trajectory_lengths = [
+            agent_buffer_trajectory.num_experiences
+            for agent_buffer_trajectory in agent_buffer_trajectories
+        ]
+        batch = AgentBuffer()
+        for agent_buffer_trajectory in agent_buffer_trajectories:
+            agent_buffer_trajectory.resequence_and_append(batch, training_length=1)
+
+        (
+            all_value_estimates,
+            all_baseline_estimates,
+            all_value_next,
+        ) = self.optimizer.get_batched_trajectory_and_baseline_value_estimates(
+            batch,
+            trajectory_lengths,
+            [trajectory.next_obs for trajectory in trajectories],
+            [trajectory.next_group_obs for trajectory in trajectories],
+            [
+                trajectory.all_group_dones_reached
+                and trajectory.done_reached
+                and not trajectory.interrupted
+                for trajectory in trajectories
+            ],
+        )
+        split_indices = np.cumsum(trajectory_lengths)[:-1]
+        all_rewards = [{} for _ in trajectories]
+        for name, reward_signal in self.optimizer.reward_signals.items():
+            evaluate_result = reward_signal.evaluate(batch) * reward_signal.strength
+            for index, rewards in enumerate(np.split(evaluate_result, split_indices)):
+                all_rewards[index][name] = rewards
+
+        for index, trajectory in enumerate(trajectories):
+            self._finish_trajectory(
+                trajectory,
+                agent_buffer_trajectories[index],
+                all_value_estimates[index],
+                all_baseline_estimates[index],
+                all_value_next[index],
+                all_rewards[index],
+            )
+
+    def _prepare_trajectory(self, trajectory: Trajectory) -> AgentBuffer:
+        """
+        Converts a trajectory to an AgentBuffer and updates the normalization with it.
+        """
+        super()._process_trajectory(trajectory)
+        agent_buffer_trajectory = trajectory.to_agentbuffer()
+        # Update the normalization
+        if self.is_training:
+            self.policy.update_normalization(agent_buffer_trajectory)
+        return agent_buffer_trajectory
+
+    def _finish_trajectory(
+        self,
+        trajectory: Trajectory,
+        agent_buffer_trajectory: AgentBuffer,
+        value_estimates: Dict[str, np.ndarray],
+        baseline_estimates: Dict[str, np.ndarray],
+        value_next: Dict[str, np.ndarray],
+        rewards: Dict[str, np.ndarray],
+    ) -> None:
+        """
+        Computes the returns and advantages of a trajectory given its value and baseline
+        estimates and its rewards, puts it into the update buffer and records its stats.
+        """
+        agent_id = trajectory.agent_id  # All the agents should have the same ID
+
         for name, v in value_estimates.items():
             agent_buffer_trajectory[RewardSignalUtil.value_estimates_key(name)].extend(
                 v
@@ -116,10 +208,7 @@ class POCATrainer(RLTrainer):
         self.collected_group_rewards[agent_id] += np.sum(
             agent_buffer_trajectory[BufferKey.GROUP_REWARD]
         )
-        for name, reward_signal in self.optimizer.reward_signals.items():
-            evaluate_result = (
-                reward_signal.evaluate(agent_buffer_trajectory) * reward_signal.strength
-            )
+        for name, evaluate_result in rewards.items():
             agent_buffer_trajectory[RewardSignalUtil.rewards_key(name)].extend(
                 evaluate_result
             )
@@ -192,13 +281,43 @@ class POCATrainer(RLTrainer):
         size_of_buffer = self.update_buffer.num_experiences
         return size_of_buffer > self.hyperparameters.buffer_size
 
+    def _make_mini_batches(
+        self, num_epoch: int, batch_size: int
+    ) -> Iterator[TensorBuffer]:
+        """
+        Shuffles the update buffer at each epoch and yields its mini-batches, converted to
+        tensors for the optimizer.
+        :param num_epoch: The number of passes over the update buffer.
+        :param batch_size: The number of experiences in a mini-batch.
+        """
+        if self.hyperparameters.tensor_update_buffer:
+            # Mini-batches are made by indexing the tensors of the whole buffer
+            update_tensors = self.optimizer.get_update_tensors(self.update_buffer)
+            for _ in range(num_epoch):
+                yield from update_tensors.shuffled_mini_batches(batch_size)
+        else:
+            buffer_length = self.update_buffer.num_experiences
+            for _ in range(num_epoch):
+                self.update_buffer.shuffle(sequence_length=self.policy.sequence_length)
+                buffer = self.update_buffer
+                max_num_batch = buffer_length // batch_size
+                for i in range(0, max_num_batch * batch_size, batch_size):
+                    yield self.optimizer.get_update_tensors(
+                        buffer.make_mini_batch(i, i + batch_size)
+                    )
+
     def _update_policy(self):
         """
         Uses demonstration_buffer to update the policy.
         The reward signal generators must be updated in this method at their own pace.
         """
-        buffer_length = self.update_buffer.num_experiences
         self.cumulative_returns_since_policy_update.clear()
+        if distributed.is_distributed():
+            # All the ranks must make the same number of gradient steps
+            self.update_buffer.truncate(
+                distributed.all_reduce_min(self.update_buffer.num_experiences),
+                self.policy.sequence_length,
+            )
 
         # Make sure batch_size is a multiple of sequence length. During training, we
         # will need to reshape the data into a batch_size x sequence_length tensor.
@@ -221,13 +340,13 @@ class POCATrainer(RLTrainer):
         )
         num_epoch = self.hyperparameters.num_epoch
         batch_update_stats = defaultdict(list)
-        for _ in range(num_epoch):
-            self.update_buffer.shuffle(sequence_length=self.policy.sequence_length)
-            buffer = self.update_buffer
-            max_num_batch = buffer_length // batch_size
-            for i in range(0, max_num_batch * batch_size, batch_size):
-                update_stats = self.optimizer.update(
-                    buffer.make_mini_batch(i, i + batch_size), n_sequences
+        mini_batches = self._make_mini_batches(num_epoch, batch_size)
+        with Prefetcher(
+            mini_batches, self.hyperparameters.prefetch_mini_batches
+        ) as prefetched_mini_batches:
+            for mini_batch in prefetched_mini_batches:
+                update_stats = self.optimizer.update_from_tensors(
+                    mini_batch, n_sequences
                 )
                 for stat_name, value in update_stats.items():
                     batch_update_stats[stat_name].append(value)
@@ -305,12 +424,19 @@ class POCATrainer(RLTrainer):
 
 
 def lambda_return(r, value_estimates, gamma=0.99, lambd=0.8, value_next=0.0):
-    returns = np.zeros_like(r)
-    returns[-1] = r[-1] + gamma * value_next
-    for t in reversed(range(0, r.size - 1)):
-        returns[t] = (
-            gamma * lambd * returns[t + 1]
-            + r[t]
-            + (1 - lambd) * gamma * value_estimates[t + 1]
-        )
-    return returns
+    """
+    Computes the lambda-returns of a trajectory, i.e. the discounted sums with discount
+    gamma * lambd of r[t] + (1 - lambd) * gamma * value_estimates[t + 1], where the last
+    term is r[T] + gamma * value_next.
+    :param r: List of rewards for time-steps t to T.
+    :param value_estimates: List of value estimates for time-steps t to T.
+    :param gamma: Discount factor.
+    :param lambd: Lambda-return weighing factor.
+    :param value_next: Value estimate for time-step T+1.
+    :return: List of lambda-returns for time-steps t to T.
+    """
+    r = np.asarray(r)
+    value_estimates = np.asarray(value_estimates)
+    targets = r + (1 - lambd) * gamma * np.append(value_estimates[1:], 0.0)
+    targets[-1] = r[-1] + gamma * np.asarray(value_next).reshape(())
+    return discount_rewards(targets.astype(r.dtype), gamma=gamma * lambd)
@@ -46,6 +46,10 @@ class Policy:
         self.vis_encode_type = self.network_settings.vis_encode_type
         self.tanh_squash = tanh_squash
         self.condition_sigma_on_obs = condition_sigma_on_obs
+        # Whether the policy only samples actions, without their log probs and entropies.
+        # This is the case of policies whose experiences aren't used for training, e.g.
+        # in inference mode or for the opponents in self-play.
+        self.action_only = False
 
         self.m_size = 0
         self.sequence_length = 1
@@ -167,3 +171,17 @@ class Policy:
     @abstractmethod
     def init_load_weights(self) -> None:
         pass
+
+    def publish_weights(self) -> None:
+        """
+        Called by the trainer after it changes the weights of this policy, e.g. after an
+        update, to make them the ones used to sample the actions.
+        """
+        pass
+
+    def on_weights_updated(self) -> None:
+        """
+        Called when the trainer publishes new weights for this policy, so that the policy
+        can refresh anything derived from them for inference.
+        """
+        pass
@@ -1,6 +1,11 @@
 from typing import Any, Dict, List, Tuple, Optional
 import numpy as np
-from mapoca.torch_utils import torch, default_device
+from mapoca.torch_utils import (
+    torch,
+    default_device,
+    use_jit_inference,
+    use_quantized_inference,
+)
 import copy
 
 from mapoca.trainers.action_info import ActionInfo
@@ -8,6 +13,7 @@ from mapoca.trainers.behavior_id_utils import get_global_agent_id
 from mapoca.trainers.policy import Policy
 from mlagents_envs.base_env import DecisionSteps, BehaviorSpec
 from mlagents_envs.timers import timed
+from mlagents_envs.logging_util import get_logger
 
 from mapoca.trainers.settings import TrainerSettings
 from mapoca.trainers.torch.networks import SimpleActor, SharedActorCritic, GlobalSteps
@@ -16,9 +22,14 @@ from mapoca.trainers.torch.utils import ModelUtils
 from mapoca.trainers.buffer import AgentBuffer
 from mapoca.trainers.torch.agent_action import AgentAction
 from mapoca.trainers.torch.action_log_probs import ActionLogProbs
+from mapoca.trainers.torch.traced_actor import TracedActor
+from mapoca.trainers.torch.quantized_actor import QuantizedActor
+from mapoca.trainers.torch.double_buffered_actor import DoubleBufferedActor
 
 EPSILON = 1e-7  # Small value to avoid divide by zero
 
+logger = get_logger(__name__)
+
 
 class TorchPolicy(Policy):
     def __init__(
@@ -84,6 +95,28 @@ class TorchPolicy(Policy):
 
         self.actor.to(default_device())
         self._clip_action = not tanh_squash
+        # With a threaded trainer, the actions are sampled with a copy of the actor that
+        # the trainer publishes its weights to, so that it can update the actor meanwhile
+        self._double_buffered_actor: Optional[DoubleBufferedActor] = None
+        acting_actor = self.actor
+        if trainer_settings.threaded:
+            self._double_buffered_actor = DoubleBufferedActor(self.actor)
+            acting_actor = self._double_buffered_actor.front
+        # Optional quantized copy or TorchScript trace of the actor used to sample
+        # actions in evaluate()
+        self._quantized_actor: Optional[QuantizedActor] = None
+        self._traced_actor: Optional[TracedActor] = None
+        if use_quantized_inference():
+            if default_device().type == "cpu":
+                self._quantized_actor = QuantizedActor(acting_actor)
+            else:
+                logger.warning(
+                    "Quantized inference is only supported on CPU, using the float32 actor."
+                )
+        elif use_jit_inference():
+            self._traced_actor = TracedActor(
+                acting_actor, behavior_spec.action_spec, self.use_recurrent
+            )
 
     @property
     def export_memory_size(self) -> int:
@@ -113,6 +146,8 @@ class TorchPolicy(Policy):
 
         if self.normalize:
             self.actor.update_normalization(buffer)
+            if self._double_buffered_actor is not None:
+                self._double_buffered_actor.publish_normalizers()
 
     @timed
     def sample_actions(
@@ -166,19 +201,41 @@ class TorchPolicy(Policy):
         )
 
         run_out = {}
-        with torch.no_grad():
-            action, log_probs, entropy, memories = self.sample_actions(
-                tensor_obs, masks=masks, memories=memories
-            )
-        action_tuple = action.to_action_tuple()
-        run_out["action"] = action_tuple
+        actor = self.actor
+        if self._double_buffered_actor is not None:
+            if self._double_buffered_actor.swap():
+                self._set_acting_actor(self._double_buffered_actor.front)
+            actor = self._double_buffered_actor.front
+        if self._quantized_actor is not None:
+            actor = self._quantized_actor.get_actor()
+            kl = self._quantized_actor.divergence(tensor_obs, masks, memories)
+            if kl is not None:
+                run_out["quantization_kl"] = kl
+        if self.action_only:
+            with torch.no_grad():
+                action, memories = actor.get_action(
+                    tensor_obs, masks=masks, memories=memories
+                )
+        else:
+            sampled = None
+            if self._traced_actor is not None:
+                sampled = self._traced_actor.sample(tensor_obs, masks, memories)
+            elif actor is not self.actor:
+                with torch.no_grad():
+                    sampled = actor.get_action_and_stats(tensor_obs, masks, memories)
+            if sampled is None:
+                with torch.no_grad():
+                    sampled = self.sample_actions(
+                        tensor_obs, masks=masks, memories=memories
+                    )
+            action, log_probs, entropy, memories = sampled
+            run_out["log_probs"] = log_probs.to_log_probs_tuple()
+            run_out["entropy"] = ModelUtils.to_numpy(entropy)
+            run_out["learning_rate"] = 0.0
+        run_out["action"] = action.to_action_tuple()
         # This is the clipped action which is not saved to the buffer
         # but is exclusively sent to the environment.
-        env_action_tuple = action.to_action_tuple(clip=self._clip_action)
-        run_out["env_action"] = env_action_tuple
-        run_out["log_probs"] = log_probs.to_log_probs_tuple()
-        run_out["entropy"] = ModelUtils.to_numpy(entropy)
-        run_out["learning_rate"] = 0.0
+        run_out["env_action"] = action.to_action_tuple(clip=self._clip_action)
         if self.use_recurrent:
             run_out["memory_out"] = ModelUtils.to_numpy(memories).squeeze(0)
         return run_out
@@ -236,6 +293,27 @@ class TorchPolicy(Policy):
 
     def load_weights(self, values: List[np.ndarray]) -> None:
         self.actor.load_state_dict(values)
+        self.publish_weights()
+        self.on_weights_updated()
+
+    def publish_weights(self) -> None:
+        if self._double_buffered_actor is not None:
+            self._double_buffered_actor.publish()
+
+    def on_weights_updated(self) -> None:
+        if self._double_buffered_actor is not None:
+            # The front copy is swapped in and its derived copies refreshed in evaluate()
+            return
+        if self._traced_actor is not None:
+            self._traced_actor.refresh()
+        if self._quantized_actor is not None:
+            self._quantized_actor.refresh()
+
+    def _set_acting_actor(self, actor: torch.nn.Module) -> None:
+        if self._traced_actor is not None:
+            self._traced_actor.set_actor(actor)
+        if self._quantized_actor is not None:
+            self._quantized_actor.set_actor(actor)
 
     def init_load_weights(self) -> None:
         pass
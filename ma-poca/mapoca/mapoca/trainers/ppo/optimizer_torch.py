@@ -1,5 +1,6 @@
 from typing import Dict, cast
 from mapoca.torch_utils import torch, default_device
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.buffer import AgentBuffer, BufferKey, RewardSignalUtil
 
@@ -8,8 +9,7 @@ from mapoca.trainers.policy.torch_policy import TorchPolicy
 from mapoca.trainers.optimizer.torch_optimizer import TorchOptimizer
 from mapoca.trainers.settings import TrainerSettings, PPOSettings
 from mapoca.trainers.torch.networks import ValueNetwork
-from mapoca.trainers.torch.agent_action import AgentAction
-from mapoca.trainers.torch.action_log_probs import ActionLogProbs
+from mapoca.trainers.torch.tensor_buffer import TensorBuffer
 from mapoca.trainers.torch.utils import ModelUtils
 from mapoca.trainers.trajectory import ObsUtil
 
@@ -76,6 +76,31 @@ class TorchPPOOptimizer(TorchOptimizer):
     def critic(self):
         return self._critic
 
+    def get_update_tensors(self, buffer: AgentBuffer) -> TensorBuffer:
+        """
+        Converts the fields of an AgentBuffer used by update_from_tensors to tensors.
+        :param buffer: The update buffer, or a mini-batch of it.
+        """
+        n_obs = len(self.policy.behavior_spec.observation_specs)
+        keys = [ObsUtil.get_name_at(i) for i in range(n_obs)]
+        for name in self.reward_signals:
+            keys += [
+                RewardSignalUtil.value_estimates_key(name),
+                RewardSignalUtil.returns_key(name),
+            ]
+        keys += [
+            BufferKey.ACTION_MASK,
+            BufferKey.CONTINUOUS_ACTION,
+            BufferKey.DISCRETE_ACTION,
+            BufferKey.CONTINUOUS_LOG_PROBS,
+            BufferKey.DISCRETE_LOG_PROBS,
+            BufferKey.MEMORY,
+            BufferKey.CRITIC_MEMORY,
+            BufferKey.MASKS,
+            BufferKey.ADVANTAGES,
+        ]
+        return TensorBuffer.from_buffer(buffer, self.policy.sequence_length, keys)
+
     @timed
     def update(self, batch: AgentBuffer, num_sequences: int) -> Dict[str, float]:
         """
@@ -84,6 +109,18 @@ class TorchPPOOptimizer(TorchOptimizer):
         :param num_sequences: Number of sequences to process.
         :return: Results of update.
         """
+        return self.update_from_tensors(self.get_update_tensors(batch), num_sequences)
+
+    @timed
+    def update_from_tensors(
+        self, batch: TensorBuffer, num_sequences: int
+    ) -> Dict[str, float]:
+        """
+        Performs update on model, from experiences already converted to tensors.
+        :param batch: Batch of experiences, as returned by get_update_tensors.
+        :param num_sequences: Number of sequences to process.
+        :return: Results of update.
+        """
         # Get decayed parameters
         decay_lr = self.decay_learning_rate.get_value(self.policy.get_current_step())
         decay_eps = self.decay_epsilon.get_value(self.policy.get_current_step())
@@ -91,37 +128,16 @@ class TorchPPOOptimizer(TorchOptimizer):
         returns = {}
         old_values = {}
         for name in self.reward_signals:
-            old_values[name] = ModelUtils.list_to_tensor(
-                batch[RewardSignalUtil.value_estimates_key(name)]
-            )
-            returns[name] = ModelUtils.list_to_tensor(
-                batch[RewardSignalUtil.returns_key(name)]
-            )
+            old_values[name] = batch[RewardSignalUtil.value_estimates_key(name)]
+            returns[name] = batch[RewardSignalUtil.returns_key(name)]
 
         n_obs = len(self.policy.behavior_spec.observation_specs)
-        current_obs = ObsUtil.from_buffer(batch, n_obs)
-        # Convert to tensors
-        current_obs = [ModelUtils.list_to_tensor(obs) for obs in current_obs]
-
-        act_masks = ModelUtils.list_to_tensor(batch[BufferKey.ACTION_MASK])
-        actions = AgentAction.from_buffer(batch)
+        current_obs = batch.obs(n_obs)
 
-        memories = [
-            ModelUtils.list_to_tensor(batch[BufferKey.MEMORY][i])
-            for i in range(0, len(batch[BufferKey.MEMORY]), self.policy.sequence_length)
-        ]
-        if len(memories) > 0:
-            memories = torch.stack(memories).unsqueeze(0)
-
-        # Get value memories
-        value_memories = [
-            ModelUtils.list_to_tensor(batch[BufferKey.CRITIC_MEMORY][i])
-            for i in range(
-                0, len(batch[BufferKey.CRITIC_MEMORY]), self.policy.sequence_length
-            )
-        ]
-        if len(value_memories) > 0:
-            value_memories = torch.stack(value_memories).unsqueeze(0)
+        act_masks = batch[BufferKey.ACTION_MASK]
+        actions = batch.actions()
+        memories = batch.memories(BufferKey.MEMORY)
+        value_memories = batch.memories(BufferKey.CRITIC_MEMORY)
 
         log_probs, entropy = self.policy.evaluate_actions(
             current_obs,
@@ -135,14 +151,14 @@ class TorchPPOOptimizer(TorchOptimizer):
             memories=value_memories,
             sequence_length=self.policy.sequence_length,
         )
-        old_log_probs = ActionLogProbs.from_buffer(batch).flatten()
+        old_log_probs = batch.log_probs().flatten()
         log_probs = log_probs.flatten()
-        loss_masks = ModelUtils.list_to_tensor(batch[BufferKey.MASKS], dtype=torch.bool)
+        loss_masks = batch[BufferKey.MASKS]
         value_loss = ModelUtils.trust_region_value_loss(
             values, old_values, returns, decay_eps, loss_masks
         )
         policy_loss = ModelUtils.trust_region_policy_loss(
-            ModelUtils.list_to_tensor(batch[BufferKey.ADVANTAGES]),
+            batch[BufferKey.ADVANTAGES],
             log_probs,
             old_log_probs,
             loss_masks,
@@ -158,7 +174,7 @@ class TorchPPOOptimizer(TorchOptimizer):
         ModelUtils.update_learning_rate(self.optimizer, decay_lr)
         self.optimizer.zero_grad()
         loss.backward()
-
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         update_stats = {
             # NOTE: abs() is not technically correct, but matches the behavior in TensorFlow.
@@ -170,8 +186,7 @@ class TorchPPOOptimizer(TorchOptimizer):
             "Policy/Beta": decay_bet,
         }
 
-        for reward_provider in self.reward_signals.values():
-            update_stats.update(reward_provider.update(batch))
+        update_stats.update(self._update_reward_providers(batch))
 
         return update_stats
 
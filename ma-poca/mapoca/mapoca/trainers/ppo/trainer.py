@@ -3,18 +3,21 @@
 # Contains an implementation of PPO as described in: https://arxiv.org/abs/1707.06347
 
 from collections import defaultdict
-from typing import cast
+from typing import cast, Iterator
 
 import numpy as np
 
 from mlagents_envs.logging_util import get_logger
 from mlagents_envs.base_env import BehaviorSpec
+from mapoca.torch_utils import distributed
 from mapoca.trainers.buffer import BufferKey, RewardSignalUtil
 from mapoca.trainers.trainer.rl_trainer import RLTrainer
 from mapoca.trainers.policy import Policy
 from mapoca.trainers.policy.torch_policy import TorchPolicy
 from mapoca.trainers.ppo.optimizer_torch import TorchPPOOptimizer
 from mapoca.trainers.trajectory import Trajectory
+from mapoca.trainers.prefetcher import Prefetcher
+from mapoca.trainers.torch.tensor_buffer import TensorBuffer
 from mapoca.trainers.behavior_id_utils import BehaviorIdentifiers
 from mapoca.trainers.settings import TrainerSettings, PPOSettings
 
@@ -164,13 +167,43 @@ class PPOTrainer(RLTrainer):
         size_of_buffer = self.update_buffer.num_experiences
         return size_of_buffer > self.hyperparameters.buffer_size
 
+    def _make_mini_batches(
+        self, num_epoch: int, batch_size: int
+    ) -> Iterator[TensorBuffer]:
+        """
+        Shuffles the update buffer at each epoch and yields its mini-batches, converted to
+        tensors for the optimizer.
+        :param num_epoch: The number of passes over the update buffer.
+        :param batch_size: The number of experiences in a mini-batch.
+        """
+        if self.hyperparameters.tensor_update_buffer:
+            # Mini-batches are made by indexing the tensors of the whole buffer
+            update_tensors = self.optimizer.get_update_tensors(self.update_buffer)
+            for _ in range(num_epoch):
+                yield from update_tensors.shuffled_mini_batches(batch_size)
+        else:
+            buffer_length = self.update_buffer.num_experiences
+            for _ in range(num_epoch):
+                self.update_buffer.shuffle(sequence_length=self.policy.sequence_length)
+                buffer = self.update_buffer
+                max_num_batch = buffer_length // batch_size
+                for i in range(0, max_num_batch * batch_size, batch_size):
+                    yield self.optimizer.get_update_tensors(
+                        buffer.make_mini_batch(i, i + batch_size)
+                    )
+
     def _update_policy(self):
         """
         Uses demonstration_buffer to update the policy.
         The reward signal generators must be updated in this method at their own pace.
         """
-        buffer_length = self.update_buffer.num_experiences
         self.cumulative_returns_since_policy_update.clear()
+        if distributed.is_distributed():
+            # All the ranks must make the same number of gradient steps
+            self.update_buffer.truncate(
+                distributed.all_reduce_min(self.update_buffer.num_experiences),
+                self.policy.sequence_length,
+            )
 
         # Make sure batch_size is a multiple of sequence length. During training, we
         # will need to reshape the data into a batch_size x sequence_length tensor.
@@ -193,13 +226,13 @@ class PPOTrainer(RLTrainer):
         )
         num_epoch = self.hyperparameters.num_epoch
         batch_update_stats = defaultdict(list)
-        for _ in range(num_epoch):
-            self.update_buffer.shuffle(sequence_length=self.policy.sequence_length)
-            buffer = self.update_buffer
-            max_num_batch = buffer_length // batch_size
-            for i in range(0, max_num_batch * batch_size, batch_size):
-                update_stats = self.optimizer.update(
-                    buffer.make_mini_batch(i, i + batch_size), n_sequences
+        mini_batches = self._make_mini_batches(num_epoch, batch_size)
+        with Prefetcher(
+            mini_batches, self.hyperparameters.prefetch_mini_batches
+        ) as prefetched_mini_batches:
+            for mini_batch in prefetched_mini_batches:
+                update_stats = self.optimizer.update_from_tensors(
+                    mini_batch, n_sequences
                 )
                 for stat_name, value in update_stats.items():
                     batch_update_stats[stat_name].append(value)
@@ -275,19 +308,40 @@ class PPOTrainer(RLTrainer):
         return self.policy
 
 
+# Number of time-steps whose discounted sums are computed with a single matrix product
+DISCOUNT_BLOCK_SIZE = 64
+
+
 def discount_rewards(r, gamma=0.99, value_next=0.0):
     """
     Computes discounted sum of future rewards for use in updating value estimate.
+    The trajectory is processed backwards in blocks of DISCOUNT_BLOCK_SIZE time-steps: the
+    sums within a block are the product of a matrix of powers of gamma with the rewards,
+    plus the discounted sum at the start of the next block. Unlike a closed form with
+    gamma ** -t, this can't overflow on long trajectories.
     :param r: List of rewards.
     :param gamma: Discount factor.
     :param value_next: T+1 value estimate for returns calculation.
     :return: discounted sum of future rewards as list.
     """
+    r = np.asarray(r)
     discounted_r = np.zeros_like(r)
-    running_add = value_next
-    for t in reversed(range(0, r.size)):
-        running_add = running_add * gamma + r[t]
-        discounted_r[t] = running_add
+    block_size = max(min(r.size, DISCOUNT_BLOCK_SIZE), 1)
+    # powers[i, j] is gamma ** (j - i) if j >= i, else 0
+    offsets = np.arange(block_size)
+    exponents = offsets[None, :] - offsets[:, None]
+    powers = np.where(
+        exponents >= 0, np.float64(gamma) ** np.maximum(exponents, 0), 0.0
+    )
+    running_add = np.asarray(value_next, dtype=np.float64).reshape(())
+    for end in range(r.size, 0, -block_size):
+        start = max(end - block_size, 0)
+        size = end - start
+        block = powers[:size, :size] @ r[start:end].astype(np.float64) + (
+            np.float64(gamma) ** (size - offsets[:size])
+        ) * running_add
+        discounted_r[start:end] = block
+        running_add = block[0]
     return discounted_r
 
 
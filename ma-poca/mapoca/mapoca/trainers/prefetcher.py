@@ -0,0 +1,85 @@
+import queue
+import threading
+from typing import Generic, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _PrefetchError:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+class Prefetcher(Generic[T]):
+    """
+    Iterates over the items of an iterator, computing up to max_prefetch of them ahead in a
+    background thread while the caller uses the current one. This is useful when computing
+    the items and using them both spend most of their time in code that releases the GIL,
+    e.g. numpy and torch operations. An exception raised by the iterator is raised to the
+    caller when it reaches the failed item. If max_prefetch is 0, the items are computed by
+    the caller, without a thread. Use as a context manager so that the thread is stopped if
+    the caller stops early.
+    """
+
+    _END = object()
+
+    def __init__(self, iterator: Iterator[T], max_prefetch: int):
+        self._iterator = iterator
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(max_prefetch, 1))
+        self._stopped = threading.Event()
+        self._done = False
+        self._thread: Optional[threading.Thread] = None
+        if max_prefetch > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            for item in self._iterator:
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self._put(_PrefetchError(e))
+            return
+        self._put(self._END)
+
+    def _put(self, item: object) -> bool:
+        # Wait for some room in the queue, unless the caller stopped iterating
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self) -> "Prefetcher[T]":
+        return self
+
+    def __next__(self) -> T:
+        if self._thread is None:
+            return next(self._iterator)
+        if self._done:
+            raise StopIteration
+        item = self._queue.get()
+        if item is self._END:
+            self._done = True
+            raise StopIteration
+        if isinstance(item, _PrefetchError):
+            self._done = True
+            raise item.exception
+        return item
+
+    def close(self) -> None:
+        """
+        Stops the background thread and waits for it to finish its current item.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "Prefetcher[T]":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,6 +1,7 @@
 import numpy as np
 from typing import Dict, List, Mapping, NamedTuple, cast, Tuple, Optional
 from mapoca.torch_utils import torch, nn, default_device
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mlagents_envs.logging_util import get_logger
 from mapoca.trainers.optimizer.torch_optimizer import TorchOptimizer
@@ -594,16 +595,19 @@ class TorchSACOptimizer(TorchOptimizer):
         ModelUtils.update_learning_rate(self.policy_optimizer, decay_lr)
         self.policy_optimizer.zero_grad()
         policy_loss.backward()
+        all_reduce_gradients(self.policy_optimizer)
         self.policy_optimizer.step()
 
         ModelUtils.update_learning_rate(self.value_optimizer, decay_lr)
         self.value_optimizer.zero_grad()
         total_value_loss.backward()
+        all_reduce_gradients(self.value_optimizer)
         self.value_optimizer.step()
 
         ModelUtils.update_learning_rate(self.entropy_optimizer, decay_lr)
         self.entropy_optimizer.zero_grad()
         entropy_loss.backward()
+        all_reduce_gradients(self.entropy_optimizer)
         self.entropy_optimizer.step()
 
         # Update target network
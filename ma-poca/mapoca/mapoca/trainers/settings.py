@@ -151,6 +151,10 @@ class PPOSettings(HyperparamSettings):
     lambd: float = 0.95
     num_epoch: int = 3
     learning_rate_schedule: ScheduleType = ScheduleType.LINEAR
+    # Convert the update buffer to tensors once per update instead of once per mini-batch
+    tensor_update_buffer: bool = False
+    # Number of mini-batches prepared ahead in a background thread during updates
+    prefetch_mini_batches: int = 0
 
 
 @attr.s(auto_attribs=True)
@@ -643,6 +647,8 @@ class TrainerSettings(ExportableSettings):
     time_horizon: int = 64
     summary_freq: int = 50000
     threaded: bool = False
+    # Run the trainer in its own process instead of the main process or a thread
+    separate_process: bool = False
     self_play: Optional[SelfPlaySettings] = None
     behavioral_cloning: Optional[BehavioralCloningSettings] = None
 
@@ -777,12 +783,62 @@ class EnvironmentSettings:
     base_port: int = parser.get_default("base_port")
     num_envs: int = attr.ib(default=parser.get_default("num_envs"))
     seed: int = parser.get_default("seed")
+    min_num_envs: int = parser.get_default("min_num_envs")
+    max_num_envs: int = parser.get_default("max_num_envs")
+    max_lifetime_restarts: int = parser.get_default("max_lifetime_restarts")
+    restarts_rate_limit_n: int = parser.get_default("restarts_rate_limit_n")
+    restarts_rate_limit_period_s: int = parser.get_default(
+        "restarts_rate_limit_period_s"
+    )
+    worker_timeout_s: float = parser.get_default("worker_timeout_s")
+    worker_stats_interval_steps: int = parser.get_default(
+        "worker_stats_interval_steps"
+    )
+    worker_stats_interval_s: float = attr.ib(
+        default=parser.get_default("worker_stats_interval_s")
+    )
+    worker_start_method: Optional[str] = parser.get_default("worker_start_method")
+    in_process_envs: bool = attr.ib(default=parser.get_default("in_process_envs"))
 
     @num_envs.validator
     def validate_num_envs(self, attribute, value):
         if self.env_name is None:
             raise ValueError("Must specify an environment name with --env")
 
+    @worker_stats_interval_s.validator
+    def validate_worker_stats_interval(self, attribute, value):
+        # Otherwise the workers would only send their timers and stats when closing
+        if self.worker_stats_interval_steps <= 0 and value <= 0:
+            raise ValueError(
+                "At least one of --worker-stats-interval-steps and "
+                "--worker-stats-interval-s must be positive"
+            )
+
+    @in_process_envs.validator
+    def validate_in_process_envs(self, attribute, value):
+        # These options only apply to the worker processes of the SubprocessEnvManager
+        subprocess_options = {
+            "min_num_envs": "--min-num-envs",
+            "max_num_envs": "--max-num-envs",
+            "max_lifetime_restarts": "--max-lifetime-restarts",
+            "restarts_rate_limit_n": "--restarts-rate-limit-n",
+            "restarts_rate_limit_period_s": "--restarts-rate-limit-period-s",
+            "worker_timeout_s": "--worker-timeout",
+            "worker_stats_interval_steps": "--worker-stats-interval-steps",
+            "worker_stats_interval_s": "--worker-stats-interval-s",
+            "worker_start_method": "--worker-start-method",
+        }
+        if value:
+            options_set = [
+                option
+                for name, option in subprocess_options.items()
+                if getattr(self, name) != parser.get_default(name)
+            ]
+            if options_set:
+                raise ValueError(
+                    f"{', '.join(options_set)} can't be used with --in-process-envs"
+                )
+
 
 @attr.s(auto_attribs=True)
 class EngineSettings:
@@ -798,6 +854,11 @@ class EngineSettings:
 @attr.s(auto_attribs=True)
 class TorchSettings:
     device: Optional[str] = parser.get_default("device")
+    jit_inference: bool = parser.get_default("jit_inference")
+    quantized_inference: bool = parser.get_default("quantized_inference")
+    world_size: int = parser.get_default("world_size")
+    rank: int = parser.get_default("rank")
+    dist_init_method: str = parser.get_default("dist_init_method")
 
 
 @attr.s(auto_attribs=True)
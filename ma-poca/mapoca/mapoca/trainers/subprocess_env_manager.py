@@ -1,4 +1,5 @@
-from typing import Dict, NamedTuple, List, Any, Optional, Callable, Set
+from typing import Dict, NamedTuple, List, Any, Optional, Callable, Set, Deque, Tuple
+from collections import deque
 import cloudpickle
 import enum
 import time
@@ -10,12 +11,14 @@ from mlagents_envs.exception import (
     UnityEnvironmentException,
     UnityCommunicatorStoppedException,
 )
-from multiprocessing import Process, Pipe, Queue
-from multiprocessing.connection import Connection
+from multiprocessing import Process, Queue, get_context
+from multiprocessing.connection import Connection, wait
+from multiprocessing.context import BaseContext
 from queue import Empty as EmptyQueueException
 from mlagents_envs.base_env import BaseEnv, BehaviorName, BehaviorSpec
 from mlagents_envs import logging_util
 from mapoca.trainers.env_manager import EnvManager, EnvironmentStep, AllStepResult
+from mapoca.trainers.elastic_env_scaler import ElasticEnvScaler
 from mapoca.trainers.settings import TrainerSettings
 from mlagents_envs.timers import (
     TimerNode,
@@ -35,6 +38,7 @@ from mlagents_envs.side_channel.engine_configuration_channel import (
 )
 from mlagents_envs.side_channel.stats_side_channel import (
     EnvironmentStats,
+    StatsAggregationMethod,
     StatsSideChannel,
 )
 from mapoca.training_analytics_side_channel import TrainingAnalyticsSideChannel
@@ -43,6 +47,21 @@ from mlagents_envs.side_channel.side_channel import SideChannel
 
 logger = logging_util.get_logger(__name__)
 WORKER_SHUTDOWN_TIMEOUT_S = 10
+# Minimum time between two checks for dead or unresponsive workers while waiting for steps.
+WORKER_HEALTH_CHECK_INTERVAL_S = 1.0
+# Exceptions raised by a worker that can be recovered from by restarting its environment.
+RESTARTABLE_EXCEPTIONS = (
+    UnityCommunicationException,
+    UnityTimeOutException,
+    UnityEnvironmentException,
+    UnityCommunicatorStoppedException,
+)
+# Modules imported once by the forkserver, so that the workers it forks don't have to import them.
+FORKSERVER_PRELOAD_MODULES = [
+    "mapoca.trainers.subprocess_env_manager",
+    "mapoca.trainers.learn",
+    "mapoca.registry_entries",
+]
 
 
 class EnvironmentCommand(enum.Enum):
@@ -54,6 +73,8 @@ class EnvironmentCommand(enum.Enum):
     ENV_EXITED = 6
     CLOSED = 7
     TRAINING_STARTED = 8
+    STATS = 9
+    READY = 10
 
 
 class EnvironmentRequest(NamedTuple):
@@ -82,6 +103,7 @@ class UnityEnvWorker:
         self.previous_all_action_info: Dict[str, ActionInfo] = {}
         self.waiting = False
         self.closed = False
+        self.step_sent_time = 0.0
 
     def send(self, cmd: EnvironmentCommand, payload: Any = None) -> None:
         try:
@@ -103,13 +125,57 @@ class UnityEnvWorker:
     def request_close(self):
         try:
             self.conn.send(EnvironmentRequest(EnvironmentCommand.CLOSE))
-        except (BrokenPipeError, EOFError):
+        except (OSError, EOFError):
             logger.debug(
                 f"UnityEnvWorker {self.worker_id} got exception trying to close."
             )
             pass
 
 
+def create_side_channels(
+    worker_id: int, run_options: RunOptions
+) -> Tuple[EngineConfigurationChannel, Optional[TrainingAnalyticsSideChannel]]:
+    """
+    Creates the side channels that configure the engine of an environment, and, for the
+    first worker, the one that sends the training analytics.
+    """
+    engine_config = EngineConfig(
+        width=run_options.engine_settings.width,
+        height=run_options.engine_settings.height,
+        quality_level=run_options.engine_settings.quality_level,
+        time_scale=run_options.engine_settings.time_scale,
+        target_frame_rate=run_options.engine_settings.target_frame_rate,
+        capture_frame_rate=run_options.engine_settings.capture_frame_rate,
+    )
+    engine_configuration_channel = EngineConfigurationChannel()
+    engine_configuration_channel.set_configuration(engine_config)
+    training_analytics_channel: Optional[TrainingAnalyticsSideChannel] = None
+    if worker_id == 0:
+        training_analytics_channel = TrainingAnalyticsSideChannel()
+    return engine_configuration_channel, training_analytics_channel
+
+
+def initialize_training_analytics(
+    env: BaseEnv,
+    training_analytics_channel: Optional[TrainingAnalyticsSideChannel],
+    run_options: RunOptions,
+) -> Optional[TrainingAnalyticsSideChannel]:
+    """
+    Sends the run options through the training analytics channel of a newly created
+    environment.
+    :return: The training analytics channel, or None if the environment doesn't support
+    training analytics.
+    """
+    academy_capabilities = getattr(env, "academy_capabilities", None)
+    if not academy_capabilities or not academy_capabilities.trainingAnalytics:
+        # Make sure we don't try to send training analytics if the environment doesn't know how to process
+        # them. This wouldn't be catastrophic, but would result in unknown SideChannel UUIDs being used.
+        return None
+    if training_analytics_channel:
+        training_analytics_channel.environment_initialized(run_options)
+    return training_analytics_channel
+
+
 def worker(
     parent_conn: Connection,
     step_queue: Queue,
@@ -122,23 +188,17 @@ def worker(
         [int, List[SideChannel]], UnityEnvironment
     ] = cloudpickle.loads(pickled_env_factory)
     env_parameters = EnvironmentParametersChannel()
-
-    engine_config = EngineConfig(
-        width=run_options.engine_settings.width,
-        height=run_options.engine_settings.height,
-        quality_level=run_options.engine_settings.quality_level,
-        time_scale=run_options.engine_settings.time_scale,
-        target_frame_rate=run_options.engine_settings.target_frame_rate,
-        capture_frame_rate=run_options.engine_settings.capture_frame_rate,
+    engine_configuration_channel, training_analytics_channel = create_side_channels(
+        worker_id, run_options
     )
-    engine_configuration_channel = EngineConfigurationChannel()
-    engine_configuration_channel.set_configuration(engine_config)
-
     stats_channel = StatsSideChannel()
-    training_analytics_channel: Optional[TrainingAnalyticsSideChannel] = None
-    if worker_id == 0:
-        training_analytics_channel = TrainingAnalyticsSideChannel()
     env: UnityEnvironment = None
+    # Timers and environment stats are accumulated in the worker, and only sent along with a step
+    # every worker_stats_interval_steps steps or worker_stats_interval_s seconds.
+    stats_interval_steps = run_options.env_settings.worker_stats_interval_steps
+    stats_interval_s = run_options.env_settings.worker_stats_interval_s
+    steps_since_stats = 0
+    last_stats_time = time.time()
     # Set log level. On some platforms, the logger isn't common with the
     # main process, so we need to set it again.
     logging_util.set_log_level(log_level)
@@ -158,15 +218,10 @@ def worker(
             side_channels.append(training_analytics_channel)
 
         env = env_factory(worker_id, side_channels)
-        if (
-            not env.academy_capabilities
-            or not env.academy_capabilities.trainingAnalytics
-        ):
-            # Make sure we don't try to send training analytics if the environment doesn't know how to process
-            # them. This wouldn't be catastrophic, but would result in unknown SideChannel UUIDs being used.
-            training_analytics_channel = None
-        if training_analytics_channel:
-            training_analytics_channel.environment_initialized(run_options)
+        training_analytics_channel = initialize_training_analytics(
+            env, training_analytics_channel, run_options
+        )
+        _send_response(EnvironmentCommand.READY, None)
 
         while True:
             req: EnvironmentRequest = parent_conn.recv()
@@ -177,21 +232,31 @@ def worker(
                         env.set_actions(brain_name, action_info.env_action)
                 env.step()
                 all_step_result = _generate_all_results()
-                # The timers in this process are independent from all the processes and the "main" process
-                # So after we send back the root timer, we can safely clear them.
-                # Note that we could randomly return timers a fraction of the time if we wanted to reduce
-                # the data transferred.
-                # TODO get gauges from the workers and merge them in the main process too.
-                env_stats = stats_channel.get_and_reset_stats()
-                step_response = StepResponse(
-                    all_step_result, get_timer_root(), env_stats
+                steps_since_stats += 1
+                send_stats = (0 < stats_interval_steps <= steps_since_stats) or (
+                    0 < stats_interval_s <= time.time() - last_stats_time
                 )
+                if send_stats:
+                    # The timers in this process are independent from all the processes and the "main" process
+                    # So after we send back the root timer, we can safely clear them.
+                    # TODO get gauges from the workers and merge them in the main process too.
+                    step_response = StepResponse(
+                        all_step_result,
+                        get_timer_root(),
+                        stats_channel.get_and_reset_stats(),
+                    )
+                else:
+                    # The StatsSideChannel keeps accumulating stats until they are sent.
+                    step_response = StepResponse(all_step_result, None, {})
                 step_queue.put(
                     EnvironmentResponse(
                         EnvironmentCommand.STEP, worker_id, step_response
                     )
                 )
-                reset_timers()
+                if send_stats:
+                    reset_timers()
+                    steps_since_stats = 0
+                    last_stats_time = time.time()
             elif req.cmd == EnvironmentCommand.BEHAVIOR_SPECS:
                 _send_response(EnvironmentCommand.BEHAVIOR_SPECS, env.behavior_specs)
             elif req.cmd == EnvironmentCommand.ENVIRONMENT_PARAMETERS:
@@ -209,6 +274,19 @@ def worker(
                 all_step_result = _generate_all_results()
                 _send_response(EnvironmentCommand.RESET, all_step_result)
             elif req.cmd == EnvironmentCommand.CLOSE:
+                if steps_since_stats > 0:
+                    # Flush the timers and stats that weren't sent yet.
+                    step_queue.put(
+                        EnvironmentResponse(
+                            EnvironmentCommand.STATS,
+                            worker_id,
+                            StepResponse(
+                                {},
+                                get_timer_root(),
+                                stats_channel.get_and_reset_stats(),
+                            ),
+                        )
+                    )
                 break
     except (
         KeyboardInterrupt,
@@ -249,15 +327,49 @@ class SubprocessEnvManager(EnvManager):
     ):
         super().__init__()
         self.env_workers: List[UnityEnvWorker] = []
-        self.step_queue: Queue = Queue()
+        self.step_queue: Queue = self.get_context(run_options).Queue()
         self.workers_alive = 0
-        for worker_idx in range(n_env):
-            self.env_workers.append(
-                self.create_worker(
-                    worker_idx, self.step_queue, env_factory, run_options
+        self.env_factory = env_factory
+        self.run_options = run_options
+        # Kept so that restarted workers can be brought back to the same state.
+        self.env_parameters: Optional[Dict] = None
+        self.training_started: Dict[str, TrainerSettings] = {}
+        # Responses read off the step queue while restarting a worker, to be handled by _step.
+        self.pending_responses: Deque[EnvironmentResponse] = deque()
+        self.restart_counts: List[int] = [0] * n_env
+        self.recent_restart_timestamps: List[List[float]] = [[] for _ in range(n_env)]
+        self.last_health_check = time.time()
+        # Optionally vary the number of workers between min_num_envs and max_num_envs.
+        env_settings = run_options.env_settings
+        min_envs = env_settings.min_num_envs if env_settings.min_num_envs > 0 else n_env
+        max_envs = env_settings.max_num_envs if env_settings.max_num_envs > 0 else n_env
+        self.env_scaler: Optional[ElasticEnvScaler] = None
+        if min_envs != max_envs:
+            self.env_scaler = ElasticEnvScaler(min(min_envs, n_env), max(max_envs, n_env))
+        self.last_step_end_time: Optional[float] = None
+        with hierarchical_timer("worker_launch") as timer_node:
+            launch_start = time.perf_counter()
+            for worker_idx in range(n_env):
+                self.env_workers.append(
+                    self.create_worker(
+                        worker_idx, self.step_queue, env_factory, run_options
+                    )
                 )
-            )
-            self.workers_alive += 1
+                self.workers_alive += 1
+            # Wait until every environment is launched, so that later requests don't wait on startup.
+            self._recv_all(self.env_workers, timer_node, launch_start)
+
+    @staticmethod
+    def get_context(run_options: RunOptions) -> BaseContext:
+        """
+        Returns the multiprocessing context used to start the workers, according to the
+        worker_start_method of the environment settings.
+        """
+        start_method = run_options.env_settings.worker_start_method
+        context = get_context(start_method)
+        if start_method == "forkserver":
+            context.set_forkserver_preload(FORKSERVER_PRELOAD_MODULES)
+        return context
 
     @staticmethod
     def create_worker(
@@ -266,12 +378,13 @@ class SubprocessEnvManager(EnvManager):
         env_factory: Callable[[int, List[SideChannel]], BaseEnv],
         run_options: RunOptions,
     ) -> UnityEnvWorker:
-        parent_conn, child_conn = Pipe()
+        context = SubprocessEnvManager.get_context(run_options)
+        parent_conn, child_conn = context.Pipe()
 
         # Need to use cloudpickle for the env factory function since function objects aren't picklable
         # on Windows as of Python 3.6.
         pickled_env_factory = cloudpickle.dumps(env_factory)
-        child_process = Process(
+        child_process = context.Process(
             target=worker,
             args=(
                 child_conn,
@@ -292,8 +405,13 @@ class SubprocessEnvManager(EnvManager):
                 env_worker.previous_all_action_info = env_action_info
                 env_worker.send(EnvironmentCommand.STEP, env_action_info)
                 env_worker.waiting = True
+                env_worker.step_sent_time = time.time()
 
     def _step(self) -> List[EnvironmentStep]:
+        step_start_time = time.time()
+        restarted_steps: List[EnvironmentStep] = []
+        if self.env_scaler is not None:
+            restarted_steps.extend(self._scale_workers())
         # Queue steps for any workers which aren't in the "waiting" state.
         self._queue_steps()
 
@@ -301,24 +419,263 @@ class SubprocessEnvManager(EnvManager):
         step_workers: Set[int] = set()
         # Poll the step queue for completed steps from environment workers until we retrieve
         # 1 or more, which we will then return as StepInfos
-        while len(worker_steps) < 1:
+        while len(worker_steps) < 1 and len(restarted_steps) < 1:
             try:
                 while True:
-                    step: EnvironmentResponse = self.step_queue.get_nowait()
+                    step: EnvironmentResponse = self._get_next_response()
                     if step.cmd == EnvironmentCommand.ENV_EXITED:
                         env_exception: Exception = step.payload
-                        raise env_exception
-                    self.env_workers[step.worker_id].waiting = False
-                    if step.worker_id not in step_workers:
-                        worker_steps.append(step)
-                        step_workers.add(step.worker_id)
+                        restarted_steps.append(
+                            self._restart_worker(step.worker_id, env_exception)
+                        )
+                    elif (
+                        step.cmd == EnvironmentCommand.CLOSED
+                        or step.worker_id >= len(self.env_workers)
+                    ):
+                        # Left over from a worker that was restarted or removed.
+                        continue
+                    else:
+                        self.env_workers[step.worker_id].waiting = False
+                        if step.worker_id not in step_workers:
+                            worker_steps.append(step)
+                            step_workers.add(step.worker_id)
             except EmptyQueueException:
                 pass
+            if self.restarts_enabled and not worker_steps and not restarted_steps:
+                restarted_steps.extend(self._restart_unresponsive_workers())
 
         step_infos = self._postprocess_steps(worker_steps)
-        return step_infos
+        if self.env_scaler is not None:
+            step_end_time = time.time()
+            if self.last_step_end_time is not None:
+                self.env_scaler.record_step(
+                    step_end_time - step_start_time,
+                    step_start_time - self.last_step_end_time,
+                )
+            self.last_step_end_time = step_end_time
+        return step_infos + restarted_steps
+
+    def _get_next_response(self) -> EnvironmentResponse:
+        if self.pending_responses:
+            return self.pending_responses.popleft()
+        return self.step_queue.get_nowait()
+
+    @property
+    def restarts_enabled(self) -> bool:
+        return self.run_options.env_settings.max_lifetime_restarts != 0
+
+    def _restart_unresponsive_workers(self) -> List[EnvironmentStep]:
+        """
+        Restarts the workers whose process died without reporting it, or that have not answered
+        a step request within the worker timeout. Checks are throttled to
+        WORKER_HEALTH_CHECK_INTERVAL_S since this is called while busy-waiting on the step queue.
+        """
+        now = time.time()
+        if now - self.last_health_check < WORKER_HEALTH_CHECK_INTERVAL_S:
+            return []
+        self.last_health_check = now
+        timeout = self.run_options.env_settings.worker_timeout_s
+        restarted_steps: List[EnvironmentStep] = []
+        for env_worker in list(self.env_workers):
+            if not env_worker.waiting:
+                continue
+            if not env_worker.process.is_alive():
+                if env_worker.process.exitcode == 0:
+                    # The worker exited cleanly, so its ENV_EXITED message is on its way.
+                    continue
+                ex: Exception = UnityCommunicationException(
+                    f"UnityEnvironment worker {env_worker.worker_id}: process exited "
+                    f"with code {env_worker.process.exitcode}."
+                )
+            elif timeout > 0 and now - env_worker.step_sent_time > timeout:
+                ex = UnityTimeOutException(
+                    f"UnityEnvironment worker {env_worker.worker_id}: no response "
+                    f"after {timeout} seconds."
+                )
+                # The worker is stuck, it won't process a close request.
+                env_worker.process.terminate()
+            else:
+                continue
+            restarted_steps.append(self._restart_worker(env_worker.worker_id, ex))
+        return restarted_steps
+
+    def _restart_worker(self, worker_id: int, exception: Exception) -> EnvironmentStep:
+        """
+        Replaces a failed worker with a new one using the same worker_id, after dropping the
+        agents of the failed worker from the AgentManagers.
+        Raises the worker's exception if it can't be recovered from or if the worker is out of
+        restarts.
+        :param worker_id: The worker to restart.
+        :param exception: The exception raised by the worker.
+        :return: The EnvironmentStep resulting from resetting the new environment.
+        """
+        self._assert_worker_can_restart(worker_id, exception)
+        restart_stats: EnvironmentStats = {
+            "Environment/Worker Restarts": [(1.0, StatsAggregationMethod.SUM)]
+        }
+        with hierarchical_timer("worker_restart"):
+            self._shutdown_worker(self.env_workers[worker_id])
+            for agent_manager in self.agent_managers.values():
+                agent_manager.end_worker_episodes(worker_id)
+            while True:
+                logger.warning(f"Restarting worker[{worker_id}] after '{exception}'")
+                self.restart_counts[worker_id] += 1
+                self.recent_restart_timestamps[worker_id].append(time.time())
+                try:
+                    env_worker = self._start_worker(worker_id, restart_stats)
+                    break
+                except RESTARTABLE_EXCEPTIONS as ex:
+                    self._assert_worker_can_restart(worker_id, ex)
+                    exception = ex
+        self.env_workers[worker_id] = env_worker
+        return env_worker.previous_step
+
+    def _start_worker(
+        self, worker_id: int, environment_stats: EnvironmentStats
+    ) -> UnityEnvWorker:
+        """
+        Creates a worker once training is running. Its environment receives the current environment
+        parameters and training analytics, and is reset. The result of the reset is stored as the
+        previous_step of the worker, along with the given environment_stats.
+        If the environment fails while starting, the worker is shut down and the exception re-raised.
+        """
+        env_worker = self.create_worker(
+            worker_id, self.step_queue, self.env_factory, self.run_options
+        )
+        self.workers_alive += 1
+        try:
+            env_worker.recv()  # READY
+            if self.env_parameters is not None:
+                env_worker.send(
+                    EnvironmentCommand.ENVIRONMENT_PARAMETERS, self.env_parameters
+                )
+            for behavior_name, trainer_settings in self.training_started.items():
+                env_worker.send(
+                    EnvironmentCommand.TRAINING_STARTED, (behavior_name, trainer_settings)
+                )
+            env_worker.send(EnvironmentCommand.RESET, self.env_parameters)
+            all_step_result = env_worker.recv().payload
+        except RESTARTABLE_EXCEPTIONS:
+            self._shutdown_worker(env_worker)
+            raise
+        env_worker.previous_step = EnvironmentStep(
+            all_step_result, worker_id, {}, environment_stats
+        )
+        return env_worker
+
+    def _scale_workers(self) -> List[EnvironmentStep]:
+        """
+        Adds or removes a worker if the ElasticEnvScaler decides so. Workers are always added and
+        removed at the end of the list, so that worker ids stay contiguous.
+        :return: The EnvironmentStep from resetting a new worker, if one was added.
+        """
+        trajectory_queues = [
+            agent_manager.trajectory_queue
+            for agent_manager in self.agent_managers.values()
+        ]
+        scaling = self.env_scaler.get_scaling(len(self.env_workers), trajectory_queues)
+        new_steps: List[EnvironmentStep] = []
+        if scaling > 0:
+            worker_id = len(self.env_workers)
+            with hierarchical_timer("worker_add"):
+                try:
+                    env_worker = self._start_worker(worker_id, {})
+                except RESTARTABLE_EXCEPTIONS as ex:
+                    logger.warning(f"Could not add worker[{worker_id}]: '{ex}'")
+                    return new_steps
+            self.env_workers.append(env_worker)
+            self.restart_counts.append(0)
+            self.recent_restart_timestamps.append([])
+            new_steps.append(env_worker.previous_step)
+        elif scaling < 0:
+            with hierarchical_timer("worker_remove"):
+                env_worker = self.env_workers.pop()
+                self._shutdown_worker(env_worker)
+                for agent_manager in self.agent_managers.values():
+                    agent_manager.end_worker_episodes(env_worker.worker_id)
+            self.restart_counts.pop()
+            self.recent_restart_timestamps.pop()
+        if scaling != 0:
+            num_envs_stats: EnvironmentStats = {
+                "Environment/Num Envs": [
+                    (float(len(self.env_workers)), StatsAggregationMethod.MOST_RECENT)
+                ]
+            }
+            for agent_manager in self.agent_managers.values():
+                agent_manager.record_environment_stats(num_envs_stats, 0)
+        return new_steps
+
+    def _assert_worker_can_restart(self, worker_id: int, exception: Exception) -> None:
+        """
+        Re-raises the exception of a worker if restarts are disabled, if the exception is not
+        recoverable, or if the worker exceeded its lifetime or rate-limited number of restarts.
+        """
+        if not self.restarts_enabled or not isinstance(
+            exception, RESTARTABLE_EXCEPTIONS
+        ):
+            raise exception
+        env_settings = self.run_options.env_settings
+        window_start = time.time() - env_settings.restarts_rate_limit_period_s
+        self.recent_restart_timestamps[worker_id] = [
+            t for t in self.recent_restart_timestamps[worker_id] if t > window_start
+        ]
+        max_lifetime_restarts = env_settings.max_lifetime_restarts
+        rate_limit_n = env_settings.restarts_rate_limit_n
+        if (
+            max_lifetime_restarts != -1
+            and self.restart_counts[worker_id] >= max_lifetime_restarts
+        ) or (
+            rate_limit_n != -1
+            and len(self.recent_restart_timestamps[worker_id]) >= rate_limit_n
+        ):
+            logger.error(f"Worker {worker_id} exceeded the allowed number of restarts.")
+            raise exception
+
+    def _shutdown_worker(self, env_worker: UnityEnvWorker) -> None:
+        """
+        Makes sure the process of a failed or removed worker is stopped, and removes its remaining
+        messages from the step queue. Messages from other workers are kept in pending_responses.
+        """
+        env_worker.request_close()
+        env_worker.process.join(WORKER_SHUTDOWN_TIMEOUT_S)
+        if env_worker.process.is_alive():
+            env_worker.process.terminate()
+            env_worker.process.join()
+        # A worker that went through its shutdown sequence always sends CLOSED last.
+        expect_closed = env_worker.process.exitcode == 0
+        deadline = time.time() + WORKER_SHUTDOWN_TIMEOUT_S
+        other_responses: List[EnvironmentResponse] = []
+        stats_responses: List[EnvironmentResponse] = []
+        while expect_closed and time.time() < deadline:
+            try:
+                step: EnvironmentResponse = self.step_queue.get(
+                    timeout=max(0.0, deadline - time.time())
+                )
+                if step.worker_id != env_worker.worker_id:
+                    other_responses.append(step)
+                elif step.cmd == EnvironmentCommand.STATS:
+                    # The timers and stats the worker flushed before closing
+                    stats_responses.append(step)
+                elif step.cmd == EnvironmentCommand.CLOSED:
+                    expect_closed = False
+            except EmptyQueueException:
+                pass
+        self._process_worker_stats(stats_responses)
+        # Messages from the failed worker that were already read off the queue are stale too.
+        self.pending_responses = deque(
+            step
+            for step in list(self.pending_responses) + other_responses
+            if step.worker_id != env_worker.worker_id
+        )
+        env_worker.conn.close()
+        if not env_worker.closed:
+            env_worker.closed = True
+            self.workers_alive -= 1
 
     def _reset_env(self, config: Optional[Dict] = None) -> List[EnvironmentStep]:
+        while self.pending_responses:
+            step = self.pending_responses.popleft()
+            self.env_workers[step.worker_id].waiting = False
         while any(ew.waiting for ew in self.env_workers):
             if not self.step_queue.empty():
                 step = self.step_queue.get_nowait()
@@ -326,19 +683,48 @@ class SubprocessEnvManager(EnvManager):
         # Send config to environment
         self.set_env_parameters(config)
         # First enqueue reset commands for all workers so that they reset in parallel
+        with hierarchical_timer("worker_reset") as timer_node:
+            reset_start = time.perf_counter()
+            for ew in self.env_workers:
+                ew.send(EnvironmentCommand.RESET, config)
+            # Next collect the reset observations, in whatever order the workers finish
+            responses = self._recv_all(self.env_workers, timer_node, reset_start)
         for ew in self.env_workers:
-            ew.send(EnvironmentCommand.RESET, config)
-        # Next (synchronously) collect the reset observations from each worker in sequence
-        for ew in self.env_workers:
-            ew.previous_step = EnvironmentStep(ew.recv().payload, ew.worker_id, {}, {})
+            ew.previous_step = EnvironmentStep(
+                responses[ew.worker_id].payload, ew.worker_id, {}, {}
+            )
         return list(map(lambda ew: ew.previous_step, self.env_workers))
 
+    @staticmethod
+    def _recv_all(
+        env_workers: List[UnityEnvWorker], timer_node: TimerNode, start_time: float
+    ) -> Dict[int, EnvironmentResponse]:
+        """
+        Waits on the pipes of all the given workers at once until each of them has responded. The time
+        each worker took since start_time is recorded in a child of timer_node.
+        :param env_workers: The workers to receive a response from.
+        :param timer_node: The timer the latencies are recorded under.
+        :param start_time: time.perf_counter() value of when the requests were sent.
+        :return: Dict of worker_id to the response of that worker.
+        """
+        responses: Dict[int, EnvironmentResponse] = {}
+        pending: Dict[Any, UnityEnvWorker] = {ew.conn: ew for ew in env_workers}
+        while pending:
+            for conn in wait(list(pending.keys())):
+                env_worker = pending.pop(conn)
+                responses[env_worker.worker_id] = env_worker.recv()
+                worker_node = timer_node.get_child(f"worker_{env_worker.worker_id}")
+                worker_node.is_parallel = True
+                worker_node.add_time(time.perf_counter() - start_time)
+        return responses
+
     def set_env_parameters(self, config: Dict = None) -> None:
         """
         Sends environment parameter settings to C# via the
         EnvironmentParametersSidehannel for each worker.
         :param config: Dict of environment parameter keys and values
         """
+        self.env_parameters = config
         for ew in self.env_workers:
             ew.send(EnvironmentCommand.ENVIRONMENT_PARAMETERS, config)
 
@@ -351,6 +737,7 @@ class SubprocessEnvManager(EnvManager):
         :param trainer_settings:
         :return:
         """
+        self.training_started[behavior_name] = trainer_settings
         for ew in self.env_workers:
             ew.send(
                 EnvironmentCommand.TRAINING_STARTED, (behavior_name, trainer_settings)
@@ -359,27 +746,39 @@ class SubprocessEnvManager(EnvManager):
     @property
     def training_behaviors(self) -> Dict[BehaviorName, BehaviorSpec]:
         result: Dict[BehaviorName, BehaviorSpec] = {}
+        with hierarchical_timer("worker_handshake") as timer_node:
+            handshake_start = time.perf_counter()
+            for worker in self.env_workers:
+                worker.send(EnvironmentCommand.BEHAVIOR_SPECS)
+            responses = self._recv_all(self.env_workers, timer_node, handshake_start)
         for worker in self.env_workers:
-            worker.send(EnvironmentCommand.BEHAVIOR_SPECS)
-            result.update(worker.recv().payload)
+            result.update(responses[worker.worker_id].payload)
         return result
 
     def close(self) -> None:
         logger.debug("SubprocessEnvManager closing.")
         for env_worker in self.env_workers:
-            env_worker.request_close()
+            if not env_worker.closed:
+                env_worker.request_close()
         # Pull messages out of the queue until every worker has CLOSED or we time out.
         deadline = time.time() + WORKER_SHUTDOWN_TIMEOUT_S
+        stats_responses: List[EnvironmentResponse] = []
         while self.workers_alive > 0 and time.time() < deadline:
             try:
                 step: EnvironmentResponse = self.step_queue.get_nowait()
+                if step.worker_id >= len(self.env_workers):
+                    # Left over from a worker that was removed.
+                    continue
                 env_worker = self.env_workers[step.worker_id]
                 if step.cmd == EnvironmentCommand.CLOSED and not env_worker.closed:
                     env_worker.closed = True
                     self.workers_alive -= 1
+                elif step.cmd == EnvironmentCommand.STATS:
+                    stats_responses.append(step)
                 # Discard all other messages.
             except EmptyQueueException:
                 pass
+        self._process_worker_stats(stats_responses)
         self.step_queue.close()
         # Sanity check to kill zombie workers and report an issue if they occur.
         if self.workers_alive > 0:
@@ -396,7 +795,7 @@ class SubprocessEnvManager(EnvManager):
         self, env_steps: List[EnvironmentResponse]
     ) -> List[EnvironmentStep]:
         step_infos = []
-        timer_nodes = []
+        timer_nodes: List[TimerNode] = []
         for step in env_steps:
             payload: StepResponse = step.payload
             env_worker = self.env_workers[step.worker_id]
@@ -412,6 +811,26 @@ class SubprocessEnvManager(EnvManager):
             if payload.timer_root:
                 timer_nodes.append(payload.timer_root)
 
+        self._merge_worker_timers(timer_nodes)
+        return step_infos
+
+    def _process_worker_stats(self, stats_responses: List[EnvironmentResponse]) -> None:
+        """
+        Records the timers and environment stats that the workers flushed when closing.
+        """
+        timer_nodes: List[TimerNode] = []
+        for response in stats_responses:
+            payload: StepResponse = response.payload
+            if payload.timer_root:
+                timer_nodes.append(payload.timer_root)
+            for agent_manager in self.agent_managers.values():
+                agent_manager.record_environment_stats(
+                    payload.environment_stats, response.worker_id
+                )
+        self._merge_worker_timers(timer_nodes)
+
+    @staticmethod
+    def _merge_worker_timers(timer_nodes: List[TimerNode]) -> None:
         if timer_nodes:
             with hierarchical_timer("workers") as main_timer_node:
                 for worker_timer_node in timer_nodes:
@@ -419,8 +838,6 @@ class SubprocessEnvManager(EnvManager):
                         worker_timer_node, root_name="worker_root", is_parallel=True
                     )
 
-        return step_infos
-
     @timed
     def _take_step(self, last_step: EnvironmentStep) -> Dict[BehaviorName, ActionInfo]:
         all_action_info: Dict[str, ActionInfo] = {}
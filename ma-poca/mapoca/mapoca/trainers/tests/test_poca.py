@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from mapoca.trainers.trainer import TrainerFactory  # noqa F401, imports the trainers
+from mapoca.trainers.poca.trainer import lambda_return
+from mapoca.trainers.ppo.trainer import DISCOUNT_BLOCK_SIZE
+
+
+def _reference_lambda_return(r, value_estimates, gamma, lambd, value_next):
+    returns = np.zeros_like(r)
+    returns[-1] = r[-1] + gamma * value_next
+    for t in reversed(range(0, r.size - 1)):
+        returns[t] = (
+            gamma * lambd * returns[t + 1]
+            + r[t]
+            + (1 - lambd) * gamma * value_estimates[t + 1]
+        )
+    return returns
+
+
+@pytest.mark.parametrize(
+    "length",
+    [
+        1,
+        2,
+        DISCOUNT_BLOCK_SIZE - 1,
+        DISCOUNT_BLOCK_SIZE,
+        DISCOUNT_BLOCK_SIZE + 1,
+        2 * DISCOUNT_BLOCK_SIZE,
+        3001,
+    ],
+)
+@pytest.mark.parametrize("lambd", [0.0, 0.8, 1.0])
+def test_lambda_return(length, lambd):
+    rng = np.random.RandomState(length)
+    rewards = rng.normal(size=length).astype(np.float32)
+    value_estimates = rng.normal(size=length).astype(np.float32)
+    expected = _reference_lambda_return(rewards, value_estimates, 0.99, lambd, 1.5)
+    for value_next in [1.5, np.array([1.5], dtype=np.float32)]:
+        returns = lambda_return(
+            rewards, value_estimates, gamma=0.99, lambd=lambd, value_next=value_next
+        )
+        assert returns.shape == rewards.shape
+        assert returns.dtype == rewards.dtype
+        np.testing.assert_allclose(returns, expected, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from mapoca.trainers.trainer import TrainerFactory  # noqa F401, imports the trainers
+from mapoca.trainers.ppo.trainer import (
+    DISCOUNT_BLOCK_SIZE,
+    discount_rewards,
+    get_gae,
+)
+
+TRAJECTORY_LENGTHS = [
+    0,
+    1,
+    2,
+    DISCOUNT_BLOCK_SIZE - 1,
+    DISCOUNT_BLOCK_SIZE,
+    DISCOUNT_BLOCK_SIZE + 1,
+    2 * DISCOUNT_BLOCK_SIZE,
+    3001,
+]
+
+
+def _reference_discount_rewards(r, gamma, value_next):
+    discounted_r = np.zeros_like(r)
+    running_add = value_next
+    for t in reversed(range(0, r.size)):
+        running_add = running_add * gamma + r[t]
+        discounted_r[t] = running_add
+    return discounted_r
+
+
+def _reference_gae(rewards, value_estimates, value_next, gamma, lambd):
+    advantages = np.zeros_like(rewards)
+    next_value = value_next
+    running_add = 0.0
+    for t in reversed(range(0, rewards.size)):
+        delta = rewards[t] + gamma * next_value - value_estimates[t]
+        running_add = delta + gamma * lambd * running_add
+        advantages[t] = running_add
+        next_value = value_estimates[t]
+    return advantages
+
+
+@pytest.mark.parametrize("length", TRAJECTORY_LENGTHS)
+@pytest.mark.parametrize("gamma", [0.0, 0.9, 0.99, 1.0])
+def test_discount_rewards(length, gamma):
+    rng = np.random.RandomState(length)
+    rewards = rng.normal(size=length).astype(np.float32)
+    discounted = discount_rewards(rewards, gamma=gamma, value_next=2.0)
+    expected = _reference_discount_rewards(rewards, gamma, 2.0)
+    assert discounted.shape == rewards.shape
+    assert discounted.dtype == rewards.dtype
+    np.testing.assert_allclose(discounted, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_discount_rewards_value_next_array():
+    rewards = np.ones(DISCOUNT_BLOCK_SIZE + 1, dtype=np.float32)
+    value_next = np.array([3.0], dtype=np.float32)
+    discounted = discount_rewards(rewards, gamma=0.9, value_next=value_next)
+    expected = _reference_discount_rewards(rewards, 0.9, 3.0)
+    assert discounted.shape == rewards.shape
+    np.testing.assert_allclose(discounted, expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("length", TRAJECTORY_LENGTHS[1:])
+def test_get_gae(length):
+    rng = np.random.RandomState(length)
+    rewards = rng.normal(size=length).astype(np.float32)
+    value_estimates = rng.normal(size=length).astype(np.float32)
+    for value_next in [0.5, np.array([0.5], dtype=np.float32)]:
+        advantages = get_gae(
+            rewards, value_estimates, value_next=value_next, gamma=0.99, lambd=0.95
+        )
+        expected = _reference_gae(rewards, value_estimates, 0.5, 0.99, 0.95)
+        assert advantages.shape == rewards.shape
+        np.testing.assert_allclose(advantages, expected, rtol=1e-4, atol=1e-4)
@@ -0,0 +1,52 @@
+import pytest
+
+from mapoca.torch_utils import torch
+from mapoca.trainers.torch import attention
+from mapoca.trainers.torch.attention import MultiHeadAttention
+from mapoca.trainers.torch.model_serialization import exporting_to_onnx
+
+
+@pytest.mark.parametrize("use_fused", [False, True])
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_runtime_attention_matches_export(monkeypatch, use_fused, use_mask):
+    if use_fused and not hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        pytest.skip("scaled_dot_product_attention requires PyTorch 2.0")
+    monkeypatch.setattr(attention, "_HAS_FUSED_ATTENTION", use_fused)
+    torch.manual_seed(0)
+    n_q, n_k, embedding_size, num_heads = 3, 5, 12, 3
+    mha = MultiHeadAttention(embedding_size, num_heads)
+    query = torch.randn(4, n_q, embedding_size)
+    key = torch.randn(4, n_k, embedding_size)
+    value = torch.randn(4, n_k, embedding_size)
+    key_mask = None
+    if use_mask:
+        # Unmasked, partly masked, all masked and only one key unmasked rows
+        key_mask = torch.tensor(
+            [
+                [0, 0, 0, 0, 0],
+                [0, 1, 0, 1, 1],
+                [1, 1, 1, 1, 1],
+                [1, 1, 1, 1, 0],
+            ],
+            dtype=torch.float,
+        )
+    with torch.no_grad():
+        runtime_output, _ = mha(query, key, value, n_q, n_k, key_mask)
+        with exporting_to_onnx():
+            export_output, _ = mha(
+                query.clone(), key.clone(), value.clone(), n_q, n_k, key_mask
+            )
+    assert runtime_output.shape == (4, n_q, embedding_size)
+    assert torch.allclose(runtime_output, export_output, atol=1e-5)
+
+
+def test_runtime_attention_all_masked_is_uniform(monkeypatch):
+    monkeypatch.setattr(attention, "_HAS_FUSED_ATTENTION", False)
+    mha = MultiHeadAttention(4, 2)
+    value = torch.randn(1, 3, 4)
+    with torch.no_grad():
+        output, att = mha(
+            torch.randn(1, 2, 4), torch.randn(1, 3, 4), value, 2, 3, torch.ones(1, 3)
+        )
+    assert torch.allclose(att, torch.full_like(att, 1 / 3))
+    assert torch.allclose(output, value.mean(dim=1, keepdim=True).expand(1, 2, 4))
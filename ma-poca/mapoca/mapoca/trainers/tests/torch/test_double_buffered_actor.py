@@ -0,0 +1,88 @@
+import numpy as np
+
+from mlagents_envs.base_env import (
+    ActionSpec,
+    BehaviorSpec,
+    DecisionSteps,
+    DimensionProperty,
+    ObservationSpec,
+    ObservationType,
+)
+from mapoca.torch_utils import torch
+from mapoca.trainers.trainer import TrainerFactory  # noqa F401, imports the trainers
+from mapoca.trainers.buffer import AgentBuffer
+from mapoca.trainers.policy.torch_policy import TorchPolicy
+from mapoca.trainers.settings import NetworkSettings, TrainerSettings
+from mapoca.trainers.torch.double_buffered_actor import DoubleBufferedActor
+from mapoca.trainers.trajectory import ObsUtil
+
+VECTOR_OBS_SIZE = 4
+
+
+def _create_policy() -> TorchPolicy:
+    behavior_spec = BehaviorSpec(
+        [
+            ObservationSpec(
+                (VECTOR_OBS_SIZE,),
+                (DimensionProperty.NONE,),
+                ObservationType.DEFAULT,
+                "obs",
+            )
+        ],
+        ActionSpec.create_continuous(2),
+    )
+    trainer_settings = TrainerSettings(
+        threaded=True, network_settings=NetworkSettings(normalize=True)
+    )
+    return TorchPolicy(0, behavior_spec, trainer_settings)
+
+
+def _front_running_mean(policy: TorchPolicy) -> np.ndarray:
+    front = policy._double_buffered_actor.front
+    return front.network_body.observation_encoder.processors[
+        0
+    ].normalizer.running_mean.numpy()
+
+
+def test_front_normalizer_follows_update_normalization():
+    policy = _create_policy()
+    decision_steps = DecisionSteps(
+        [np.zeros((1, VECTOR_OBS_SIZE), dtype=np.float32)],
+        np.zeros(1, dtype=np.float32),
+        np.array([0]),
+        None,
+        np.zeros(1, dtype=np.int32),
+        np.zeros(1, dtype=np.float32),
+    )
+    rng = np.random.RandomState(0)
+    for _ in range(3):
+        buffer = AgentBuffer()
+        for obs in rng.normal(loc=5.0, size=(8, VECTOR_OBS_SIZE)):
+            buffer[ObsUtil.get_name_at(0)].append(obs.astype(np.float32))
+        policy.update_normalization(buffer)
+        # The acting thread picks the new statistics up on its next evaluation
+        policy.evaluate(decision_steps, ["agent-0"])
+        expected = policy.actor.network_body.observation_encoder.processors[
+            0
+        ].normalizer.running_mean.numpy()
+        assert np.abs(expected).min() > 0
+        np.testing.assert_array_equal(_front_running_mean(policy), expected)
+
+
+def test_publish_normalizers_keeps_published_weights():
+    actor = _create_policy().actor
+    double_buffered_actor = DoubleBufferedActor(actor)
+    normalizer = actor.network_body.observation_encoder.processors[0].normalizer
+    with torch.no_grad():
+        for param in actor.parameters():
+            param.add_(1.0)
+    double_buffered_actor.publish()
+    assert double_buffered_actor.swap()
+    # After the swap, the back copy holds the weights from before the publish
+    for step in range(1, 4):
+        normalizer.update(torch.full((2, VECTOR_OBS_SIZE), float(step)))
+        double_buffered_actor.publish_normalizers()
+        assert double_buffered_actor.swap()
+        front_state = double_buffered_actor.front.state_dict()
+        for name, value in actor.state_dict().items():
+            assert torch.equal(front_state[name], value), name
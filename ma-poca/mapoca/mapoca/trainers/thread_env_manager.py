@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, List, Callable, Optional
+
+from mlagents_envs.base_env import BaseEnv, BehaviorName, BehaviorSpec
+from mlagents_envs import logging_util
+from mlagents_envs.timers import timed
+from mlagents_envs.side_channel.side_channel import SideChannel
+from mlagents_envs.side_channel.environment_parameters_channel import (
+    EnvironmentParametersChannel,
+)
+from mlagents_envs.side_channel.stats_side_channel import StatsSideChannel
+from mapoca.trainers.env_manager import EnvManager, EnvironmentStep, AllStepResult
+from mapoca.trainers.action_info import ActionInfo
+from mapoca.trainers.settings import (
+    ParameterRandomizationSettings,
+    RunOptions,
+    TrainerSettings,
+)
+from mapoca.trainers.subprocess_env_manager import (
+    create_side_channels,
+    initialize_training_analytics,
+)
+
+logger = logging_util.get_logger(__name__)
+
+
+class InProcessEnv:
+    """
+    An environment stepped by the ThreadEnvManager, along with its side channels and the state of its
+    last step.
+    """
+
+    def __init__(
+        self,
+        worker_id: int,
+        env_factory: Callable[[int, List[SideChannel]], BaseEnv],
+        run_options: RunOptions,
+    ):
+        self.worker_id = worker_id
+        self.env_params = EnvironmentParametersChannel()
+        engine_channel, training_analytics_channel = create_side_channels(
+            worker_id, run_options
+        )
+        self.stats_channel = StatsSideChannel()
+        side_channels: List[SideChannel] = [
+            self.env_params,
+            engine_channel,
+            self.stats_channel,
+        ]
+        if training_analytics_channel is not None:
+            side_channels.append(training_analytics_channel)
+        self.env = env_factory(worker_id, side_channels)
+        self.training_analytics_channel = initialize_training_analytics(
+            self.env, training_analytics_channel, run_options
+        )
+        self.previous_step: EnvironmentStep = EnvironmentStep.empty(worker_id)
+        self.previous_all_action_info: Dict[str, ActionInfo] = {}
+        self.pending_step: Optional[Future] = None
+
+    def set_env_parameters(self, config: Optional[Dict]) -> None:
+        if config is not None:
+            for k, v in config.items():
+                if isinstance(v, float):
+                    self.env_params.set_float_parameter(k, v)
+                elif isinstance(v, ParameterRandomizationSettings):
+                    v.apply(k, self.env_params)
+
+    def training_started(
+        self, behavior_name: BehaviorName, trainer_settings: TrainerSettings
+    ) -> None:
+        if self.training_analytics_channel:
+            self.training_analytics_channel.training_started(
+                behavior_name, trainer_settings
+            )
+
+    def step(self, all_action_info: Dict[BehaviorName, ActionInfo]) -> EnvironmentStep:
+        for brain_name, action_info in all_action_info.items():
+            if len(action_info.agent_ids) > 0:
+                self.env.set_actions(brain_name, action_info.env_action)
+        self.env.step()
+        return EnvironmentStep(
+            self._generate_all_results(),
+            self.worker_id,
+            all_action_info,
+            self.stats_channel.get_and_reset_stats(),
+        )
+
+    def reset(self) -> EnvironmentStep:
+        self.env.reset()
+        return EnvironmentStep(self._generate_all_results(), self.worker_id, {}, {})
+
+    def _generate_all_results(self) -> AllStepResult:
+        all_step_result: AllStepResult = {}
+        for brain_name in self.env.behavior_specs:
+            all_step_result[brain_name] = self.env.get_steps(brain_name)
+        return all_step_result
+
+
+class ThreadEnvManager(EnvManager):
+    """
+    Implementation of the EnvManager interface that steps several BaseEnvs of the trainer process
+    concurrently, using a pool of threads. This avoids the process and pickling overhead of the
+    SubprocessEnvManager, and is useful for environments whose step() releases the GIL (e.g.
+    NumPy-heavy or native simulators). Actions are computed on the calling thread.
+    """
+
+    def __init__(
+        self,
+        env_factory: Callable[[int, List[SideChannel]], BaseEnv],
+        run_options: RunOptions,
+        n_env: int = 1,
+    ):
+        super().__init__()
+        self.envs: List[InProcessEnv] = [
+            InProcessEnv(worker_id, env_factory, run_options)
+            for worker_id in range(n_env)
+        ]
+        self.executor = ThreadPoolExecutor(
+            max_workers=n_env, thread_name_prefix="env_worker"
+        )
+
+    def _step(self) -> List[EnvironmentStep]:
+        # Queue steps for any environments that aren't currently stepping.
+        for env in self.envs:
+            if env.pending_step is None:
+                all_action_info = self._take_step(env.previous_step)
+                env.previous_all_action_info = all_action_info
+                env.pending_step = self.executor.submit(env.step, all_action_info)
+        # Wait until at least one environment is done, and return all the ones that are.
+        wait([env.pending_step for env in self.envs], return_when=FIRST_COMPLETED)
+        step_infos: List[EnvironmentStep] = []
+        for env in self.envs:
+            if env.pending_step is not None and env.pending_step.done():
+                env.previous_step = env.pending_step.result()
+                env.pending_step = None
+                step_infos.append(env.previous_step)
+        return step_infos
+
+    def _reset_env(self, config: Dict = None) -> List[EnvironmentStep]:
+        self._wait_for_pending_steps()
+        self.set_env_parameters(config)
+        # Reset all the environments in parallel
+        for env, reset_step in zip(
+            self.envs, self.executor.map(lambda e: e.reset(), self.envs)
+        ):
+            env.previous_step = reset_step
+        return [env.previous_step for env in self.envs]
+
+    def _wait_for_pending_steps(self) -> None:
+        for env in self.envs:
+            if env.pending_step is not None:
+                # Raise any exception from the environment.
+                env.pending_step.result()
+                env.pending_step = None
+
+    def set_env_parameters(self, config: Dict = None) -> None:
+        """
+        Sends environment parameter settings to each environment through its
+        EnvironmentParametersChannel.
+        :param config: Dict of environment parameter keys and values
+        """
+        for env in self.envs:
+            env.set_env_parameters(config)
+
+    def on_training_started(
+        self, behavior_name: str, trainer_settings: TrainerSettings
+    ) -> None:
+        """
+        Handle training starting for a new behavior type. Sends the training analytics
+        of the behavior through the environments' TrainingAnalyticsSideChannels.
+        """
+        # The side channels are only used by the environments between steps
+        self._wait_for_pending_steps()
+        for env in self.envs:
+            env.training_started(behavior_name, trainer_settings)
+
+    @property
+    def training_behaviors(self) -> Dict[BehaviorName, BehaviorSpec]:
+        result: Dict[BehaviorName, BehaviorSpec] = {}
+        for env in self.envs:
+            result.update(env.env.behavior_specs)
+        return result
+
+    def close(self) -> None:
+        logger.debug("ThreadEnvManager closing.")
+        try:
+            self._wait_for_pending_steps()
+        finally:
+            self.executor.shutdown(wait=True)
+            for env in self.envs:
+                env.env.close()
+
+    @timed
+    def _take_step(self, last_step: EnvironmentStep) -> Dict[BehaviorName, ActionInfo]:
+        all_action_info: Dict[str, ActionInfo] = {}
+        for brain_name, step_tuple in last_step.current_all_step_result.items():
+            if brain_name in self.policies:
+                all_action_info[brain_name] = self.policies[brain_name].get_action(
+                    step_tuple[0], last_step.worker_id
+                )
+        return all_action_info
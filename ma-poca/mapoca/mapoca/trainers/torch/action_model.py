@@ -179,6 +179,17 @@ class ActionModel(nn.Module):
             action_out_deprecated = None
         return continuous_out, discrete_out, action_out_deprecated
 
+    def sample(self, inputs: torch.Tensor, masks: torch.Tensor) -> AgentAction:
+        """
+        Samples actions given the encoding from the network body, without computing their
+        log probs and the entropies of the distributions.
+        :params inputs: The encoding from the network body
+        :params masks: Action masks for discrete actions
+        :return: An AgentAction of the actions generated by the policy.
+        """
+        dists = self._get_dists(inputs, masks)
+        return self._sample_action(dists)
+
     def forward(
         self, inputs: torch.Tensor, masks: torch.Tensor
     ) -> Tuple[AgentAction, ActionLogProbs, torch.Tensor]:
@@ -10,6 +10,9 @@ from mapoca.trainers.torch.layers import (
 from mapoca.trainers.torch.model_serialization import exporting_to_onnx
 from mapoca.trainers.exception import UnityTrainerException
 
+# The fused kernel is only available in PyTorch 2.0 and later
+_HAS_FUSED_ATTENTION = hasattr(torch.nn.functional, "scaled_dot_product_attention")
+
 
 def get_zero_entities_mask(entities: List[torch.Tensor]) -> List[torch.Tensor]:
     """
@@ -78,7 +81,9 @@ class MultiHeadAttention(torch.nn.Module):
         n_q: int,
         n_k: int,
         key_mask: Optional[torch.Tensor] = None,
-    ) -> Tuple[torch.Tensor, torch.Tensor]:
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        if not exporting_to_onnx.is_exporting():
+            return self._runtime_attention(query, key, value, n_q, n_k, key_mask)
         b = -1  # the batch size
 
         query = query.reshape(
@@ -120,6 +125,60 @@ class MultiHeadAttention(torch.nn.Module):
 
         return value_attention, att
 
+    def _runtime_attention(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        n_q: int,
+        n_k: int,
+        key_mask: Optional[torch.Tensor] = None,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        Computes the same attention as forward, without the operations needed for the
+        Barracuda export. Uses the fused scaled dot product attention of PyTorch when it
+        is available, in which case the returned attention matrix is None.
+        """
+        b = -1  # the batch size
+        query = query.reshape(b, n_q, self.n_heads, self.head_size).transpose(1, 2)
+        key = key.reshape(b, n_k, self.n_heads, self.head_size).transpose(1, 2)
+        value = value.reshape(b, n_k, self.n_heads, self.head_size).transpose(1, 2)
+        att: Optional[torch.Tensor] = None
+        if _HAS_FUSED_ATTENTION:
+            attn_mask = None
+            if key_mask is not None:
+                # Additive mask, so that queries with all keys masked are not NaN
+                attn_mask = key_mask.reshape(b, 1, 1, n_k) * self.NEG_INF
+            # The kernel scales by the head size, but the attention is scaled by the
+            # embedding size. The scale argument only exists since PyTorch 2.1.
+            query = query * (self.head_size / self.embedding_size) ** 0.5
+            value_attention = torch.nn.functional.scaled_dot_product_attention(
+                query, key, value, attn_mask=attn_mask
+            )  # (b, h, n_q, emb / h)
+            if key_mask is not None:
+                # When all the keys are masked, the export path attends to them
+                # uniformly, while the additive mask keeps the softmax of the scores
+                all_masked = key_mask.reshape(b, n_k).min(dim=1).values > 0
+                value_attention = torch.where(
+                    all_masked.reshape(b, 1, 1, 1),
+                    value.mean(dim=2, keepdim=True),
+                    value_attention,
+                )
+        else:
+            qk = torch.matmul(query, key.transpose(2, 3)) / (
+                self.embedding_size ** 0.5
+            )  # (b, h, n_q, n_k)
+            if key_mask is not None:
+                qk = qk.masked_fill(
+                    key_mask.reshape(b, 1, 1, n_k).bool(), self.NEG_INF
+                )
+            att = torch.softmax(qk, dim=3)  # (b, h, n_q, n_k)
+            value_attention = torch.matmul(att, value)  # (b, h, n_q, emb / h)
+        value_attention = value_attention.transpose(1, 2).reshape(
+            b, n_q, self.embedding_size
+        )  # (b, n_q, emb)
+        return value_attention, att
+
 
 class EntityEmbedding(torch.nn.Module):
     """
@@ -189,6 +248,11 @@ class EntityEmbedding(torch.nn.Module):
                 -1, num_entities, self.entity_size
             )
 
+        if self.self_size > 0 and not exporting_to_onnx.is_exporting():
+            first_layer = self.self_ent_encoder.seq_layers[0]
+            if isinstance(first_layer, torch.nn.Linear):
+                return self._encode_with_broadcast_self(first_layer, x_self, entities)
+
         if self.self_size > 0:
             expanded_self = x_self.reshape(-1, 1, self.self_size)
             expanded_self = torch.cat([expanded_self] * num_entities, dim=1)
@@ -198,6 +262,28 @@ class EntityEmbedding(torch.nn.Module):
         encoded_entities = self.self_ent_encoder(entities)
         return encoded_entities
 
+    def _encode_with_broadcast_self(
+        self, first_layer: torch.nn.Linear, x_self: torch.Tensor, entities: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Equivalent to encoding the concatenation of x_self with each entity, without
+        building the concatenated tensor: the first linear layer is split into its self
+        and entity parts, and the self part is computed once and broadcast to the entities.
+        """
+        weight = first_layer.weight
+        self_part = torch.nn.functional.linear(
+            x_self.reshape(-1, 1, self.self_size),
+            weight[:, : self.self_size],
+            first_layer.bias,
+        )  # (b, 1, emb)
+        entities_part = torch.nn.functional.linear(
+            entities, weight[:, self.self_size :]
+        )  # (b, n, emb)
+        encoded_entities = self_part + entities_part
+        for layer in self.self_ent_encoder.seq_layers[1:]:
+            encoded_entities = layer(encoded_entities)
+        return encoded_entities
+
 
 class ResidualSelfAttention(torch.nn.Module):
     """
@@ -1,6 +1,7 @@
 from typing import Dict
 import numpy as np
 from mapoca.torch_utils import torch
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.policy.torch_policy import TorchPolicy
 from mapoca.trainers.demo_loader import demo_to_buffer
@@ -177,7 +178,7 @@ class BCModule:
         )
         self.optimizer.zero_grad()
         bc_loss.backward()
-
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         run_out = {"loss": bc_loss.item()}
         return run_out
@@ -1,6 +1,7 @@
 import numpy as np
 from typing import Dict, NamedTuple
 from mapoca.torch_utils import torch, default_device
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.buffer import AgentBuffer, BufferKey
 from mapoca.trainers.torch.components.reward_providers.base_reward_provider import (
@@ -56,6 +57,7 @@ class CuriosityRewardProvider(BaseRewardProvider):
         )
         self.optimizer.zero_grad()
         loss.backward()
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         return {
             "Losses/Curiosity Forward Loss": forward_loss.item(),
@@ -1,6 +1,7 @@
 from typing import Optional, Dict, List
 import numpy as np
 from mapoca.torch_utils import torch, default_device
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.buffer import AgentBuffer, BufferKey
 from mapoca.trainers.torch.components.reward_providers.base_reward_provider import (
@@ -57,6 +58,7 @@ class GAILRewardProvider(BaseRewardProvider):
         )
         self.optimizer.zero_grad()
         loss.backward()
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         return stats_dict
 
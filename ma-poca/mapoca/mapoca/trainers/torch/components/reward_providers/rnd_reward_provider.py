@@ -1,6 +1,7 @@
 import numpy as np
 from typing import Dict
 from mapoca.torch_utils import torch
+from mapoca.torch_utils.distributed import all_reduce_gradients
 
 from mapoca.trainers.buffer import AgentBuffer
 from mapoca.trainers.torch.components.reward_providers.base_reward_provider import (
@@ -45,6 +46,7 @@ class RNDRewardProvider(BaseRewardProvider):
         loss = torch.mean(torch.sum((prediction - target) ** 2, dim=1))
         self.optimizer.zero_grad()
         loss.backward()
+        all_reduce_gradients(self.optimizer)
         self.optimizer.step()
         return {"Losses/RND Loss": loss.detach().cpu().numpy()}
 
@@ -4,6 +4,7 @@ from mapoca.torch_utils import torch, nn
 import numpy as np
 import math
 from mapoca.trainers.torch.layers import linear_layer, Initialization
+from mapoca.trainers.torch.model_serialization import exporting_to_onnx
 
 EPSILON = 1e-7  # Small value to avoid divide by zero
 
@@ -114,8 +115,13 @@ class CategoricalDistInstance(DiscreteDistInstance):
         return torch.multinomial(self.probs, 1)
 
     def pdf(self, value):
+        if not exporting_to_onnx.is_exporting():
+            return torch.gather(
+                self.probs, -1, value.reshape(-1, 1).long()
+            ).squeeze(-1)
         # This function is equivalent to torch.diag(self.probs.T[value.flatten().long()]),
-        # but torch.diag is not supported by ONNX export.
+        # but torch.diag is not supported by ONNX export. It builds a (batch, batch)
+        # intermediate, so it is only used when exporting.
         idx = torch.arange(start=0, end=len(value)).unsqueeze(-1)
         return torch.gather(
             self.probs.permute(1, 0)[value.flatten().long()], -1, idx
@@ -0,0 +1,99 @@
+import copy
+import threading
+from typing import List, Optional
+
+from mapoca.torch_utils import torch, nn
+from mapoca.trainers.torch.encoders import Normalizer
+
+
+class DoubleBufferedActor:
+    """
+    Keeps two copies of an Actor so that the actions can be sampled while a trainer thread
+    updates the actor. The trainer calls publish() to copy the weights of the actor into
+    the back copy, and the acting thread calls swap() to make the latest published weights
+    the front copy it samples with. The copies are swapped by reference, and only if the
+    back copy isn't being written, so the front copy always holds a consistent set of
+    weights and neither thread waits for the other. The lock only guards the version
+    number and the references to the copies. Since the observation normalizers are
+    updated between the updates of the weights, publish_normalizers() only copies their
+    statistics.
+    """
+
+    def __init__(self, actor: nn.Module) -> None:
+        self._actor = actor
+        self._front = self._copy(actor)
+        self._back = self._copy(actor)
+        self._lock = threading.Lock()
+        # Latest published version of the weights, and versions of the ones in the front
+        # and back copies
+        self._published_version = 0
+        self._front_version = 0
+        self._back_version = 0
+        self._writing = False
+        self._normalizer_names = [
+            f"{module_name}.{buffer_name}" if module_name else buffer_name
+            for module_name, module in actor.named_modules()
+            if isinstance(module, Normalizer)
+            for buffer_name, _ in module.named_buffers(recurse=False)
+        ]
+
+    @staticmethod
+    def _copy(actor: nn.Module) -> nn.Module:
+        actor_copy = copy.deepcopy(actor)
+        actor_copy.requires_grad_(False)
+        return actor_copy
+
+    @property
+    def front(self) -> nn.Module:
+        """
+        The copy of the actor to sample the actions with.
+        """
+        return self._front
+
+    def publish(self) -> None:
+        """
+        Copies the current weights of the actor into the back copy and makes them the
+        latest published version. Called by the thread that updates the actor.
+        """
+        self._write(None)
+
+    def publish_normalizers(self) -> None:
+        """
+        Copies the statistics of the observation normalizers of the actor into the back
+        copy and makes them the latest published version, without copying the other
+        weights. Called by the thread that updates the actor, after updating the
+        normalizers.
+        """
+        self._write(self._normalizer_names)
+
+    def _write(self, names: Optional[List[str]]) -> None:
+        with self._lock:
+            self._writing = True
+            back = self._back
+            # The back copy may hold older weights than the latest published ones after
+            # a swap, in which case it is brought up to date entirely.
+            if self._back_version != self._published_version:
+                names = None
+        actor_state = self._actor.state_dict()
+        back_state = back.state_dict()
+        with torch.no_grad():
+            for name in actor_state if names is None else names:
+                back_state[name].copy_(actor_state[name])
+        with self._lock:
+            self._writing = False
+            self._published_version += 1
+            self._back_version = self._published_version
+
+    def swap(self) -> bool:
+        """
+        Makes the back copy the front copy if it holds newer weights that are completely
+        written. Called by the thread that samples the actions.
+        :return: Whether the front copy changed.
+        """
+        with self._lock:
+            if self._writing or self._published_version == self._front_version:
+                return False
+            self._front, self._back = self._back, self._front
+            self._back_version = self._front_version
+            self._front_version = self._published_version
+            return True
@@ -3,6 +3,7 @@ from typing import Tuple, Optional, Union
 from mapoca.trainers.torch.layers import linear_layer, Initialization, Swish
 
 from mapoca.torch_utils import torch, nn
+from mapoca.torch_utils.distributed import all_reduce_sum_
 from mapoca.trainers.torch.model_serialization import exporting_to_onnx
 
 
@@ -12,6 +13,9 @@ class Normalizer(nn.Module):
         self.register_buffer("normalization_steps", torch.tensor(1))
         self.register_buffer("running_mean", torch.zeros(vec_obs_size))
         self.register_buffer("running_variance", torch.ones(vec_obs_size))
+        # The statistics common to all the ranks of data-parallel training, as float64
+        # (steps, sum, sum of squares), see all_reduce
+        self._synced_sums: Optional[Tuple[torch.Tensor, ...]] = None
 
     def forward(self, inputs: torch.Tensor) -> torch.Tensor:
         normalized_state = torch.clamp(
@@ -24,6 +28,8 @@ class Normalizer(nn.Module):
 
     def update(self, vector_input: torch.Tensor) -> None:
         with torch.no_grad():
+            if self._synced_sums is None:
+                self._synced_sums = self._sums()
             steps_increment = vector_input.size()[0]
             total_new_steps = self.normalization_steps + steps_increment
 
@@ -45,6 +51,45 @@ class Normalizer(nn.Module):
         self.normalization_steps.data.copy_(other_normalizer.normalization_steps.data)
         self.running_mean.data.copy_(other_normalizer.running_mean.data)
         self.running_variance.copy_(other_normalizer.running_variance.data)
+        self._synced_sums = None
+
+    def _sums(self) -> Tuple[torch.Tensor, ...]:
+        steps = self.normalization_steps.to(torch.float64)
+        mean = self.running_mean.to(torch.float64)
+        total = steps * mean
+        return steps, total, self.running_variance.to(torch.float64) + total * mean
+
+    def all_reduce(self) -> None:
+        """
+        Adds the statistics that the other ranks of data-parallel training accumulated
+        since the last call, so that the normalizers of all the ranks are the same.
+        All the ranks must call this.
+        """
+        with torch.no_grad():
+            steps, total, squares = self._sums()
+            if self._synced_sums is None:
+                # Not updated since the statistics were common to all the ranks
+                self._synced_sums = steps, total, squares
+            synced_steps, synced_total, synced_squares = self._synced_sums
+            deltas = torch.cat(
+                [
+                    (steps - synced_steps).reshape(1),
+                    total - synced_total,
+                    squares - synced_squares,
+                ]
+            )
+            all_reduce_sum_(deltas)
+            size = total.shape[0]
+            steps = synced_steps + deltas[0]
+            total = synced_total + deltas[1 : 1 + size]
+            squares = synced_squares + deltas[1 + size :]
+            mean = total / steps
+            self.normalization_steps = steps.round().to(self.normalization_steps.dtype)
+            self.running_mean = mean.to(self.running_mean.dtype)
+            self.running_variance = (squares - total * mean).to(
+                self.running_variance.dtype
+            )
+            self._synced_sums = self._sums()
 
 
 def conv_output_shape(
@@ -1,6 +1,7 @@
 from mapoca.torch_utils import torch
 import abc
-from typing import Tuple
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
 from enum import Enum
 from mapoca.trainers.torch.model_serialization import exporting_to_onnx
 
@@ -196,11 +197,76 @@ class LSTM(MemoryModule):
             kernel_init,
             bias_init,
         )
+        # Inputs, initial memories and outputs of the passes made in recording_passes()
+        self._recorded_passes: Optional[
+            List[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]
+        ] = None
 
     @property
     def memory_size(self) -> int:
         return 2 * self.hidden_size
 
+    @contextmanager
+    def recording_passes(
+        self
+    ) -> Iterator[List[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]]:
+        """
+        Records the input, initial memories and output of the passes of this LSTM made
+        within the context, in order, so that sequence_memories() can be called on them.
+        """
+        self._recorded_passes = []
+        try:
+            yield self._recorded_passes
+        finally:
+            self._recorded_passes = None
+
+    def sequence_memories(
+        self,
+        recorded_pass: Tuple[torch.Tensor, torch.Tensor, torch.Tensor],
+        sequence_length: int,
+    ) -> torch.Tensor:
+        """
+        Returns the memories at the start of each sequence of sequence_length steps of a
+        recorded pass over a single sequence, i.e. the initial memories of the sequences
+        if the pass was made sequence by sequence. The hidden states are read from the
+        output of the pass. The cell states are recomputed from the gates of all the steps
+        at once, followed by a scan over the sequences. Assumes a single layer.
+        :param recorded_pass: The input, initial memories and output of a pass with a
+            batch of one sequence, as recorded by recording_passes().
+        :param sequence_length: The length of the sequences.
+        :return: A Tensor of shape (number of sequences, memory_size).
+        """
+        input_tensor, memories, lstm_out = recorded_pass
+        num_steps = input_tensor.shape[1]
+        num_sequences = (num_steps + sequence_length - 1) // sequence_length
+        h0 = memories[0, :, : self.hidden_size]
+        c0 = memories[0, :, self.hidden_size :]
+        # Hidden state before each step
+        hidden = torch.cat([h0, lstm_out[0, :-1]], dim=0)
+        # Only the full sequences before the last one change the cell states we need
+        num_scanned = (num_sequences - 1) * sequence_length
+        gates = torch.nn.functional.linear(
+            input_tensor[0, :num_scanned], self.lstm.weight_ih_l0, self.lstm.bias_ih_l0
+        ) + torch.nn.functional.linear(
+            hidden[:num_scanned], self.lstm.weight_hh_l0, self.lstm.bias_hh_l0
+        )
+        input_gate, forget_gate, cell_gate, _ = gates.reshape(
+            num_sequences - 1, sequence_length, 4 * self.hidden_size
+        ).chunk(4, dim=-1)
+        forget = torch.sigmoid(forget_gate)
+        update = torch.sigmoid(input_gate) * torch.tanh(cell_gate)
+        # The cell state at the end of a sequence is decay * (cell state at its
+        # start) + increment. Compute these for all the sequences at once.
+        decay = torch.ones_like(forget[:, 0])
+        increment = torch.zeros_like(update[:, 0])
+        for step in range(sequence_length):
+            decay = decay * forget[:, step]
+            increment = forget[:, step] * increment + update[:, step]
+        cells = [c0[0]]
+        for seq_num in range(num_sequences - 1):
+            cells.append(decay[seq_num] * cells[-1] + increment[seq_num])
+        return torch.cat([hidden[::sequence_length], torch.stack(cells)], dim=-1)
+
     def forward(
         self, input_tensor: torch.Tensor, memories: torch.Tensor
     ) -> Tuple[torch.Tensor, torch.Tensor]:
@@ -218,6 +284,8 @@ class LSTM(MemoryModule):
         hidden = (h0, c0)
         lstm_out, hidden_out = self.lstm(input_tensor, hidden)
         output_mem = torch.cat(hidden_out, dim=-1)
+        if self._recorded_passes is not None:
+            self._recorded_passes.append((input_tensor, memories, lstm_out))
 
         if exporting_to_onnx.is_exporting():
             output_mem = torch.transpose(output_mem, 0, 1)
@@ -341,21 +341,29 @@ class MultiAgentNetworkBody(torch.nn.Module):
         attn_mask = only_first_obs_flat.isnan().float()
         return attn_mask
 
-    def _copy_and_remove_nans_from_obs(
-        self, all_obs: List[List[torch.Tensor]], attention_mask: torch.Tensor
-    ) -> List[List[torch.Tensor]]:
-        """
-        Helper function to remove NaNs from observations using an attention mask.
-        """
-        obs_with_no_nans = []
-        for i_agent, single_agent_obs in enumerate(all_obs):
-            no_nan_obs = []
-            for obs in single_agent_obs:
-                new_obs = obs.clone()
-                new_obs[attention_mask.bool()[:, i_agent], ::] = 0.0  # Remove NaNs fast
-                no_nan_obs.append(new_obs)
-            obs_with_no_nans.append(no_nan_obs)
-        return obs_with_no_nans
+    def _encode_agents(
+        self, all_obs: List[List[torch.Tensor]], nan_mask: Optional[torch.Tensor]
+    ) -> torch.Tensor:
+        """
+        Encodes the observations of all the agents in a single pass of the observation
+        encoder, by stacking the agent dimension into the batch dimension.
+        :param all_obs: For each agent, the list of its observations of shape (batch, ...).
+        :param nan_mask: If the padded agents have NaN observations, the (batch, n_agents)
+            mask of the padded agents. Their observations are replaced by zeros.
+        :return: The encoded observations, of shape (batch, n_agents, total_enc_size).
+        """
+        n_agents = len(all_obs)
+        flat_obs = []
+        for i_obs in range(len(all_obs[0])):
+            stacked_obs = torch.stack(
+                [agent_obs[i_obs] for agent_obs in all_obs], dim=1
+            )
+            if nan_mask is not None:
+                # Stacking copies the observations, so the NaNs can be removed in place.
+                stacked_obs[nan_mask.bool()] = 0.0
+            flat_obs.append(stacked_obs.reshape((-1,) + stacked_obs.shape[2:]))
+        encoded = self.observation_encoder(flat_obs)
+        return encoded.reshape(-1, n_agents, encoded.shape[-1])
 
     def forward(
         self,
@@ -364,6 +372,8 @@ class MultiAgentNetworkBody(torch.nn.Module):
         actions: List[AgentAction],
         memories: Optional[torch.Tensor] = None,
         sequence_length: int = 1,
+        obs_only_mask: Optional[torch.Tensor] = None,
+        obs_mask: Optional[torch.Tensor] = None,
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         """
         Returns sampled actions.
@@ -375,35 +385,113 @@ class MultiAgentNetworkBody(torch.nn.Module):
         :param actions: After concatenation with obs, these are processed with obs_action_encoder.
         :param memories: If using memory, a Tensor of initial memories.
         :param sequence_length: If using memory, the sequence length.
+        :param obs_only_mask: The (batch, len(obs_only)) mask that is 1 for the agents of
+            obs_only that are padding. If None, the padded agents are the ones with NaN
+            observations.
+        :param obs_mask: The (batch, len(obs)) mask that is 1 for the agents of obs that are
+            padding. If None, the padded agents are the ones with NaN observations.
         """
         self_attn_masks = []
         self_attn_inputs = []
-        concat_f_inp = []
         if obs:
-            obs_attn_mask = self._get_masks_from_nans(obs)
-            obs = self._copy_and_remove_nans_from_obs(obs, obs_attn_mask)
-            for inputs, action in zip(obs, actions):
-                encoded = self.observation_encoder(inputs)
-                cat_encodes = [
-                    encoded,
-                    action.to_flat(self.action_spec.discrete_branches),
-                ]
-                concat_f_inp.append(torch.cat(cat_encodes, dim=1))
-            f_inp = torch.stack(concat_f_inp, dim=1)
+            if obs_mask is None:
+                obs_attn_mask = self._get_masks_from_nans(obs)
+                encoded_obs = self._encode_agents(obs, obs_attn_mask)
+            else:
+                obs_attn_mask = obs_mask
+                encoded_obs = self._encode_agents(obs, None)
             self_attn_masks.append(obs_attn_mask)
-            self_attn_inputs.append(self.obs_action_encoder(None, f_inp))
+            self_attn_inputs.append(self._embed_obs_and_actions(encoded_obs, actions))
 
-        concat_encoded_obs = []
         if obs_only:
-            obs_only_attn_mask = self._get_masks_from_nans(obs_only)
-            obs_only = self._copy_and_remove_nans_from_obs(obs_only, obs_only_attn_mask)
-            for inputs in obs_only:
-                encoded = self.observation_encoder(inputs)
-                concat_encoded_obs.append(encoded)
-            g_inp = torch.stack(concat_encoded_obs, dim=1)
+            if obs_only_mask is None:
+                obs_only_attn_mask = self._get_masks_from_nans(obs_only)
+                g_inp = self._encode_agents(obs_only, obs_only_attn_mask)
+            else:
+                obs_only_attn_mask = obs_only_mask
+                g_inp = self._encode_agents(obs_only, None)
             self_attn_masks.append(obs_only_attn_mask)
             self_attn_inputs.append(self.obs_encoder(None, g_inp))
 
+        return self._encode_entities(
+            self_attn_inputs, self_attn_masks, memories, sequence_length
+        )
+
+    def value_and_baseline(
+        self,
+        obs: List[List[torch.Tensor]],
+        groupmate_actions: List[AgentAction],
+        value_memories: Optional[torch.Tensor] = None,
+        baseline_memories: Optional[torch.Tensor] = None,
+        sequence_length: int = 1,
+        groupmate_mask: Optional[torch.Tensor] = None,
+    ) -> Tuple[Tuple[torch.Tensor, torch.Tensor], Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Computes the encodings of both the centralized value, i.e.
+        forward(obs_only=obs), and the baseline of the agent of obs[0], i.e.
+        forward(obs_only=[obs[0]], obs=obs[1:], actions=groupmate_actions), while
+        encoding the observations of each agent only once.
+        :param obs: The observations of the agent, followed by the ones of its groupmates.
+        :param groupmate_actions: The actions of the groupmates.
+        :param value_memories: If using memory, a Tensor of initial value memories.
+        :param baseline_memories: If using memory, a Tensor of initial baseline memories.
+        :param sequence_length: If using memory, the sequence length.
+        :param groupmate_mask: The (batch, len(obs) - 1) mask that is 1 for the padded
+            groupmates. If None, the padded groupmates are the ones with NaN observations.
+        :return: The encoding and memories of the value, and the ones of the baseline.
+        """
+        if groupmate_mask is None:
+            attn_mask = self._get_masks_from_nans(obs)
+            encoded_obs = self._encode_agents(obs, attn_mask)
+        else:
+            self_mask = torch.zeros((groupmate_mask.shape[0], 1))
+            attn_mask = torch.cat([self_mask, groupmate_mask], dim=1)
+            encoded_obs = self._encode_agents(obs, None)
+        embedded_obs = self.obs_encoder(None, encoded_obs)
+
+        value = self._encode_entities(
+            [embedded_obs], [attn_mask], value_memories, sequence_length
+        )
+
+        baseline_inputs = []
+        baseline_masks = []
+        if len(obs) > 1:
+            baseline_inputs.append(
+                self._embed_obs_and_actions(encoded_obs[:, 1:], groupmate_actions)
+            )
+            baseline_masks.append(attn_mask[:, 1:])
+        baseline_inputs.append(embedded_obs[:, :1])
+        baseline_masks.append(attn_mask[:, :1])
+        baseline = self._encode_entities(
+            baseline_inputs, baseline_masks, baseline_memories, sequence_length
+        )
+        return value, baseline
+
+    def _embed_obs_and_actions(
+        self, encoded_obs: torch.Tensor, actions: List[AgentAction]
+    ) -> torch.Tensor:
+        """
+        Embeds the (batch, n_agents, total_enc_size) encoded observations of agents
+        along with their actions with the obs_action_encoder.
+        """
+        flat_actions = torch.stack(
+            [action.to_flat(self.action_spec.discrete_branches) for action in actions],
+            dim=1,
+        )
+        f_inp = torch.cat([encoded_obs, flat_actions], dim=2)
+        return self.obs_action_encoder(None, f_inp)
+
+    def _encode_entities(
+        self,
+        self_attn_inputs: List[torch.Tensor],
+        self_attn_masks: List[torch.Tensor],
+        memories: Optional[torch.Tensor],
+        sequence_length: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Applies the self attention and the linear encoder (and LSTM if any) to the
+        embedded agents, and appends the normalized number of agents to the result.
+        """
         encoded_entity = torch.cat(self_attn_inputs, dim=1)
         encoded_state = self.self_attn(encoded_entity, self_attn_masks)
 
@@ -532,6 +620,25 @@ class Actor(abc.ABC):
         """
         pass
 
+    def get_action(
+        self,
+        inputs: List[torch.Tensor],
+        masks: Optional[torch.Tensor] = None,
+        memories: Optional[torch.Tensor] = None,
+        sequence_length: int = 1,
+    ) -> Tuple[AgentAction, torch.Tensor]:
+        """
+        Returns sampled actions, without their log probs and entropies.
+        If memory is enabled, return the memories as well.
+        :param inputs: A List of inputs as tensors.
+        :param masks: If using discrete actions, a Tensor of action masks.
+        :param memories: If using memory, a Tensor of initial memories.
+        :param sequence_length: If using memory, the sequence length.
+        :return: A Tuple of AgentAction and memories.
+            Memories will be None if not using memory.
+        """
+        pass
+
     def get_stats(
         self,
         inputs: List[torch.Tensor],
@@ -640,6 +747,19 @@ class SimpleActor(nn.Module, Actor):
         action, log_probs, entropies = self.action_model(encoding, masks)
         return action, log_probs, entropies, memories
 
+    def get_action(
+        self,
+        inputs: List[torch.Tensor],
+        masks: Optional[torch.Tensor] = None,
+        memories: Optional[torch.Tensor] = None,
+        sequence_length: int = 1,
+    ) -> Tuple[AgentAction, torch.Tensor]:
+        encoding, memories = self.network_body(
+            inputs, memories=memories, sequence_length=sequence_length
+        )
+        action = self.action_model.sample(encoding, masks)
+        return action, memories
+
     def get_stats(
         self,
         inputs: List[torch.Tensor],
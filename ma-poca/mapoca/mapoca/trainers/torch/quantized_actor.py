@@ -0,0 +1,118 @@
+from typing import List, Optional
+import copy
+
+from mapoca.torch_utils import torch, nn
+from mlagents_envs.logging_util import get_logger
+
+from mapoca.trainers.torch.action_model import DistInstances
+
+logger = get_logger(__name__)
+
+EPSILON = 1e-7  # Small value to avoid divide by zero
+
+
+def _mean_kl_divergence(float_dists: DistInstances, dists: DistInstances) -> float:
+    """
+    Returns the KL divergence between the action distributions of two actors, summed over
+    the action branches and averaged over the batch.
+    """
+    kl = 0.0
+    if float_dists.continuous is not None and dists.continuous is not None:
+        # KL divergence of two diagonal Gaussians. For squashed Gaussians, this is also
+        # the divergence of the squashed distributions since tanh is a bijection.
+        p, q = float_dists.continuous, dists.continuous
+        kl_per_action = (
+            torch.log((q.std + EPSILON) / (p.std + EPSILON))
+            + (p.std ** 2 + (p.mean - q.mean) ** 2) / (2 * q.std ** 2 + EPSILON)
+            - 0.5
+        )
+        kl += torch.mean(torch.sum(kl_per_action, dim=1)).item()
+    if float_dists.discrete is not None and dists.discrete is not None:
+        for p, q in zip(float_dists.discrete, dists.discrete):
+            kl_per_branch = torch.sum(
+                p.probs * (p.all_log_prob() - q.all_log_prob()), dim=-1
+            )
+            kl += torch.mean(kl_per_branch).item()
+    return kl
+
+
+class QuantizedActor:
+    """
+    Keeps a copy of an Actor whose linear layers are dynamically quantized to int8, to
+    sample the actions during the rollouts on CPU. The copy is rebuilt from the float
+    actor after refresh() is called, i.e. when new weights are published, and is never
+    used to compute gradients. After each rebuild, divergence() compares the action
+    distributions of the two actors once. If the actor cannot be quantized,
+    get_actor() returns the float actor.
+    """
+
+    def __init__(self, actor: nn.Module) -> None:
+        self._actor = actor
+        self._quantized: Optional[nn.Module] = None
+        self._failed = False
+        self._check_divergence = False
+
+    def refresh(self) -> None:
+        """
+        Discards the quantized copy. It is rebuilt on the next call to get_actor().
+        """
+        self._quantized = None
+
+    def set_actor(self, actor: nn.Module) -> None:
+        """
+        Quantizes another actor of the same architecture from now on.
+        """
+        self._actor = actor
+        self.refresh()
+
+    def get_actor(self) -> nn.Module:
+        """
+        Returns the quantized copy of the actor, rebuilding it if needed.
+        """
+        if self._failed:
+            return self._actor
+        if self._quantized is None:
+            try:
+                self._quantized = torch.quantization.quantize_dynamic(
+                    copy.deepcopy(self._actor), {nn.Linear}, dtype=torch.qint8
+                )
+            except RuntimeError as e:
+                logger.warning(
+                    f"Could not quantize the actor for inference, falling back to float32: {e}"
+                )
+                self._failed = True
+                return self._actor
+            self._check_divergence = True
+        return self._quantized
+
+    def divergence(
+        self,
+        obs: List[torch.Tensor],
+        masks: Optional[torch.Tensor] = None,
+        memories: Optional[torch.Tensor] = None,
+    ) -> Optional[float]:
+        """
+        Returns the mean KL divergence from the action distributions of the float actor to
+        the ones of the quantized actor on the given inputs, if the quantized copy was
+        rebuilt since the last check. Otherwise returns None.
+        :param obs: List of observations.
+        :param masks: Action masks for discrete actions, else None.
+        :param memories: Input memories when using RNN, else None.
+        """
+        if not self._check_divergence or self._quantized is None:
+            return None
+        self._check_divergence = False
+        with torch.no_grad():
+            float_dists = self._get_dists(self._actor, obs, masks, memories)
+            dists = self._get_dists(self._quantized, obs, masks, memories)
+        return _mean_kl_divergence(float_dists, dists)
+
+    @staticmethod
+    def _get_dists(
+        actor: nn.Module,
+        obs: List[torch.Tensor],
+        masks: Optional[torch.Tensor],
+        memories: Optional[torch.Tensor],
+    ) -> DistInstances:
+        encoding, _ = actor.network_body(obs, memories=memories, sequence_length=1)
+        return actor.action_model._get_dists(encoding, masks)
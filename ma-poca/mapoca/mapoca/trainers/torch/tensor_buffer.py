@@ -0,0 +1,219 @@
+from typing import Dict, Iterator, List, Optional, Union
+import itertools
+
+import numpy as np
+
+from mapoca.torch_utils import torch
+from mapoca.trainers.buffer import AgentBuffer, AgentBufferKey, BufferKey
+from mapoca.trainers.trajectory import ObsUtil, GroupObsUtil
+from mapoca.trainers.torch.agent_action import AgentAction
+from mapoca.trainers.torch.action_log_probs import ActionLogProbs
+from mapoca.trainers.torch.utils import ModelUtils
+
+TensorField = Union[torch.Tensor, List[torch.Tensor]]
+
+
+class TensorBuffer:
+    """
+    Fields of an AgentBuffer converted to tensors once, so that mini-batches are made with
+    tensor indexing instead of list operations and conversions of numpy arrays.
+    The fields with one array per step are tensors of shape (num_experiences, ...). The group
+    fields, with a list of arrays per step, are padded with zeros to the maximum number of
+    groupmates into one tensor per groupmate, and group_mask is 1 for the padded groupmates.
+    The memory fields only keep the memories of the first step of each sequence, with shape
+    (num_sequences, memory size).
+    """
+
+    # Fields of which only the first step of each sequence is used
+    SEQUENCE_KEYS = (BufferKey.MEMORY, BufferKey.CRITIC_MEMORY, BufferKey.BASELINE_MEMORY)
+    DTYPES = {
+        BufferKey.DISCRETE_ACTION: torch.long,
+        BufferKey.GROUP_DISCRETE_ACTION: torch.long,
+        BufferKey.MASKS: torch.bool,
+    }
+
+    def __init__(
+        self,
+        fields: Dict[AgentBufferKey, TensorField],
+        group_mask: Optional[torch.Tensor],
+        sequence_length: int,
+        num_experiences: int,
+        agent_buffer: AgentBuffer,
+        sequence_indices: Optional[np.ndarray] = None,
+    ):
+        self._fields = fields
+        self.group_mask = group_mask
+        self.sequence_length = sequence_length
+        self.num_experiences = num_experiences
+        # The AgentBuffer these fields come from and, for a mini-batch, its sequences
+        self._agent_buffer = agent_buffer
+        self._sequence_indices = sequence_indices
+
+    @staticmethod
+    def from_buffer(
+        buffer: AgentBuffer, sequence_length: int, keys: List[AgentBufferKey]
+    ) -> "TensorBuffer":
+        """
+        Converts fields of an AgentBuffer to tensors.
+        :param buffer: An AgentBuffer whose length is a multiple of sequence_length, e.g. the
+            update buffer or a mini-batch of it.
+        :param sequence_length: The length of the sequences of the buffer.
+        :param keys: The fields to convert. The missing ones are skipped.
+        """
+        fields: Dict[AgentBufferKey, TensorField] = {}
+        for key in keys:
+            if key not in buffer:
+                continue
+            field = buffer[key]
+            dtype = TensorBuffer.DTYPES.get(key, torch.float32)
+            if key in TensorBuffer.SEQUENCE_KEYS:
+                fields[key] = ModelUtils.list_to_tensor(field[::sequence_length], dtype)
+            elif field.contains_lists:
+                np_dtype = np.int64 if dtype == torch.long else np.float32
+                fields[key] = [
+                    ModelUtils.list_to_tensor(arr, dtype)
+                    for arr in field.padded_to_batch(dtype=np_dtype)
+                ]
+            else:
+                fields[key] = ModelUtils.list_to_tensor(field, dtype)
+        group_mask = None
+        if GroupObsUtil.get_name_at(0) in fields:
+            group_mask = ModelUtils.list_to_tensor(
+                GroupObsUtil.padding_mask_from_buffer(buffer)
+            )
+        return TensorBuffer(
+            fields, group_mask, sequence_length, buffer.num_experiences, buffer
+        )
+
+    def __getitem__(self, key: AgentBufferKey) -> TensorField:
+        return self._fields[key]
+
+    def __contains__(self, key: AgentBufferKey) -> bool:
+        return key in self._fields
+
+    @property
+    def num_sequences(self) -> int:
+        return self.num_experiences // self.sequence_length
+
+    def make_mini_batch(self, sequence_indices: np.ndarray) -> "TensorBuffer":
+        """
+        Creates a mini-batch from the sequences at the given indices, in that order.
+        :param sequence_indices: The indices of the sequences.
+        """
+        sequences = torch.as_tensor(sequence_indices, dtype=torch.long)
+        steps = torch.as_tensor(
+            (
+                sequence_indices[:, None] * self.sequence_length
+                + np.arange(self.sequence_length)[None, :]
+            ).reshape(-1),
+            dtype=torch.long,
+        )
+        fields: Dict[AgentBufferKey, TensorField] = {}
+        for key, field in self._fields.items():
+            if key in self.SEQUENCE_KEYS:
+                fields[key] = field[sequences]
+            elif isinstance(field, list):
+                fields[key] = [_field[steps] for _field in field]
+            else:
+                fields[key] = field[steps]
+        group_mask = self.group_mask[steps] if self.group_mask is not None else None
+        if self._sequence_indices is not None:
+            sequence_indices = self._sequence_indices[sequence_indices]
+        return TensorBuffer(
+            fields,
+            group_mask,
+            self.sequence_length,
+            len(steps),
+            self._agent_buffer,
+            sequence_indices,
+        )
+
+    def shuffled_mini_batches(self, batch_size: int) -> Iterator["TensorBuffer"]:
+        """
+        Shuffles the sequences, like AgentBuffer.shuffle, and yields the mini-batches of
+        batch_size experiences that can be made from them.
+        :param batch_size: The number of experiences in a mini-batch, a multiple of the
+            sequence length.
+        """
+        sequence_indices = np.random.permutation(self.num_sequences)
+        sequences_per_batch = batch_size // self.sequence_length
+        max_num_batch = self.num_experiences // batch_size
+        for i in range(0, max_num_batch * sequences_per_batch, sequences_per_batch):
+            yield self.make_mini_batch(sequence_indices[i : i + sequences_per_batch])
+
+    def to_agent_buffer(self) -> AgentBuffer:
+        """
+        Returns the experiences of this buffer as an AgentBuffer, with all its fields. This
+        makes a copy for a mini-batch, so only use it for the updates that need it.
+        """
+        if self._sequence_indices is None:
+            return self._agent_buffer
+        mini_batch = AgentBuffer()
+        for key, field in self._agent_buffer.items():
+            mini_batch[key].set(
+                list(
+                    itertools.chain.from_iterable(
+                        field[i * self.sequence_length : (i + 1) * self.sequence_length]
+                        for i in self._sequence_indices
+                    )
+                )
+            )
+        return mini_batch
+
+    def obs(self, num_obs: int) -> List[torch.Tensor]:
+        return [self[ObsUtil.get_name_at(i)] for i in range(num_obs)]
+
+    def group_obs(self, num_obs: int) -> List[List[torch.Tensor]]:
+        """
+        Returns the padded observations of the groupmates, as a List(num_groupmates) of
+        Lists(num_obs).
+        """
+        separated_obs = [self[GroupObsUtil.get_name_at(i)] for i in range(num_obs)]
+        return [list(obs) for obs in zip(*separated_obs)]
+
+    def actions(self) -> AgentAction:
+        continuous = self._fields.get(BufferKey.CONTINUOUS_ACTION)
+        discrete = None
+        if BufferKey.DISCRETE_ACTION in self:
+            discrete_tensor = self[BufferKey.DISCRETE_ACTION]
+            discrete = [
+                discrete_tensor[..., i] for i in range(discrete_tensor.shape[-1])
+            ]
+        return AgentAction(continuous, discrete)
+
+    def group_actions(self) -> List[AgentAction]:
+        """
+        Returns the padded actions of the groupmates, like AgentAction.group_from_buffer.
+        """
+        actions_list = []
+        for _cont, _disc in itertools.zip_longest(
+            self._fields.get(BufferKey.GROUP_CONTINUOUS_ACTION, []),
+            self._fields.get(BufferKey.GROUP_DISCRETE_ACTION, []),
+            fillvalue=None,
+        ):
+            _disc_list = None
+            if _disc is not None:
+                _disc_list = [_disc[..., i] for i in range(_disc.shape[-1])]
+            actions_list.append(AgentAction(_cont, _disc_list))
+        return actions_list
+
+    def log_probs(self) -> ActionLogProbs:
+        continuous = self._fields.get(BufferKey.CONTINUOUS_LOG_PROBS)
+        discrete = None
+        if BufferKey.DISCRETE_LOG_PROBS in self:
+            discrete_tensor = self[BufferKey.DISCRETE_LOG_PROBS]
+            # This will keep discrete_list = None which enables flatten()
+            if discrete_tensor.shape[1] > 0:
+                discrete = [
+                    discrete_tensor[..., i] for i in range(discrete_tensor.shape[-1])
+                ]
+        return ActionLogProbs(continuous, discrete, None)
+
+    def memories(self, key: BufferKey) -> Optional[torch.Tensor]:
+        """
+        Returns the initial memories of the sequences of a memory field, with shape
+        (1, num_sequences, memory size), or None if there are none.
+        """
+        if key not in self or len(self[key]) == 0:
+            return None
+        return self[key].unsqueeze(0)
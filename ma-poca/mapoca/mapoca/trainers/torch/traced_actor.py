@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Tuple
+import warnings
+
+from mapoca.torch_utils import torch, nn
+from mlagents_envs.base_env import ActionSpec
+from mlagents_envs.logging_util import get_logger
+
+from mapoca.trainers.torch.agent_action import AgentAction
+from mapoca.trainers.torch.action_log_probs import ActionLogProbs
+
+logger = get_logger(__name__)
+
+
+class _ActorSampler(nn.Module):
+    """
+    Wraps the sampling path of an Actor so that it only takes and returns tensors, which
+    is required by torch.jit.trace. The inputs are the observations, followed by the
+    action masks and the memories if the actor uses them. The outputs are the continuous
+    actions, the discrete actions, their log probs, the entropies and the memories, with
+    empty tensors for the ones the actor doesn't have.
+    """
+
+    def __init__(self, actor: nn.Module, use_masks: bool, use_memories: bool):
+        super().__init__()
+        self.actor = actor
+        self.use_masks = use_masks
+        self.use_memories = use_memories
+
+    def forward(self, *inputs: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        inputs_list = list(inputs)
+        memories = inputs_list.pop() if self.use_memories else None
+        masks = inputs_list.pop() if self.use_masks else None
+        action, log_probs, entropy, memories = self.actor.get_action_and_stats(
+            inputs_list, masks, memories, 1
+        )
+        empty = torch.zeros(0)
+        return (
+            action.continuous_tensor if action.continuous_tensor is not None else empty,
+            action.discrete_tensor if action.discrete_list else empty,
+            log_probs.continuous_tensor
+            if log_probs.continuous_tensor is not None
+            else empty,
+            log_probs.discrete_tensor if log_probs.discrete_list else empty,
+            entropy,
+            memories if memories is not None else empty,
+        )
+
+
+class TracedActor:
+    """
+    Samples the actions of an Actor during the rollouts with TorchScript traces of its
+    sampling path, which avoids most of the Python overhead of the eager modules.
+    A trace may bake in the shapes of its inputs, so the actor is traced once per input
+    shape (i.e. per number of agents requesting a decision). The traces share the
+    parameters of the actor, but not the tensors the actor replaces (e.g. the running
+    statistics of the Normalizers), so they must be refreshed when new weights are
+    published. If the actor cannot be traced, sample() returns None and the caller falls
+    back to the eager actor.
+    """
+
+    MAX_TRACES = 16
+
+    def __init__(
+        self, actor: nn.Module, action_spec: ActionSpec, use_memories: bool
+    ) -> None:
+        self.action_spec = action_spec
+        self._sampler = _ActorSampler(
+            actor, action_spec.discrete_size > 0, use_memories
+        )
+        self._traces: Dict[Tuple[torch.Size, ...], torch.jit.ScriptModule] = {}
+        self._failed = False
+
+    @property
+    def enabled(self) -> bool:
+        return not self._failed
+
+    def refresh(self) -> None:
+        """
+        Discards the current traces. The actor is traced again on the next calls to sample().
+        """
+        self._traces.clear()
+
+    def set_actor(self, actor: nn.Module) -> None:
+        """
+        Samples with another actor of the same architecture from now on.
+        """
+        self._sampler.actor = actor
+        self.refresh()
+
+    def _trace(self, inputs: Tuple[torch.Tensor, ...]) -> torch.jit.ScriptModule:
+        if len(self._traces) >= self.MAX_TRACES:
+            self._traces.clear()
+        with warnings.catch_warnings():
+            # Each trace is only used for inputs of the shapes it was traced with
+            warnings.simplefilter("ignore")
+            traced = torch.jit.trace(self._sampler, inputs, check_trace=False)
+        self._traces[tuple(_input.shape for _input in inputs)] = traced
+        return traced
+
+    def sample(
+        self,
+        obs: List[torch.Tensor],
+        masks: Optional[torch.Tensor] = None,
+        memories: Optional[torch.Tensor] = None,
+    ) -> Optional[Tuple[AgentAction, ActionLogProbs, torch.Tensor, torch.Tensor]]:
+        """
+        Samples actions for a single step, without gradients.
+        :param obs: List of observations.
+        :param masks: Action masks for discrete actions, else None.
+        :param memories: Input memories when using RNN, else None.
+        :return: Tuple of AgentAction, ActionLogProbs, entropies, and output memories, or
+        None if the traced actor can't be used.
+        """
+        if self._failed:
+            return None
+        inputs = list(obs)
+        if self._sampler.use_masks:
+            inputs.append(masks)
+        if self._sampler.use_memories:
+            inputs.append(memories)
+        traced = self._traces.get(tuple(_input.shape for _input in inputs))
+        try:
+            with torch.no_grad():
+                if traced is None:
+                    traced = self._trace(tuple(inputs))
+                outputs = traced(*inputs)
+        except RuntimeError as e:
+            logger.warning(
+                f"Could not use a traced actor for inference, falling back to eager mode: {e}"
+            )
+            self._failed = True
+            self._traces.clear()
+            return None
+        cont_action, disc_action, cont_log_prob, disc_log_prob, entropy, memories_out = (
+            outputs
+        )
+        if self.action_spec.continuous_size == 0:
+            cont_action, cont_log_prob = None, None
+        disc_actions: Optional[List[torch.Tensor]] = None
+        disc_log_probs: Optional[List[torch.Tensor]] = None
+        if self.action_spec.discrete_size > 0:
+            disc_actions = list(torch.unbind(disc_action, dim=-1))
+            disc_log_probs = list(torch.unbind(disc_log_prob, dim=-1))
+        if not self._sampler.use_memories:
+            memories_out = None
+        return (
+            AgentAction(cont_action, disc_actions),
+            ActionLogProbs(cont_log_prob, disc_log_probs, None),
+            entropy,
+            memories_out,
+        )
@@ -0,0 +1,406 @@
+# # Unity ML-Agents Toolkit
+# ## ML-Agent Learning (Process Trainer)
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import cloudpickle
+import enum
+import queue
+import signal
+import time
+import traceback
+
+from mlagents_envs import logging_util
+from mlagents_envs.base_env import BehaviorSpec
+from mlagents_envs.side_channel.stats_side_channel import StatsAggregationMethod
+from mapoca.torch_utils import torch, default_device, set_torch_config
+from mapoca.trainers.agent_processor import AgentManagerQueue
+from mapoca.trainers.behavior_id_utils import BehaviorIdentifiers
+from mapoca.trainers.exception import UnityTrainerException
+from mapoca.trainers.policy import Policy
+from mapoca.trainers.policy.torch_policy import TorchPolicy
+from mapoca.trainers.settings import TorchSettings
+from mapoca.trainers.stats import StatsReporter, StatsSummary, StatsWriter
+from mapoca.trainers.trainer import Trainer
+from mapoca.trainers.training_status import GlobalTrainingStatus
+from mapoca.trainers.trajectory import Trajectory
+
+logger = logging_util.get_logger(__name__)
+
+TRAINER_SHUTDOWN_TIMEOUT_S = 10
+# Same as the trajectory queue of a threaded trainer
+TRAJECTORY_QUEUE_LEN = 20
+# How long the trainer process waits for a trajectory when it has none
+TRAJECTORY_WAIT_S = 0.01
+
+
+class TrainerCommand(enum.Enum):
+    READY = 1
+    STATS = 2
+    SAVE_MODEL = 3
+    END_EPISODE = 4
+    CLOSE = 5
+    ERROR = 6
+
+
+class TrainerMessage(NamedTuple):
+    cmd: TrainerCommand
+    payload: Any
+
+
+class _StatsForwarder(StatsWriter):
+    """
+    Records the stats of the trainer process, so that they are sent to the
+    StatsReporter of the main process, which has the actual writers.
+    """
+
+    def __init__(self, category: str):
+        self.category = category
+        # Either ("stat", key, value, aggregation) or ("write", step)
+        self.events: List[tuple] = []
+
+    def on_add_stat(
+        self,
+        category: str,
+        key: str,
+        value: float,
+        aggregation: StatsAggregationMethod = StatsAggregationMethod.AVERAGE,
+    ) -> None:
+        if category == self.category:
+            self.events.append(("stat", key, value, aggregation))
+
+    def write_stats(
+        self, category: str, values: Dict[str, StatsSummary], step: int
+    ) -> None:
+        if category == self.category:
+            self.events.append(("write", step))
+
+    def get_and_reset_events(self) -> List[tuple]:
+        events = self.events
+        self.events = []
+        return events
+
+
+class ProcessTrainer(Trainer):
+    """
+    Runs a trainer in its own process, so that its updates aren't slowed down by
+    the GIL of the main process, which steps the environments and samples the actions.
+    The trajectories are sent to the trainer process through a multiprocessing queue, and
+    the trainer process writes the weights of the actor in shared memory after each update.
+    The main process copies them into its policy the next time the trainer is advanced.
+    """
+
+    def __init__(self, trainer: Trainer, create_trainer: Callable[[], Trainer]):
+        """
+        :param trainer: A trainer of the main process, only used to create the policies.
+        :param create_trainer: Creates the trainer that runs in the trainer process. Must be
+        picklable with cloudpickle.
+        """
+        super().__init__(
+            trainer.brain_name,
+            trainer.trainer_settings,
+            trainer.is_training,
+            trainer.load,
+            trainer.artifact_path,
+            trainer.reward_buffer.maxlen or 1,
+        )
+        self._trainer = trainer
+        self._pickled_create_trainer = cloudpickle.dumps(create_trainer)
+        self._context = torch.multiprocessing.get_context("spawn")
+        self.trajectory_queue: AgentManagerQueue[Trajectory] = AgentManagerQueue(
+            trainer.brain_name,
+            maxlen=TRAJECTORY_QUEUE_LEN,
+            multiprocessing_context=self._context,
+        )
+        self._commands = self._context.Queue()
+        self._messages = self._context.Queue()
+        self._weights_lock = self._context.Lock()
+        self._weights_version = self._context.Value("i", 0)
+        self._loaded_version = 0
+        self._shared_weights: Dict[str, torch.Tensor] = {}
+        self._process: Optional[Any] = None
+        self._failed = False
+
+    @property
+    def threaded(self) -> bool:
+        # The main process only collects the stats and weights of the trainer process
+        return False
+
+    def create_policy(
+        self,
+        parsed_behavior_id: BehaviorIdentifiers,
+        behavior_spec: BehaviorSpec,
+        create_graph: bool = False,
+    ) -> Policy:
+        return self._trainer.create_policy(
+            parsed_behavior_id, behavior_spec, create_graph
+        )
+
+    def add_policy(
+        self, parsed_behavior_id: BehaviorIdentifiers, policy: Policy
+    ) -> None:
+        """
+        Starts the trainer process with a copy of the policy.
+        """
+        if self.policies:
+            raise UnityTrainerException(
+                f"The trainer of {self.brain_name} runs in its own process and "
+                "supports only one behavior."
+            )
+        if not isinstance(policy, TorchPolicy):
+            raise UnityTrainerException(
+                "Only TorchPolicy is supported by trainers in their own process."
+            )
+        self.policies[parsed_behavior_id.behavior_id] = policy
+        self._shared_weights = {
+            name: value.detach().cpu().clone().share_memory_()
+            for name, value in policy.actor.state_dict().items()
+        }
+        self._process = self._context.Process(
+            target=_run_trainer,
+            args=(
+                self._pickled_create_trainer,
+                parsed_behavior_id,
+                policy.behavior_spec,
+                TorchSettings(device=str(default_device())),
+                dict(GlobalTrainingStatus.saved_state[self.brain_name]),
+                self.trajectory_queue,
+                self._commands,
+                self._messages,
+                self._shared_weights,
+                self._weights_lock,
+                self._weights_version,
+                logger.level,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        # Wait for the trainer process to initialize or load its policy
+        self._wait_for(TrainerCommand.READY)
+        self._load_weights()
+
+    def get_policy(self, name_behavior_id: str) -> Policy:
+        return self.policies[name_behavior_id]
+
+    def subscribe_trajectory_queue(
+        self, trajectory_queue: AgentManagerQueue[Trajectory]
+    ) -> None:
+        if trajectory_queue is not self.trajectory_queue:
+            raise UnityTrainerException(
+                "The agent manager of a trainer in its own process must use the "
+                "trajectory_queue of the trainer."
+            )
+
+    def advance(self) -> None:
+        """
+        Handles the messages of the trainer process, and publishes its latest weights.
+        """
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_message(message)
+        if self._weights_version.value != self._loaded_version:
+            self._load_weights()
+            for q in self.policy_queues:
+                q.put(self.get_policy(q.behavior_id))
+
+    def save_model(self) -> None:
+        if not self._is_running():
+            logger.warning(
+                f"The trainer process of {self.brain_name} isn't running, "
+                "its model can't be saved."
+            )
+            return
+        self._commands.put(TrainerCommand.SAVE_MODEL)
+        training_status = self._wait_for(TrainerCommand.SAVE_MODEL)
+        GlobalTrainingStatus.saved_state[self.brain_name] = training_status
+
+    def end_episode(self) -> None:
+        if self._is_running():
+            self._commands.put(TrainerCommand.END_EPISODE)
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._commands.put(TrainerCommand.CLOSE)
+        # The trainer process can't exit before its messages are received
+        deadline = time.time() + TRAINER_SHUTDOWN_TIMEOUT_S
+        while self._process.is_alive() and time.time() < deadline:
+            try:
+                self._messages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if self._process.is_alive():
+            logger.warning(
+                f"The trainer process of {self.brain_name} didn't stop, terminating it."
+            )
+            self._process.terminate()
+        self._process.join()
+        # Empty the trajectory queue, so that its feeder thread doesn't write to it
+        # while this process exits
+        while True:
+            try:
+                self.trajectory_queue.get(0.1)
+            except AgentManagerQueue.Empty:
+                break
+        self._process = None
+
+    def _is_running(self) -> bool:
+        return (
+            self._process is not None and self._process.is_alive() and not self._failed
+        )
+
+    def _load_weights(self) -> None:
+        policy: TorchPolicy = next(iter(self.policies.values()))  # type: ignore
+        with self._weights_lock:
+            policy.load_weights(self._shared_weights)  # type: ignore
+            self._loaded_version = self._weights_version.value
+
+    def _wait_for(self, cmd: TrainerCommand) -> Any:
+        """
+        Handles the messages of the trainer process until it answers cmd.
+        :return: The payload of the answer.
+        """
+        while True:
+            try:
+                message = self._messages.get(timeout=1.0)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._failed = True
+                    raise UnityTrainerException(
+                        f"The trainer process of {self.brain_name} exited unexpectedly."
+                    )
+                continue
+            if message.cmd == cmd:
+                return message.payload
+            self._handle_message(message)
+
+    def _handle_message(self, message: TrainerMessage) -> None:
+        if message.cmd == TrainerCommand.STATS:
+            events, step = message.payload
+            for event in events:
+                if event[0] == "write":
+                    self._stats_reporter.write_stats(event[1])
+                    continue
+                _, key, value, aggregation = event
+                if aggregation == StatsAggregationMethod.MOST_RECENT:
+                    self._stats_reporter.set_stat(key, value)
+                else:
+                    self._stats_reporter.add_stat(key, value, aggregation)
+                if key == "Environment/Cumulative Reward":
+                    self._reward_buffer.appendleft(value)
+            self._step = step
+            for policy in self.policies.values():
+                policy.set_step(step)
+        elif message.cmd == TrainerCommand.ERROR:
+            self._failed = True
+            raise UnityTrainerException(
+                f"The trainer process of {self.brain_name} raised an exception:\n"
+                f"{message.payload}"
+            )
+
+
+def _run_trainer(
+    pickled_create_trainer: bytes,
+    parsed_behavior_id: BehaviorIdentifiers,
+    behavior_spec: BehaviorSpec,
+    torch_settings: TorchSettings,
+    training_status: Dict[str, Any],
+    trajectory_queue: AgentManagerQueue[Trajectory],
+    commands: Any,
+    messages: Any,
+    shared_weights: Dict[str, torch.Tensor],
+    weights_lock: Any,
+    weights_version: Any,
+    log_level: int = logging_util.INFO,
+) -> None:
+    # The main process decides when to stop, and saves the model first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging_util.set_log_level(log_level)
+    set_torch_config(torch_settings)
+    brain_name = parsed_behavior_id.brain_name
+    GlobalTrainingStatus.saved_state[brain_name].update(training_status)
+    stats_forwarder = _StatsForwarder(brain_name)
+    StatsReporter.add_writer(stats_forwarder)
+
+    def _publish_weights(policy: TorchPolicy) -> None:
+        with weights_lock:
+            for name, value in policy.actor.state_dict().items():
+                shared_weights[name].copy_(value)
+            weights_version.value += 1
+
+    try:
+        trainer: Trainer = cloudpickle.loads(pickled_create_trainer)()
+        policy = trainer.create_policy(
+            parsed_behavior_id, behavior_spec, create_graph=True
+        )
+        trainer.add_policy(parsed_behavior_id, policy)
+        local_trajectory_queue: AgentManagerQueue[Trajectory] = AgentManagerQueue(
+            parsed_behavior_id.behavior_id
+        )
+        policy_queue: AgentManagerQueue[Policy] = AgentManagerQueue(
+            parsed_behavior_id.behavior_id
+        )
+        trainer.subscribe_trajectory_queue(local_trajectory_queue)
+        trainer.publish_policy_queue(policy_queue)
+        _publish_weights(policy)
+        messages.put(TrainerMessage(TrainerCommand.READY, None))
+        last_step = trainer.get_step
+        while True:
+            while True:
+                try:
+                    cmd = commands.get_nowait()
+                except queue.Empty:
+                    break
+                if cmd == TrainerCommand.CLOSE:
+                    return
+                elif cmd == TrainerCommand.SAVE_MODEL:
+                    trainer.save_model()
+                    messages.put(
+                        TrainerMessage(
+                            TrainerCommand.SAVE_MODEL,
+                            dict(GlobalTrainingStatus.saved_state[brain_name]),
+                        )
+                    )
+                elif cmd == TrainerCommand.END_EPISODE:
+                    trainer.end_episode()
+            try:
+                local_trajectory_queue.put(trajectory_queue.get(TRAJECTORY_WAIT_S))
+                while True:
+                    local_trajectory_queue.put(trajectory_queue.get_nowait())
+            except AgentManagerQueue.Empty:
+                pass
+            trainer.advance()
+            updated = False
+            while True:
+                try:
+                    policy_queue.get_nowait()
+                    updated = True
+                except AgentManagerQueue.Empty:
+                    break
+            if updated:
+                _publish_weights(policy)
+            events = stats_forwarder.get_and_reset_events()
+            if events or trainer.get_step != last_step:
+                last_step = trainer.get_step
+                messages.put(
+                    TrainerMessage(TrainerCommand.STATS, (events, last_step))
+                )
+    except Exception:
+        logger.exception(f"The trainer process of {brain_name} raised an exception.")
+        messages.put(TrainerMessage(TrainerCommand.ERROR, traceback.format_exc()))
+    # Keep emptying the trajectory queue, so that the main process doesn't block on
+    # it before it receives the error
+    while True:
+        try:
+            if commands.get(timeout=0.1) == TrainerCommand.CLOSE:
+                return
+        except queue.Empty:
+            pass
+        try:
+            while True:
+                trajectory_queue.get_nowait()
+        except AgentManagerQueue.Empty:
+            pass
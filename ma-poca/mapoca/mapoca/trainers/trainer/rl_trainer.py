@@ -13,12 +13,14 @@ from mapoca.trainers.policy.checkpoint_manager import (
 )
 from mlagents_envs.logging_util import get_logger
 from mlagents_envs.timers import timed
+from mapoca.torch_utils import torch, distributed
 from mapoca.trainers.optimizer import Optimizer
 from mapoca.trainers.buffer import AgentBuffer, BufferKey
 from mapoca.trainers.trainer import Trainer
 from mapoca.trainers.torch.components.reward_providers.base_reward_provider import (
     BaseRewardProvider,
 )
+from mapoca.trainers.torch.encoders import Normalizer
 from mlagents_envs.timers import hierarchical_timer
 from mlagents_envs.base_env import BehaviorSpec
 from mapoca.trainers.policy.policy import Policy
@@ -60,6 +62,10 @@ class RLTrainer(Trainer):
             self.trainer_settings, self.artifact_path, self.load
         )
         self._has_warned_group_rewards = False
+        # In data-parallel training, the steps of this rank since the step count was last
+        # synchronized. The ranks decide to stop training from the synchronized count.
+        self._steps_since_sync = 0
+        self._process_group = distributed.new_group()
 
     def end_episode(self) -> None:
         """
@@ -204,6 +210,7 @@ class RLTrainer(Trainer):
         :param n_steps: number of steps to increment the step count by
         """
         self._step += n_steps
+        self._steps_since_sync += n_steps
         self._next_summary_step = self._get_next_interval_step(self.summary_freq)
         self._next_save_step = self._get_next_interval_step(
             self.trainer_settings.checkpoint_interval
@@ -237,6 +244,15 @@ class RLTrainer(Trainer):
         self._maybe_save_model(self.get_step + len(trajectory.steps))
         self._increment_step(len(trajectory.steps), trajectory.behavior_id)
 
+    def _process_trajectories(self, trajectories: List[Trajectory]) -> None:
+        """
+        Processes the trajectories drained from a trajectory queue, in order. Trainers can
+        override this to process several trajectories at once.
+        :param trajectories: The Trajectories to be processed.
+        """
+        for trajectory in trajectories:
+            self._process_trajectory(trajectory)
+
     def _maybe_write_summary(self, step_after_process: int) -> None:
         """
         If processing the trajectory will make the step exceed the next summary write,
@@ -273,7 +289,11 @@ class RLTrainer(Trainer):
             self._next_save_step = self._get_next_interval_step(
                 self.trainer_settings.checkpoint_interval
             )
-        if step_after_process >= self._next_save_step and self.get_step != 0:
+        if (
+            step_after_process >= self._next_save_step
+            and self.get_step != 0
+            and distributed.is_main_rank()
+        ):
             self._checkpoint()
 
     def _warn_if_group_reward(self, buffer: AgentBuffer) -> None:
@@ -299,20 +319,52 @@ class RLTrainer(Trainer):
                 # This ensures that even if the queue is being filled faster than it is
                 # being emptied, the trajectories in the queue are on-policy.
                 _queried = False
+                trajectories: List[Trajectory] = []
                 for _ in range(traj_queue.qsize()):
                     _queried = True
                     try:
-                        t = traj_queue.get_nowait()
-                        self._process_trajectory(t)
+                        trajectories.append(traj_queue.get_nowait())
                     except AgentManagerQueue.Empty:
                         break
+                self._process_trajectories(trajectories)
                 if self.threaded and not _queried:
                     # Yield thread to avoid busy-waiting
                     time.sleep(0.0001)
         if self.should_still_train:
             if self._is_ready_update():
-                with hierarchical_timer("_update_policy"):
+                with hierarchical_timer("_update_policy"), distributed.use_group(
+                    self._process_group
+                ):
+                    if distributed.is_distributed():
+                        self._synchronize_ranks()
                     if self._update_policy():
+                        for policy in self.policies.values():
+                            policy.publish_weights()
                         for q in self.policy_queues:
                             # Get policies that correspond to the policy queue in question
                             q.put(self.get_policy(q.behavior_id))
+
+    @property
+    def should_still_train(self) -> bool:
+        if distributed.is_distributed():
+            synced_step = self._step - self._steps_since_sync
+            return self.is_training and synced_step <= self.get_max_steps
+        return super().should_still_train
+
+    def _synchronize_ranks(self) -> None:
+        """
+        Before an update in data-parallel training, sets the step count to the total
+        number of steps of all the ranks and merges the statistics of the normalizers.
+        Each rank updates when it is ready and waits here for the other ranks.
+        """
+        steps = torch.tensor([self._steps_since_sync], dtype=torch.long)
+        distributed.all_reduce_sum_(steps)
+        self._step += int(steps.item()) - self._steps_since_sync
+        self._steps_since_sync = 0
+        for policy in self.policies.values():
+            policy.set_step(self._step)
+        for module in self.model_saver.modules.values():
+            if isinstance(module, torch.nn.Module):
+                for submodule in module.modules():
+                    if isinstance(submodule, Normalizer):
+                        submodule.all_reduce()
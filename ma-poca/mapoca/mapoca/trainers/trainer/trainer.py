@@ -161,6 +161,13 @@ class Trainer(abc.ABC):
         """
         pass
 
+    def close(self) -> None:
+        """
+        Releases the resources of the trainer, e.g. its process. Called once training is
+        over and the model is saved.
+        """
+        pass
+
     def publish_policy_queue(self, policy_queue: AgentManagerQueue[Policy]) -> None:
         """
         Adds a policy queue to the list of queues to publish to when this Trainer
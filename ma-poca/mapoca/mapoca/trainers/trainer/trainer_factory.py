@@ -1,3 +1,4 @@
+import functools
 import os
 from typing import Dict
 
@@ -5,12 +6,14 @@ from mlagents_envs.logging_util import get_logger
 from mapoca.trainers.environment_parameter_manager import EnvironmentParameterManager
 from mapoca.trainers.exception import TrainerConfigError
 from mapoca.trainers.trainer import Trainer
+from mapoca.trainers.trainer.process_trainer import ProcessTrainer
 from mapoca.trainers.ppo.trainer import PPOTrainer
 from mapoca.trainers.sac.trainer import SACTrainer
 from mapoca.trainers.poca.trainer import POCATrainer
 from mapoca.trainers.ghost.trainer import GhostTrainer
 from mapoca.trainers.ghost.controller import GhostController
 from mapoca.trainers.settings import TrainerSettings, TrainerType
+from mapoca.torch_utils import distributed
 
 
 logger = get_logger(__name__)
@@ -143,6 +146,31 @@ class TrainerFactory:
                 f'The trainer config contains an unknown trainer type "{trainer_type}" for brain {brain_name}'
             )
 
+        if trainer_settings.separate_process and train_model:
+            if trainer_settings.self_play is not None:
+                raise TrainerConfigError(
+                    f"Self-play isn't supported by trainers in their own process, "
+                    f"set separate_process to false for brain {brain_name}"
+                )
+            if distributed.is_distributed():
+                raise TrainerConfigError(
+                    f"Data-parallel training isn't supported by trainers in their own "
+                    f"process, set separate_process to false for brain {brain_name}"
+                )
+            trainer = ProcessTrainer(
+                trainer,
+                functools.partial(
+                    type(trainer),
+                    brain_name,
+                    min_lesson_length,
+                    trainer_settings,
+                    train_model,
+                    load_model,
+                    seed,
+                    trainer_artifact_path,
+                ),
+            )
+
         if trainer_settings.self_play is not None:
             trainer = GhostTrainer(
                 trainer,
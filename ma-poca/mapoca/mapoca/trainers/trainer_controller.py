@@ -25,10 +25,13 @@ from mlagents_envs.timers import (
 from mapoca.trainers.trainer import Trainer
 from mapoca.trainers.environment_parameter_manager import EnvironmentParameterManager
 from mapoca.trainers.trainer import TrainerFactory
+from mapoca.trainers.trainer.process_trainer import ProcessTrainer
 from mapoca.trainers.behavior_id_utils import BehaviorIdentifiers
 from mapoca.trainers.agent_processor import AgentManager
 from mapoca import torch_utils
 from mapoca.torch_utils.globals import get_rank
+from mapoca.torch_utils import distributed
+from mapoca.trainers.exception import UnityTrainerException
 
 
 class TrainerController:
@@ -124,6 +127,13 @@ class TrainerController:
         else:
             trainer = self.trainer_factory.generate(brain_name)
             self.trainers[brain_name] = trainer
+            if distributed.is_distributed() and len(self.trainers) > 1:
+                if not all(t.threaded for t in self.trainers.values()):
+                    # Otherwise, the ranks can wait for each other in different trainers
+                    raise UnityTrainerException(
+                        "Data-parallel training of several behaviors requires threaded "
+                        "trainers. Set threaded to true for all of them."
+                    )
             if trainer.threaded:
                 # Only create trainer thread for new trainers
                 trainerthread = threading.Thread(
@@ -139,6 +149,9 @@ class TrainerController:
             env_manager.training_behaviors[name_behavior_id],
             create_graph=True,
         )
+        if not self.train_model:
+            # The experiences won't be used for training, only sample the actions
+            policy.action_only = True
         trainer.add_policy(parsed_behavior_id, policy)
 
         agent_manager = AgentManager(
@@ -147,6 +160,9 @@ class TrainerController:
             trainer.stats_reporter,
             trainer.parameters.time_horizon,
             threaded=trainer.threaded,
+            trajectory_queue=trainer.trajectory_queue
+            if isinstance(trainer, ProcessTrainer)
+            else None,
         )
         env_manager.set_agent_manager(name_behavior_id, agent_manager)
         env_manager.set_policy(name_behavior_id, policy)
@@ -162,7 +178,9 @@ class TrainerController:
     def _create_trainers_and_managers(
         self, env_manager: EnvManager, behavior_ids: Set[str]
     ) -> None:
-        for behavior_id in behavior_ids:
+        # Sorted so that the ranks of data-parallel training create their trainers in the
+        # same order
+        for behavior_id in sorted(behavior_ids):
             self._create_trainer_and_manager(env_manager, behavior_id)
 
     @timed
@@ -199,6 +217,8 @@ class TrainerController:
         finally:
             if self.train_model:
                 self._save_models()
+            for trainer in self.trainers.values():
+                trainer.close()
 
     def end_trainer_episodes(self) -> None:
         # Reward buffers reset takes place only for curriculum learning
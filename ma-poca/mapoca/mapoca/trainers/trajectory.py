@@ -103,13 +103,12 @@ class GroupObsUtil:
     @staticmethod
     def from_buffer(batch: AgentBuffer, num_obs: int) -> List[np.array]:
         """
-        Creates the list of observations from an AgentBuffer
+        Creates the list of observations from an AgentBuffer. Missing groupmates are
+        padded with zeros, use padding_mask_from_buffer to know which ones they are.
         """
         separated_obs: List[np.array] = []
         for i in range(num_obs):
-            separated_obs.append(
-                batch[GroupObsUtil.get_name_at(i)].padded_to_batch(pad_value=np.nan)
-            )
+            separated_obs.append(batch[GroupObsUtil.get_name_at(i)].padded_to_batch())
         # separated_obs contains a List(num_obs) of Lists(num_agents), we want to flip
         # that and get a List(num_agents) of Lists(num_obs)
         result = GroupObsUtil._transpose_list_of_lists(separated_obs)
@@ -123,15 +122,29 @@ class GroupObsUtil:
         separated_obs: List[np.array] = []
         for i in range(num_obs):
             separated_obs.append(
-                batch[GroupObsUtil.get_name_at_next(i)].padded_to_batch(
-                    pad_value=np.nan
-                )
+                batch[GroupObsUtil.get_name_at_next(i)].padded_to_batch()
             )
         # separated_obs contains a List(num_obs) of Lists(num_agents), we want to flip
         # that and get a List(num_agents) of Lists(num_obs)
         result = GroupObsUtil._transpose_list_of_lists(separated_obs)
         return result
 
+    @staticmethod
+    def padding_mask_from_buffer(batch: AgentBuffer) -> np.ndarray:
+        """
+        Creates the mask of the groupmates padded by from_buffer, of shape
+        (batch, max number of groupmates). It is 1 for the missing groupmates and 0
+        for the ones that are present.
+        """
+        group_obs = batch[GroupObsUtil.get_name_at(0)]
+        num_groupmates = np.fromiter(
+            (len(entry) for entry in group_obs), dtype=np.int64, count=len(group_obs)
+        )
+        max_groupmates = num_groupmates.max() if len(num_groupmates) > 0 else 0
+        return (
+            np.arange(max_groupmates)[None, :] >= num_groupmates[:, None]
+        ).astype(np.float32)
+
 
 class Trajectory(NamedTuple):
     steps: List[AgentExperience]